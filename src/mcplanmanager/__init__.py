@@ -2,7 +2,8 @@
 MCPlanManager - AI Agent 任务管理系统
 
 一个简洁高效的任务管理器，专为 AI Agent 的长程任务执行而设计。
-使用纯内存模式，适用于托管环境和无文件系统权限的场景。
+默认使用纯内存模式，适用于托管环境和无文件系统权限的场景；
+也可以启用预写日志持久化，在服务重启后恢复计划。
 """
 
 __version__ = "1.0.0"
@@ -11,9 +12,15 @@ __email__ = "donwaydoom@gmail.com"
 
 from .plan_manager import PlanManager
 from .dependency_tools import DependencyVisualizer, DependencyPromptGenerator
+from .registry import PlanRegistry
+from .storage import SQLitePlanStore
+from .wal import WriteAheadLogStore
 
 __all__ = [
     "PlanManager",
     "DependencyVisualizer", 
-    "DependencyPromptGenerator"
+    "DependencyPromptGenerator",
+    "PlanRegistry",
+    "SQLitePlanStore",
+    "WriteAheadLogStore"
 ] 
\ No newline at end of file
@@ -1,15 +1,72 @@
 from fastmcp import FastMCP
+from fastmcp.server.dependencies import get_context
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
 from typing import List, Optional, Union
-from .plan_manager import PlanManager
-from .models import TaskInput, DependencyEdit, TaskOutput, ToolResponse, PlanStatusData
+from .registry import PlanRegistry, DEFAULT_PLAN_ID
+from .storage import MemorySpillStore, FileSpillStore, SQLitePlanStore
+from .wal import WriteAheadLogStore
+from .models import TaskInput, DependencyEdit, TaskOutput, ToolResponse, TaskPageResponse, PlanStatusData, CriticalPathData
+from .serialization import dumps_response
+import io
 import os
-
-mcp = FastMCP("MCPlanManager")
-
-plan_manager = PlanManager()
+import tempfile
+import uuid
+import weakref
+
+# 工具返回值用紧凑 JSON 序列化，任务直接复用缓存的 JSON 文本（见 serialization.py）
+mcp = FastMCP("MCPlanManager", tool_serializer=dumps_response)
+
+
+def _create_spill_store():
+    """根据环境变量选择溢出存储"""
+    if os.getenv("MCP_SPILL_DB"):
+        return SQLitePlanStore(os.environ["MCP_SPILL_DB"])
+    if os.getenv("MCP_SPILL_DIR"):
+        return FileSpillStore(os.environ["MCP_SPILL_DIR"])
+    return MemorySpillStore()
+
+
+# 计划注册表：每个计划一把锁，超过上限的空闲计划换出到溢出存储
+# 设置 MCP_SPILL_DB 时换出到 SQLite（已换出计划的只读查询直接走索引），设置 MCP_SPILL_DIR 时写入 JSON 文件
+# 设置 MCP_WAL_DIR 时启用预写日志持久化，所有修改写入日志，重启后自动恢复
+plans = PlanRegistry(
+    max_active_plans=int(os.getenv("MCP_MAX_ACTIVE_PLANS", "128")),
+    spill_store=_create_spill_store(),
+    wal_store=WriteAheadLogStore(
+        os.environ["MCP_WAL_DIR"],
+        group_commit_ms=float(os.getenv("MCP_WAL_GROUP_COMMIT_MS", "10")),
+        compact_every=int(os.getenv("MCP_WAL_COMPACT_EVERY", "1000"))
+    ) if os.getenv("MCP_WAL_DIR") else None
+)
+
+# 未指定 plan_id 时的计划归属："global" 表示所有客户端共享默认计划，"session" 表示每个 MCP 会话一个计划
+PLAN_SCOPE = os.getenv("MCP_PLAN_SCOPE", "global")
+
+# SSE/stdio 传输没有会话ID请求头，为每个会话对象生成一个ID
+_session_keys: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _resolve_plan_id(plan_id: Optional[str]) -> str:
+    """确定本次调用要操作的计划ID"""
+    if plan_id:
+        return plan_id
+    if PLAN_SCOPE != "session":
+        return DEFAULT_PLAN_ID
+    try:
+        ctx = get_context()
+    except RuntimeError:
+        return DEFAULT_PLAN_ID
+    if ctx.session_id:
+        return f"session:{ctx.session_id}"
+    session = ctx.session
+    if session not in _session_keys:
+        _session_keys[session] = f"session:{uuid.uuid4().hex}"
+    return _session_keys[session]
 
 @mcp.tool()
-def initializePlan(goal: str, tasks: List[TaskInput]) -> ToolResponse[dict]:
+def initializePlan(goal: str, tasks: List[TaskInput], plan_id: Optional[str] = None) -> ToolResponse[dict]:
     """
     初始化或完全替换一个新的任务计划。
 
@@ -19,35 +76,83 @@ def initializePlan(goal: str, tasks: List[TaskInput]) -> ToolResponse[dict]:
           - name (str): 任务的名称，在一个计划中应唯一。
           - dependencies (List[Union[str, int]]): 依赖的任务名称或ID列表。
           - reasoning (str): 阐述为何需要此任务。
+          - estimated_duration (float, optional): 估计耗时（秒），用于 getCriticalPath 估计排程。
+          - priority (int, optional): 优先级，越大越优先（计划使用 'priority' 策略时生效，见 setPriorityPolicy）。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
     """
     task_dicts = [task.model_dump() for task in tasks]
-    return plan_manager.initializePlan(goal, task_dicts)
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.initializePlan(goal, task_dicts)
 
 @mcp.tool()
-def loadPlan(plan_data: dict) -> ToolResponse:
+def loadPlan(plan_data: Union[dict, str], plan_id: Optional[str] = None) -> ToolResponse:
     """
     通过一个完整的计划对象加载或替换当前计划。
     这个工具会直接覆盖内存中的整个计划，请谨慎使用。
 
     Args:
-        plan_data (dict): 一个包含完整计划数据的字典对象，通常由 dumpPlan 工具导出。
+        plan_data (dict | str): 一个包含完整计划数据的字典对象，通常由 dumpPlan 工具导出。
                           它应包含 'meta', 'state', 和 'tasks' 三个顶级键。
+                          也可以是 dumpPlan(format="binary") 导出的 base64 文本。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
     """
-    return plan_manager.loadPlan(plan_data)
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.loadPlan(plan_data)
 
 @mcp.tool()
-def dumpPlan() -> ToolResponse[dict]:
+def dumpPlan(format: str = "json", plan_id: Optional[str] = None) -> ToolResponse[Union[dict, str]]:
     """
     导出当前完整的计划数据为一个字典对象。
     这个导出的对象可以被 loadPlan 工具用来恢复状态。
 
+    Args:
+        format (str, optional): 导出格式。'json'（默认）返回字典对象；
+                                'binary' 返回紧凑的列式二进制编码（base64 文本），适合包含大量任务的计划。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+
+    Returns:
+        ToolResponse[Union[dict, str]]: 包含当前完整计划数据的响应对象。
+    """
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.dumpPlan(format)
+
+@mcp.tool()
+def dumpPlanDelta(since_version: int, plan_id: Optional[str] = None) -> ToolResponse[dict]:
+    """
+    导出自指定版本以来的计划增量，只包含变化的任务，适合频繁 checkpoint。
+    计划每次被修改后版本号（meta.version）加一；since_version 早于计划最近一次被整体替换时返回完整计划（full=true）。
+
+    Args:
+        since_version (int): 上一次导出时的计划版本号（dumpPlan 或 dumpPlanDelta 返回的 version）。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+
+    Returns:
+        ToolResponse[dict]: 包含 since_version、version、full，以及 meta、state、upsert（变化的任务）、
+                            insert（新任务的位置）、remove（删除的任务ID）或完整计划 plan 的响应对象。
+    """
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.dumpPlanDelta(since_version)
+
+@mcp.tool()
+def applyPlanDelta(delta: dict, plan_id: Optional[str] = None) -> ToolResponse[dict]:
+    """
+    应用 dumpPlanDelta 导出的增量，把计划推进到增量的版本。
+    增量的 since_version 必须等于计划当前的版本；完整增量（full=true）会直接替换整个计划。
+
+    Args:
+        delta (dict): dumpPlanDelta 返回的 data 对象。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+
     Returns:
-        ToolResponse[dict]: 包含当前完整计划数据的响应对象。
+        ToolResponse[dict]: 包含应用后版本号的响应对象。
     """
-    return plan_manager.dumpPlan()
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.applyPlanDelta(delta)
 
 @mcp.tool()
-def visualizeDependencies(format: str = "ascii") -> str:
+def visualizeDependencies(format: str = "ascii", max_depth: Optional[int] = None, max_width: Optional[int] = None,
+                          focus: Optional[str] = None, task_id: Optional[int] = None, hops: Optional[int] = None,
+                          plan_id: Optional[str] = None) -> str:
     """
     生成当前任务依赖关系的可视化图。
 
@@ -55,45 +160,82 @@ def visualizeDependencies(format: str = "ascii") -> str:
         format (str, optional): 输出的格式。可接受的值为 'mermaid' (生成流程图代码), 
                               'tree' (生成树状图), 或 'ascii' (生成纯文本格式的列表)。
                               默认为 'ascii'。
+        max_depth (int, optional): 仅用于 'tree'：最多展开的层数（根任务为第 0 层），更深的后续任务折叠为一行计数。
+        max_width (int, optional): 仅用于 'tree'：每个任务最多显示的后续任务数，其余折叠为一行计数。
+        focus (str, optional): 只显示依赖图的一部分：'ancestors' (task_id 及其所有前置任务)、'descendants' (task_id 及其所有后续任务)、
+                              'neighborhood' (与 task_id 相距不超过 hops 跳的任务，hops 默认为 1) 或 'frontier' (可执行、进行中和失败的任务)。
+                              只沿邻接索引遍历，耗时与显示的任务数成正比。省略时显示整个计划。
+        task_id (int, optional): focus 为 'ancestors'/'descendants'/'neighborhood' 时聚焦的任务ID。
+        hops (int, optional): 最多沿依赖走多少跳。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
     
     Returns:
-        str: 包含所选格式可视化内容的字符串。
+        str: 包含所选格式可视化内容的字符串。树状图中有多个前置任务的任务只展开一次，之后以 "↪ ... (见上文)" 回引。
     """
     from .dependency_tools import DependencyVisualizer
-    visualizer = DependencyVisualizer(plan_manager)
-    if format == "ascii":
-        visualization = visualizer.generate_ascii_graph()
-    elif format == "tree":
-        visualization = visualizer.generate_tree_view()
-    elif format == "mermaid":
-        visualization = visualizer.generate_mermaid_graph()
-    else:
-        visualization = visualizer.generate_ascii_graph()
-    return visualization
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        visualizer = DependencyVisualizer(plan_manager)
+        focus_args = {"focus": focus, "task_id": task_id, "hops": hops}
+        if format == "ascii":
+            visualization = visualizer.generate_ascii_graph(**focus_args)
+        elif format == "tree":
+            visualization = visualizer.generate_tree_view(max_depth=max_depth, max_width=max_width, **focus_args)
+        elif format == "mermaid":
+            visualization = visualizer.generate_mermaid_graph(**focus_args)
+        else:
+            visualization = visualizer.generate_ascii_graph(**focus_args)
+        return visualization
 
 @mcp.tool()
-def getCurrentTask() -> ToolResponse[TaskOutput]:
+def getCurrentTask(plan_id: Optional[str] = None) -> ToolResponse[TaskOutput]:
     """
     获取当前标记为 'in_progress' (正在进行中) 的任务详情。
     
+    Args:
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+
     Returns:
         ToolResponse[TaskOutput]: 包含当前任务详情的响应对象。
     """
-    return plan_manager.getCurrentTask()
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.getCurrentTask()
 
 @mcp.tool()
-def startNextTask() -> ToolResponse[TaskOutput]:
+def startNextTask(plan_id: Optional[str] = None) -> ToolResponse[TaskOutput]:
     """
     自动查找下一个可执行的任务（所有依赖均已完成）并开始执行。
     这会将任务状态更新为 'in_progress'。这是推进计划的核心方法。
+    有多个可执行任务时按计划的优先级策略选择（见 setPriorityPolicy，默认为最早就绪的任务）。
     
+    Args:
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+
     Returns:
         ToolResponse[TaskOutput]: 包含已启动任务的响应对象。
     """
-    return plan_manager.startNextTask()
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.startNextTask()
+
+@mcp.tool()
+def setPriorityPolicy(policy: str, plan_id: Optional[str] = None) -> ToolResponse[dict]:
+    """
+    设置 startNextTask/claimTasks 在多个可执行任务中选择的优先级策略，策略保存在计划中。
+
+    Args:
+        policy (str): 可选值:
+          - 'fifo' (默认): 最早就绪的任务优先。
+          - 'priority': 任务的 priority 字段（整数）越大越优先。
+          - 'critical_path': 从该任务到计划结束的最长估计路径越长越优先，多 worker 时可缩短总耗时。
+          - 'most_dependents': 直接依赖该任务的任务越多越优先。
+          - 'shortest_estimated': 估计耗时 (estimated_duration) 越短越优先。
+          优先级相同时按就绪先后选择。没有估计耗时的任务按已完成任务的平均耗时计算。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+    """
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.setPriorityPolicy(policy)
 
 @mcp.tool()
-def completeTask(task_id: int, result: str) -> ToolResponse[TaskOutput]:
+def completeTask(task_id: int, result: str, worker_id: Optional[str] = None, plan_id: Optional[str] = None) -> ToolResponse[TaskOutput]:
     """
     将指定ID的任务标记为 'completed' (已完成)。
     这是解锁后续依赖任务的关键步骤。
@@ -101,11 +243,16 @@ def completeTask(task_id: int, result: str) -> ToolResponse[TaskOutput]:
     Args:
         task_id (int): 需要标记为完成的任务的ID (从0开始)。
         result (str): 描述任务完成结果或产出的字符串。
+        worker_id (str, optional): 通过 claimTasks 领取任务的 worker 标识。提供时，只有仍持有该任务租约的 worker 才能完成它，
+                                   租约过期后被其他 worker 重新领取的任务不会被迟到的完成覆盖。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
     """
-    return plan_manager.completeTask(task_id, result)
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.completeTask(task_id, result, worker_id)
 
 @mcp.tool()
-def failTask(task_id: int, error_message: str, should_retry: bool = True) -> ToolResponse[TaskOutput]:
+def failTask(task_id: int, error_message: str, should_retry: bool = True, worker_id: Optional[str] = None,
+             plan_id: Optional[str] = None) -> ToolResponse[TaskOutput]:
     """
     将指定ID的任务标记为 'failed' (失败)。
 
@@ -113,11 +260,53 @@ def failTask(task_id: int, error_message: str, should_retry: bool = True) -> Too
         task_id (int): 需要标记为失败的任务的ID (从0开始)。
         error_message (str): 描述任务失败原因的字符串。
         should_retry (bool, optional): 是否应该重试该任务的标志。默认为 True。
+        worker_id (str, optional): 通过 claimTasks 领取任务的 worker 标识。提供时，只有仍持有该任务租约的 worker 才能标记它失败。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+    """
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.failTask(task_id, error_message, should_retry, worker_id)
+
+@mcp.tool()
+def claimTasks(worker_id: str, max_n: int = 1, lease_seconds: float = 300, plan_id: Optional[str] = None) -> ToolResponse[List[TaskOutput]]:
+    """
+    为一个 worker 原子地领取最多 max_n 个可执行任务，并将它们标记为 'in_progress'。
+    适合多个 Agent 并行执行同一个计划：每个任务带有租约，租约到期前未完成的任务会自动退回 'pending'，
+    可被其他 worker 重新领取。完成任务仍使用 completeTask / failTask，并传入 worker_id，
+    这样租约过期后迟到的完成或失败会被拒绝。
+    任务按计划的优先级策略选择（见 setPriorityPolicy）。
+
+    Args:
+        worker_id (str): 领取任务的 worker 标识。
+        max_n (int, optional): 最多领取的任务数。默认为 1。
+        lease_seconds (float, optional): 租约时长（秒）。默认为 300。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+
+    Returns:
+        ToolResponse[List[TaskOutput]]: 包含本次领取的任务列表的响应对象。
+    """
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.claimTasks(worker_id, max_n, lease_seconds)
+
+@mcp.tool()
+def renewLeases(worker_id: str, lease_seconds: float = 300, plan_id: Optional[str] = None) -> ToolResponse[List[TaskOutput]]:
+    """
+    为 worker 当前持有的所有任务租约续期，执行耗时较长的任务时应定期调用。
+
+    Args:
+        worker_id (str): 持有租约的 worker 标识。
+        lease_seconds (float, optional): 从现在起新的租约时长（秒）。默认为 300。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+
+    Returns:
+        ToolResponse[List[TaskOutput]]: 包含已续约任务列表的响应对象。
     """
-    return plan_manager.failTask(task_id, error_message, should_retry)
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.renewLeases(worker_id, lease_seconds)
 
 @mcp.tool()
-def addTask(name: str, dependencies: List[int], reasoning: str, after_task_id: Optional[int] = None) -> ToolResponse[TaskOutput]:
+def addTask(name: str, dependencies: List[int], reasoning: str, after_task_id: Optional[int] = None,
+            estimated_duration: Optional[float] = None, priority: Optional[int] = None,
+            plan_id: Optional[str] = None) -> ToolResponse[TaskOutput]:
     """
     向当前计划中动态添加一个新任务。
 
@@ -126,14 +315,18 @@ def addTask(name: str, dependencies: List[int], reasoning: str, after_task_id: O
         dependencies (List[int]): 新任务所依赖的任务ID的整数列表 (从0开始)。
         reasoning (str): 解释为何要添加此任务的字符串。
         after_task_id (int, optional): 一个任务ID，新任务将被插入到该任务之后。如果省略，则添加到列表末尾。
+        estimated_duration (float, optional): 估计耗时（秒），用于 getCriticalPath 估计排程。
+        priority (int, optional): 优先级，越大越优先（计划使用 'priority' 策略时生效，见 setPriorityPolicy）。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
         
     Returns:
         ToolResponse[TaskOutput]: 包含新创建任务的响应对象。
     """
-    return plan_manager.addTask(name, dependencies, reasoning, after_task_id)
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.addTask(name, dependencies, reasoning, after_task_id, estimated_duration, priority)
 
 @mcp.tool()
-def skipTask(task_id: int, reason: str) -> ToolResponse[TaskOutput]:
+def skipTask(task_id: int, reason: str, plan_id: Optional[str] = None) -> ToolResponse[TaskOutput]:
     """
     将指定ID的任务标记为 'skipped' (已跳过)。
     被跳过的任务在依赖解析中被视为“已完成”，允许后续任务继续。
@@ -141,11 +334,13 @@ def skipTask(task_id: int, reason: str) -> ToolResponse[TaskOutput]:
     Args:
         task_id (int): 需要跳过的任务的ID (从0开始)。
         reason (str): 解释为何跳过此任务的字符串。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
     """
-    return plan_manager.skipTask(task_id, reason)
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.skipTask(task_id, reason)
 
 @mcp.tool()
-def editDependencies(edits: List[DependencyEdit]) -> ToolResponse[dict]:
+def editDependencies(edits: List[DependencyEdit], plan_id: Optional[str] = None) -> ToolResponse[dict]:
     """
     以批量、事务性的方式编辑一个或多个任务的依赖关系。
 
@@ -159,50 +354,176 @@ def editDependencies(edits: List[DependencyEdit]) -> ToolResponse[dict]:
           - dependencies (Optional[List[int]]): 当 action 为 'set' 时，提供新的完整依赖ID列表。
           - add (Optional[List[int]]): 当 action 为 'update' 时，提供要添加的依赖ID列表。
           - remove (Optional[List[int]]): 当 action 为 'update' 时，提供要移除的依赖ID列表。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
     """
     edit_dicts = [edit.model_dump(exclude_none=True) for edit in edits]
-    return plan_manager.edit_dependencies_in_batch(edit_dicts)
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.edit_dependencies_in_batch(edit_dicts)
 
 @mcp.tool()
-def getPlanStatus() -> ToolResponse[PlanStatusData]:
-    """获取整个计划的全面概览，包括元数据、进度、任务状态统计等。"""
-    return plan_manager.getPlanStatus()
+def getPlanStatus(plan_id: Optional[str] = None) -> ToolResponse[PlanStatusData]:
+    """
+    获取整个计划的全面概览，包括元数据、进度、任务状态统计等。
+
+    Args:
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+    """
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.getPlanStatus()
 
 @mcp.tool()
-def getTaskList(status_filter: Optional[str] = None) -> ToolResponse[List[TaskOutput]]:
+def getTaskList(
+    status_filter: Union[str, List[str], None] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    plan_id: Optional[str] = None
+) -> TaskPageResponse:
     """
-    获取计划中所有任务的列表，可按状态进行过滤。
+    获取计划中的任务列表（按计划顺序），可按一个或多个状态过滤，支持分页和字段投影。
+    计划较大时建议分页并只请求需要的字段，避免响应过大。
 
     Args:
-        status_filter (str, optional): 用于过滤任务的状态字符串。
+        status_filter (str | List[str], optional): 用于过滤任务的状态字符串或状态列表。
                                      可接受的值: 'pending', 'in_progress', 'completed', 'failed', 'skipped'。
+        limit (int, optional): 每页最多返回的任务数。省略时返回所有匹配的任务。
+        cursor (str, optional): 上一页响应中的 next_cursor，用于获取下一页。
+        fields (List[str], optional): 只返回这些字段，例如 ["id", "name", "status"]。
+                                     可选字段: id, name, status, dependencies, reasoning, result。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
     
     Returns:
-          ToolResponse[List[TaskOutput]]: 包含任务列表的响应对象。
+          TaskPageResponse: 包含任务列表的响应对象；指定 limit 时包含 next_cursor，没有下一页时为 null。
     """
-    return plan_manager.getTaskList(status_filter)
+    with plans.read(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.getTaskList(status_filter, limit, cursor, fields)
 
 @mcp.tool()
-def getExecutableTaskList() -> ToolResponse[List[TaskOutput]]:
+def getExecutableTaskList(plan_id: Optional[str] = None) -> ToolResponse[List[TaskOutput]]:
     """
     获取当前所有依赖已满足且状态为 'pending' 的可执行任务列表。
 
+    Args:
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+
     Returns:
         ToolResponse[List[TaskOutput]]: 包含可执行任务列表的响应对象。
     """
-    return plan_manager.getExecutableTaskList()
+    with plans.read(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.getExecutableTaskList()
+
+@mcp.tool()
+def getDependents(task_id: int, plan_id: Optional[str] = None) -> ToolResponse[List[TaskOutput]]:
+    """
+    获取直接依赖指定任务的所有任务（即该任务完成后可能被解锁的任务）。
+
+    Args:
+        task_id (int): 要查询的任务ID (从0开始)。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+
+    Returns:
+        ToolResponse[List[TaskOutput]]: 包含依赖该任务的任务列表的响应对象。
+    """
+    with plans.read(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.getDependents(task_id)
+
+@mcp.tool()
+def getCriticalPath(plan_id: Optional[str] = None) -> ToolResponse[CriticalPathData]:
+    """
+    估计剩余工作的排程：每个未完成任务的最早/最晚开始时间、松弛时间，以及决定总耗时（makespan）的关键路径。
+    任务的耗时取其 estimated_duration，未设置时使用已完成任务的平均实际耗时。时间单位为秒，以当前时刻为 0。
+
+    Args:
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
+
+    Returns:
+        ToolResponse[CriticalPathData]: 包含 makespan、critical_path（任务ID列表）和各任务排程的响应对象。
+    """
+    # 排程需要遍历整个依赖图，StoredPlanView 不提供该查询，已换出的计划先换入
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        return plan_manager.getCriticalPath()
 
 @mcp.tool()
-def generateContextPrompt() -> str:
+def generateContextPrompt(focus: Optional[str] = None, task_id: Optional[int] = None, hops: Optional[int] = None,
+                          plan_id: Optional[str] = None) -> str:
     """
     生成一个详细的文本提示，总结计划的当前状态。
     这个提示可以作为上下文提供给AI模型，以帮助其决定下一步行动。
     内容包括：总体目标、当前任务、可执行任务列表等。
+    大计划上可以用 focus 只列出相关任务的依赖关系，控制提示的长度。
+
+    Args:
+        focus (str, optional): 依赖关系一节只包含依赖图的一部分：'ancestors' (task_id 及其所有前置任务)、'descendants' (task_id 及其所有后续任务)、
+                              'neighborhood' (与 task_id 相距不超过 hops 跳的任务，hops 默认为 1) 或 'frontier' (可执行、进行中和失败的任务)。
+                              只沿邻接索引遍历，耗时与显示的任务数成正比。省略时包含整个计划。
+        task_id (int, optional): focus 为 'ancestors'/'descendants'/'neighborhood' 时聚焦的任务ID。
+        hops (int, optional): 最多沿依赖走多少跳。
+        plan_id (str, optional): 要操作的计划ID。省略时使用默认计划（MCP_PLAN_SCOPE=session 时为当前会话的计划）。
     """
     from .dependency_tools import DependencyPromptGenerator
-    generator = DependencyPromptGenerator(plan_manager)
-    prompt = generator.generate_context_prompt()
-    return prompt
+    with plans.open(_resolve_plan_id(plan_id)) as plan_manager:
+        generator = DependencyPromptGenerator(plan_manager)
+        prompt = generator.generate_context_prompt(focus=focus, task_id=task_id, hops=hops)
+        return prompt
+
+
+# 大计划的流式导出/导入（NDJSON，见 ndjson_format），仅在 SSE/HTTP 模式下可用：
+#   GET /plans/{plan_id}/ndjson  分块返回计划，计划不存在时返回 404
+#   PUT /plans/{plan_id}/ndjson  上传 NDJSON 替换计划
+# 两个方向都经过临时文件中转：计划锁只在本地读写文件期间持有，慢速客户端不会阻塞计划的其他调用，
+# 内存中也不会出现整个计划的字典或 JSON 文本
+
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _export_plan_to_file(plan_id: str):
+    # 导出不应创建计划：不存在的计划返回 None，而不是经由 plans.open 导出一个新建的空计划
+    if not plans.exists(plan_id):
+        return None
+    spool = tempfile.TemporaryFile()
+    text = io.TextIOWrapper(spool, encoding="utf-8", newline="\n")
+    with plans.open(plan_id) as plan_manager:
+        plan_manager.dumpPlanStream(text)
+    text.flush()
+    text.detach()
+    spool.seek(0)
+    return spool
+
+
+def _iter_file_chunks(spool):
+    try:
+        while True:
+            chunk = spool.read(_STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
+
+
+def _load_plan_from_file(plan_id: str, spool) -> dict:
+    with plans.open(plan_id) as plan_manager:
+        # 二进制文件按 b"\n" 逐行迭代，json.loads 直接解析 UTF-8 字节
+        return plan_manager.loadPlanStream(spool)
+
+
+@mcp.custom_route("/plans/{plan_id}/ndjson", methods=["GET"])
+async def export_plan_ndjson(request: Request) -> Response:
+    plan_id = request.path_params["plan_id"]
+    spool = await run_in_threadpool(_export_plan_to_file, plan_id)
+    if spool is None:
+        return JSONResponse({"success": False, "message": f"Plan {plan_id} not found"}, status_code=404)
+    return StreamingResponse(_iter_file_chunks(spool), media_type="application/x-ndjson")
+
+
+@mcp.custom_route("/plans/{plan_id}/ndjson", methods=["PUT"])
+async def import_plan_ndjson(request: Request) -> Response:
+    with tempfile.TemporaryFile() as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        result = await run_in_threadpool(_load_plan_from_file, request.path_params["plan_id"], spool)
+    return JSONResponse(result, status_code=200 if result["success"] else 400)
 
 
 def main():
@@ -214,6 +535,11 @@ def main():
     host = os.getenv("MCP_HOST", "0.0.0.0")
     port = int(os.getenv("MCP_PORT", "8080"))
     
+    # 启用预写日志时，先从日志恢复上次运行留下的所有计划
+    if plans.wal_store is not None:
+        recovered = plans.recover()
+        print(f"Recovered {len(recovered)} plan(s) from write-ahead log at {plans.wal_store.root}")
+    
     if transport == "sse":
         print(f"Starting MCP server in SSE mode on {host}:{port}")
         mcp.run(transport="sse", host=host, port=port)
@@ -0,0 +1,191 @@
+"""
+计划的紧凑二进制格式
+按列存储任务，而不是逐个任务写成 JSON 对象：
+  - 任务ID、依赖（CSR：每个任务的起始偏移 + 扁平的依赖ID数组）为定长整数数组
+  - 状态为单字节编码，对应头部中的状态表
+  - name/reasoning/result 为字符串表下标（0 表示 None），相同的字符串只保存一次
+  - meta、state 以及无法按列表示的字段以 JSON 保存在头部
+整体再经过 zlib 压缩；通过 MCP 传输时编码为 base64 文本。
+"""
+
+import base64
+import binascii
+import itertools
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, List, Union
+
+from .task_record import TASK_FIELDS
+
+MAGIC = b"MCPB"
+FORMAT_VERSION = 1
+FLAG_ZLIB = 1
+
+_STRING_FIELDS = ("name", "reasoning", "result")
+
+
+def _pack_array(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack_array(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _is_int_list(value) -> bool:
+    return isinstance(value, (list, tuple)) and all(type(item) is int for item in value)
+
+
+def encode_plan(plan_data: Dict, compress: bool = True) -> bytes:
+    """把计划编码为二进制格式。各列用推导式整列生成，只有不规则的任务才逐个处理"""
+    tasks = plan_data["tasks"]
+    # 无法按列表示的字段：任务下标 -> 字段，解码时覆盖到任务上
+    extras: Dict[str, Dict] = {}
+
+    def move_to_extras(column: List, field: str, positions: List[int], placeholder) -> None:
+        for position in positions:
+            extras.setdefault(str(position), {})[field] = column[position]
+            column[position] = placeholder
+
+    for position, task in enumerate(tasks):
+        if task.keys() != TASK_FIELDS:
+            extra = {key: value for key, value in task.items() if key not in TASK_FIELDS}
+            if extra:
+                extras[str(position)] = extra
+
+    ids = array("q", [task["id"] for task in tasks])
+
+    status_column = [task["status"] for task in tasks]
+    move_to_extras(status_column, "status", [i for i, status in enumerate(status_column) if type(status) is not str], "")
+    statuses = {status: code for code, status in enumerate(dict.fromkeys(status_column))}
+    if len(statuses) > 256:
+        raise ValueError("Too many distinct task statuses for the binary format")
+    status_codes = bytes(map(statuses.__getitem__, status_column))
+
+    dependency_column = [task["dependencies"] for task in tasks]
+    try:
+        deps = array("q", itertools.chain.from_iterable(dependency_column))
+        if len(deps) != sum(map(len, dependency_column)):
+            raise TypeError
+    except TypeError:
+        move_to_extras(dependency_column, "dependencies",
+                       [i for i, value in enumerate(dependency_column) if not _is_int_list(value)], [])
+        deps = array("q", itertools.chain.from_iterable(dependency_column))
+    dep_offsets = array("I", itertools.accumulate(map(len, dependency_column), initial=0))
+
+    # 字符串表下标从 1 开始，0 留给 None
+    strings: Dict[str, int] = {}
+    intern = strings.setdefault
+    string_columns = {}
+    for field in _STRING_FIELDS:
+        column = [task.get(field) for task in tasks]
+        move_to_extras(column, field, [i for i, value in enumerate(column) if value is not None and type(value) is not str], None)
+        string_columns[field] = array("I", [0 if value is None else intern(value, len(strings) + 1) for value in column])
+
+    header = json.dumps({
+        "meta": plan_data["meta"],
+        "state": plan_data["state"],
+        "statuses": list(statuses),
+        "extras": extras
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # 字符串表：按字符计的偏移 + 拼接后的 UTF-8 文本，解码时整体解码一次再切片
+    string_offsets = array("I", itertools.accumulate(map(len, strings), initial=0))
+    sections = [
+        header,
+        _pack_array(ids),
+        bytes(status_codes),
+        _pack_array(dep_offsets),
+        _pack_array(deps),
+        _pack_array(string_offsets),
+        "".join(strings).encode("utf-8"),
+        *(_pack_array(string_columns[field]) for field in _STRING_FIELDS)
+    ]
+    body = b"".join(struct.pack("<I", len(section)) + section for section in sections)
+    flags = 0
+    if compress:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_ZLIB
+    return MAGIC + struct.pack("<BB", FORMAT_VERSION, flags) + body
+
+
+def decode_plan(data: bytes) -> Dict:
+    """把二进制格式解码为计划字典，格式错误时抛出 ValueError"""
+    if data[:4] != MAGIC or len(data) < 6:
+        raise ValueError("Not a binary plan")
+    version, flags = struct.unpack_from("<BB", data, 4)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported binary plan version: {version}")
+    body = data[6:]
+    if flags & FLAG_ZLIB:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            raise ValueError(f"Corrupted binary plan: {e}") from None
+
+    sections: List[bytes] = []
+    offset = 0
+    while offset + 4 <= len(body):
+        (length,) = struct.unpack_from("<I", body, offset)
+        offset += 4
+        sections.append(body[offset:offset + length])
+        offset += length
+    if len(sections) != 10 or offset != len(body):
+        raise ValueError("Corrupted binary plan: unexpected section layout")
+
+    header = json.loads(sections[0].decode("utf-8"))
+    ids = _unpack_array("q", sections[1]).tolist()
+    status_codes = sections[2]
+    dep_offsets = _unpack_array("I", sections[3]).tolist()
+    deps = _unpack_array("q", sections[4]).tolist()
+    string_offsets = _unpack_array("I", sections[5]).tolist()
+    text = sections[6].decode("utf-8")
+    string_table = [None] + [text[start:end] for start, end in zip(string_offsets, string_offsets[1:])]
+    names, reasonings, results = (_unpack_array("I", section).tolist() for section in sections[7:])
+    statuses = header["statuses"]
+    extras = header["extras"]
+    if not (len(ids) == len(status_codes) == len(dep_offsets) - 1 == len(names) == len(reasonings) == len(results)):
+        raise ValueError("Corrupted binary plan: column lengths differ")
+
+    try:
+        tasks = [
+            {
+                "id": task_id,
+                "name": string_table[name],
+                "status": statuses[code],
+                "dependencies": deps[start:end],
+                "reasoning": string_table[reasoning],
+                "result": string_table[result]
+            }
+            for task_id, name, code, start, end, reasoning, result
+            in zip(ids, names, status_codes, dep_offsets, dep_offsets[1:], reasonings, results)
+        ]
+    except IndexError:
+        raise ValueError("Corrupted binary plan: index out of range") from None
+    for position, extra in extras.items():
+        tasks[int(position)].update(extra)
+    return {"meta": header["meta"], "state": header["state"], "tasks": tasks}
+
+
+def encode_plan_text(plan_data: Dict) -> str:
+    """编码为 base64 文本，便于放进 JSON 形式的工具响应中"""
+    return base64.b64encode(encode_plan(plan_data)).decode("ascii")
+
+
+def decode_plan_text(data: Union[str, bytes]) -> Dict:
+    """解码 encode_plan_text 的结果（也接受原始二进制），格式错误时抛出 ValueError"""
+    if isinstance(data, str):
+        try:
+            data = base64.b64decode(data, validate=True)
+        except binascii.Error as e:
+            raise ValueError(f"Invalid base64 payload: {e}") from None
+    return decode_plan(data)
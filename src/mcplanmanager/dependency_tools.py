@@ -4,198 +4,317 @@
 包括可视化和Prompt转换功能
 """
 
-from .plan_manager import PlanManager
-from typing import Dict, List, Any
+from .plan_manager import PlanManager, SATISFIED_STATUSES
+from .render_cache import TaskRenderCache, plan_cache
+from typing import Dict, List, Any, Optional, Tuple
 import json
 
 
+# Mermaid 节点的状态颜色
+_MERMAID_STATUS_COLORS = {
+    "pending": "fill:#e1f5fe",
+    "in_progress": "fill:#fff3e0", 
+    "completed": "fill:#e8f5e8",
+    "failed": "fill:#ffebee",
+    "skipped": "fill:#f3e5f5"
+}
+
+# ASCII 图的状态符号
+_ASCII_STATUS_SYMBOLS = {
+    "pending": "⏳",
+    "in_progress": "🔄", 
+    "completed": "✅",
+    "failed": "❌",
+    "skipped": "⏭️"
+}
+
+
+def _mermaid_entry(task: Dict, names: Dict[int, str]) -> Tuple[str, str]:
+    """单个任务的 Mermaid 节点代码（含样式）和指向它的边"""
+    node_id = f"T{task['id']}"
+    node_name = task["name"].replace('"', "'")
+    status = task["status"]
+    
+    # 根据状态选择节点形状
+    if status == "in_progress":
+        shape = f'{node_id}(("{node_name}"))'
+    else:
+        shape = f'{node_id}["{node_name}"]'
+    node = f"    {shape}"
+    if status in _MERMAID_STATUS_COLORS:
+        node += f"\n    style {node_id} {_MERMAID_STATUS_COLORS[status]}"
+    
+    edges = "\n".join(f"    T{dep_id} --> {node_id}" for dep_id in task["dependencies"])
+    return node, edges
+
+
+def _ascii_entry(task: Dict, names: Dict[int, str]) -> str:
+    """单个任务在 ASCII 图中的一行"""
+    symbol = _ASCII_STATUS_SYMBOLS.get(task["status"], "❓")
+    line = f"{symbol} [{task['id']}] {task['name']}"
+    if task["dependencies"]:
+        dep_names = [f"[{dep_id}]" for dep_id in sorted(task["dependencies"])]
+        line += f" (依赖: {', '.join(dep_names)})"
+    return line
+
+
+def _tree_entry(task: Dict, names: Dict[int, str]) -> Tuple[str, Tuple[int, ...]]:
+    """单个任务在树状视图中的标签，以及它的依赖（决定树的形状）"""
+    status = task["status"]
+    symbol = "✅" if status == "completed" else "⏳" if status == "pending" else "🔄"
+    return f"{symbol} [{task['id']}] {task['name']}", tuple(task["dependencies"])
+
+
+def _describe_focus(focus: str, task_id: Optional[int], hops: Optional[int]) -> str:
+    """聚焦方式的文字说明，显示在聚焦视图的标题中"""
+    if focus == "frontier":
+        return "执行前沿（可执行、进行中、失败的任务）"
+    descriptions = {"ancestors": "的前置任务", "descendants": "的后续任务", "neighborhood": "的邻域"}
+    description = f"任务 [{task_id}] {descriptions.get(focus, '')}"
+    if focus == "neighborhood" and hops is None:
+        hops = 1
+    return f"{description}（{hops} 跳以内）" if hops is not None else description
+
+
+def _within(task: Dict, task_ids) -> Dict:
+    """只保留切片内依赖的任务副本，用于渲染子图中的边和树的根"""
+    return dict(task, dependencies=[dep_id for dep_id in task["dependencies"] if dep_id in task_ids])
+
+
 class DependencyVisualizer:
-    """依赖关系可视化工具"""
+    """
+    依赖关系可视化工具
+    每种格式的渲染结果按任务缓存在 PlanManager 上，重复调用时只重新渲染自上次以来状态或依赖发生变化的任务，
+    计划没有变化时直接返回上次的结果。
+    """
     
     def __init__(self, plan_manager: PlanManager):
         self.pm = plan_manager
     
-    def generate_mermaid_graph(self) -> str:
-        """生成Mermaid流程图代码"""
-        graph_data = self.pm.getDependencyGraph()
-        if not graph_data["success"]:
-            return "Error: Could not get dependency graph"
-        
-        nodes = graph_data["data"]["nodes"]
-        edges = graph_data["data"]["edges"]
-        
-        # 状态颜色映射
-        status_colors = {
-            "pending": "fill:#e1f5fe",
-            "in_progress": "fill:#fff3e0", 
-            "completed": "fill:#e8f5e8",
-            "failed": "fill:#ffebee",
-            "skipped": "fill:#f3e5f5"
-        }
-        
+    def generate_mermaid_graph(self, focus: Optional[str] = None, task_id: Optional[int] = None, hops: Optional[int] = None) -> str:
+        """生成Mermaid流程图代码（focus/task_id/hops 含义同 PlanManager.getSubgraph，指定 focus 时只渲染该子图）"""
+        if focus is not None:
+            tasks, error = self._focused_tasks(focus, task_id, hops)
+            if error:
+                return error
+            task_ids = {task["id"] for task in tasks}
+            entries = [_mermaid_entry(_within(task, task_ids), {}) for task in tasks]
+            return self._assemble_mermaid(entries, f"%% 聚焦: {_describe_focus(focus, task_id, hops)}")
+        
+        cache = plan_cache(self.pm, "mermaid", lambda: TaskRenderCache(_mermaid_entry))
+        with cache.lock:
+            if not cache.sync(self.pm):
+                return "Error: Could not get dependency graph"
+            if cache.output is None:
+                cache.output = self._assemble_mermaid(list(cache.ordered_entries()))
+            return cache.output
+    
+    def generate_ascii_graph(self, focus: Optional[str] = None, task_id: Optional[int] = None, hops: Optional[int] = None) -> str:
+        """生成ASCII文本图（focus/task_id/hops 含义同 PlanManager.getSubgraph，指定 focus 时只列出该子图中的任务）"""
+        if focus is not None:
+            tasks, error = self._focused_tasks(focus, task_id, hops)
+            if error:
+                return error
+            title = f"🔍 聚焦: {_describe_focus(focus, task_id, hops)}，共 {len(tasks)} 个任务"
+            return self._assemble_ascii([_ascii_entry(task, {}) for task in tasks], title)
+        
+        cache = plan_cache(self.pm, "ascii", lambda: TaskRenderCache(_ascii_entry, sort_by_id=True))
+        with cache.lock:
+            if not cache.sync(self.pm):
+                return "Error: Could not get dependency graph"
+            if cache.output is None:
+                cache.output = self._assemble_ascii(cache.ordered_entries())
+            return cache.output
+    
+    def generate_tree_view(self, max_depth: Optional[int] = None, max_width: Optional[int] = None,
+                           focus: Optional[str] = None, task_id: Optional[int] = None, hops: Optional[int] = None) -> str:
+        """
+        生成树状视图。
+        有多个前置任务的任务只在第一次出现时展开子树，之后的出现输出一行回引（↪ ... (见上文)），输出规模与 V+E 成线性关系。
+        
+        Args:
+            max_depth: 最多展开的层数（根节点为第 0 层），超出的子任务折叠为一行计数
+            max_width: 每个任务最多显示的子任务数，其余折叠为一行计数
+            focus, task_id, hops: 含义同 PlanManager.getSubgraph，指定 focus 时只显示该子图（子图内没有前置任务的任务作为根）
+        """
+        if (max_depth is not None and max_depth < 0) or (max_width is not None and max_width < 1):
+            return "Error: max_depth must be >= 0 and max_width must be >= 1"
+        if focus is not None:
+            tasks, error = self._focused_tasks(focus, task_id, hops)
+            if error:
+                return error
+            task_ids = {task["id"] for task in tasks}
+            entries = {task["id"]: _tree_entry(_within(task, task_ids), {}) for task in tasks}
+            title = f"🔍 聚焦: {_describe_focus(focus, task_id, hops)}，共 {len(tasks)} 个任务"
+            return self._build_tree_view(entries, [task["id"] for task in tasks], max_depth, max_width, title)
+        
+        cache = plan_cache(self.pm, "tree", lambda: TaskRenderCache(_tree_entry, sort_by_id=True))
+        with cache.lock:
+            if not cache.sync(self.pm):
+                return "Error: Could not get task list"
+            # 不同的深度/宽度限制分别缓存
+            if cache.output is None:
+                cache.output = {}
+            key = (max_depth, max_width)
+            if key not in cache.output:
+                cache.output[key] = self._build_tree_view(cache.entries, cache.order, max_depth, max_width)
+            return cache.output[key]
+    
+    def _focused_tasks(self, focus: str, task_id: Optional[int], hops: Optional[int]) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """通过 getSubgraph 取出聚焦的子图，返回 (按ID排序的任务列表, 错误文本)"""
+        subgraph = self.pm.getSubgraph(focus, task_id, hops)
+        if not subgraph["success"]:
+            return None, f"Error: {subgraph['message']}"
+        return subgraph["data"], None
+    
+    @staticmethod
+    def _assemble_mermaid(entries: List[Tuple[str, str]], comment: Optional[str] = None) -> str:
+        # 先列出所有节点，再列出所有边
         mermaid_code = ["flowchart TD"]
-        
-        # 添加节点
-        for node in nodes:
-            node_id = f"T{node['id']}"
-            node_name = node['name'].replace('"', "'")
-            status = node['status']
-            
-            # 根据状态选择节点形状
-            if status == "completed":
-                shape = f'{node_id}["{node_name}"]'
-            elif status == "in_progress":
-                shape = f'{node_id}(("{node_name}"))'
-            elif status == "failed":
-                shape = f'{node_id}["{node_name}"]'
-            else:
-                shape = f'{node_id}["{node_name}"]'
-            
-            mermaid_code.append(f"    {shape}")
-            
-            # 添加样式
-            if status in status_colors:
-                mermaid_code.append(f"    style {node_id} {status_colors[status]}")
-        
-        # 添加边
-        for edge in edges:
-            from_node = f"T{edge['from']}"
-            to_node = f"T{edge['to']}"
-            mermaid_code.append(f"    {from_node} --> {to_node}")
-        
+        if comment:
+            mermaid_code.append(f"    {comment}")
+        mermaid_code.extend(node for node, _ in entries)
+        mermaid_code.extend(edges for _, edges in entries if edges)
         return "\n".join(mermaid_code)
     
-    def generate_ascii_graph(self) -> str:
-        """生成ASCII文本图"""
-        graph_data = self.pm.getDependencyGraph()
-        if not graph_data["success"]:
-            return "Error: Could not get dependency graph"
-        
-        nodes = {node["id"]: node for node in graph_data["data"]["nodes"]}
-        edges = graph_data["data"]["edges"]
-        
-        # 构建邻接表
-        dependencies = {}
-        for edge in edges:
-            to_id = edge["to"]
-            from_id = edge["from"]
-            if to_id not in dependencies:
-                dependencies[to_id] = []
-            dependencies[to_id].append(from_id)
-        
-        # 状态符号
-        status_symbols = {
-            "pending": "⏳",
-            "in_progress": "🔄", 
-            "completed": "✅",
-            "failed": "❌",
-            "skipped": "⏭️"
-        }
-        
-        ascii_lines = ["📋 任务依赖关系图", "=" * 50]
-        
+    @staticmethod
+    def _assemble_ascii(lines, title: Optional[str] = None) -> str:
         # 按ID排序显示任务
-        for task_id in sorted(nodes.keys()):
-            node = nodes[task_id]
-            symbol = status_symbols.get(node["status"], "❓")
-            
-            line = f"{symbol} [{task_id}] {node['name']}"
-            
-            # 显示依赖关系
-            if task_id in dependencies:
-                deps = dependencies[task_id]
-                dep_names = [f"[{dep_id}]" for dep_id in sorted(deps)]
-                line += f" (依赖: {', '.join(dep_names)})"
-            
-            ascii_lines.append(line)
-        
+        ascii_lines = ["📋 任务依赖关系图", "=" * 50]
+        if title:
+            ascii_lines.append(title)
+        ascii_lines.extend(lines)
         # 添加图例
         ascii_lines.extend([
             "",
             "📝 状态图例:",
             "⏳ 待处理  🔄 进行中  ✅ 已完成  ❌ 失败  ⏭️ 跳过"
         ])
-        
         return "\n".join(ascii_lines)
     
-    def generate_tree_view(self) -> str:
-        """生成树状视图"""
-        graph_data = self.pm.getDependencyGraph()
-        if not graph_data["success"]:
-            return "Error: Could not get dependency graph"
-        
-        nodes = {node["id"]: node for node in graph_data["data"]["nodes"]}
-        edges = graph_data["data"]["edges"]
-        
-        # 构建父子关系
-        children = {}
-        parents = {}
-        
-        for edge in edges:
-            parent_id = edge["from"]
-            child_id = edge["to"]
-            
-            if parent_id not in children:
-                children[parent_id] = []
-            children[parent_id].append(child_id)
-            
-            if child_id not in parents:
-                parents[child_id] = []
-            parents[child_id].append(parent_id)
-        
-        # 找到根节点（没有父节点的节点）
-        all_nodes = set(nodes.keys())
-        root_nodes = all_nodes - set(parents.keys())
-        
-        def build_tree(node_id: int, prefix: str = "", is_last: bool = True) -> List[str]:
-            node = nodes[node_id]
-            symbol = "✅" if node["status"] == "completed" else "⏳" if node["status"] == "pending" else "🔄"
-            
-            connector = "└── " if is_last else "├── "
-            lines = [f"{prefix}{connector}{symbol} [{node_id}] {node['name']}"]
-            
-            if node_id in children:
-                child_nodes = sorted(children[node_id])
-                for i, child_id in enumerate(child_nodes):
-                    is_last_child = (i == len(child_nodes) - 1)
-                    extension = "    " if is_last else "│   "
-                    lines.extend(build_tree(child_id, prefix + extension, is_last_child))
-            
-            return lines
+    @staticmethod
+    def _build_tree_view(entries: Dict[int, Tuple[str, Tuple[int, ...]]], order: List[int],
+                         max_depth: Optional[int], max_width: Optional[int], title: Optional[str] = None) -> str:
+        # 按ID顺序遍历建立子节点列表，子节点自然按ID排序；找到根节点（没有依赖的节点）
+        children: Dict[int, List[int]] = {}
+        root_nodes = []
+        for task_id in order:
+            dependencies = entries[task_id][1]
+            if not dependencies:
+                root_nodes.append(task_id)
+            for dep_id in dict.fromkeys(dependencies):
+                children.setdefault(dep_id, []).append(task_id)
         
         tree_lines = ["🌳 任务依赖树状图", "=" * 30]
-        
-        for root_id in sorted(root_nodes):
-            tree_lines.extend(build_tree(root_id))
+        if title:
+            tree_lines.append(title)
+        expanded = set()
+        
+        for root_id in root_nodes:
+            # 显式栈代替递归，深链不会触及递归深度限制；栈元素为 (节点ID或折叠计数行, 前缀, 是否最后一个子节点, 深度)
+            stack: List[Tuple[Any, str, bool, int]] = [(root_id, "", True, 0)]
+            while stack:
+                node_id, prefix, is_last, depth = stack.pop()
+                connector = "└── " if is_last else "├── "
+                if isinstance(node_id, str):
+                    tree_lines.append(f"{prefix}{connector}{node_id}")
+                    continue
+                if node_id in expanded:
+                    tree_lines.append(f"{prefix}{connector}↪ {entries[node_id][0]} (见上文)")
+                    continue
+                tree_lines.append(f"{prefix}{connector}{entries[node_id][0]}")
+                
+                child_nodes = children.get(node_id, ())
+                if not child_nodes:
+                    expanded.add(node_id)
+                    continue
+                extension = prefix + ("    " if is_last else "│   ")
+                if max_depth is not None and depth >= max_depth:
+                    # 超出深度限制时不标记为已展开，在更浅的位置再次出现时仍会展开
+                    tree_lines.append(f"{extension}└── … {len(child_nodes)} 个后续任务未展开")
+                    continue
+                expanded.add(node_id)
+                
+                shown = child_nodes if max_width is None else child_nodes[:max_width]
+                items: List[Any] = list(shown)
+                if len(shown) < len(child_nodes):
+                    items.append(f"… 还有 {len(child_nodes) - len(shown)} 个后续任务")
+                # 逆序入栈，保证按顺序输出
+                for i in range(len(items) - 1, -1, -1):
+                    stack.append((items[i], extension, i == len(items) - 1, depth + 1))
             tree_lines.append("")
         
         return "\n".join(tree_lines)
 
 
+class _ContextPromptCache(TaskRenderCache):
+    """上下文提示词缓存：依赖关系一节按任务维护，整段提示词按计划版本缓存"""
+    
+    def __init__(self):
+        super().__init__(DependencyPromptGenerator._dependency_line)
+        self.prompt_version: Optional[int] = None
+        self.prompt: Optional[str] = None
+
+
 class DependencyPromptGenerator:
     """依赖关系Prompt生成器"""
     
     def __init__(self, plan_manager: PlanManager):
         self.pm = plan_manager
     
-    def generate_context_prompt(self) -> str:
-        """生成上下文感知的提示词"""
+    def generate_context_prompt(self, focus: Optional[str] = None, task_id: Optional[int] = None, hops: Optional[int] = None) -> str:
+        """
+        生成上下文感知的提示词（计划版本未变化时直接返回缓存的结果）。
+        指定 focus 时（task_id/hops 含义同 PlanManager.getSubgraph），“任务依赖关系”一节只包含该子图中的任务，不做缓存。
+        """
         plan_status = self.pm.getPlanStatus()
         if not plan_status["success"]:
             return "Error: Could not get plan status"
-        
-        dump_result = self.pm.dumpPlan()
-        if not dump_result.get("success"):
-            return "Error: Could not dump plan data"
-        plan_data = dump_result["data"]
-        
-        goal = plan_data["meta"]["goal"]
-        tasks = plan_data["tasks"]
-        state = plan_data["state"]
-        
+        status = plan_status["data"]
+        version = status["meta"]["version"]
+        
+        if focus is not None:
+            subgraph = self.pm.getSubgraph(focus, task_id, hops)
+            if not subgraph["success"]:
+                return f"Error: {subgraph['message']}"
+            tasks = subgraph["data"]
+            known = {task["id"]: task for task in tasks}
+            # 切片外的依赖任务逐个按ID查询（名称用于依赖关系行，状态用于判断是否可执行）
+            for task in tasks:
+                for dep_id in task["dependencies"]:
+                    if dep_id not in known:
+                        dep_task = self.pm.getTaskById(dep_id)
+                        if dep_task["success"]:
+                            known[dep_id] = dep_task["data"]
+            names = {known_id: known_task["name"] for known_id, known_task in known.items()}
+            # 可执行任务也只列出切片内的，提示词长度与切片大小成正比
+            executable = [
+                task for task in tasks
+                if task["status"] == "pending" and all(dep_id in known and known[dep_id]["status"] in SATISFIED_STATUSES for dep_id in task["dependencies"])
+            ]
+            dependency_text = "\n".join(self._dependency_line(task, names) for task in tasks) if tasks else "没有任务依赖关系"
+            return self._render_context_prompt(status, dependency_text, f"## 任务依赖关系（聚焦: {_describe_focus(focus, task_id, hops)}）", executable)
+        
+        cache = plan_cache(self.pm, "context_prompt", _ContextPromptCache)
+        with cache.lock:
+            if cache.prompt_version == version:
+                return cache.prompt
+            if not cache.sync(self.pm):
+                return "Error: Could not dump plan data"
+            if cache.output is None:
+                cache.output = "\n".join(cache.ordered_entries()) if cache.order else "没有任务依赖关系"
+            prompt = self._render_context_prompt(status, cache.output)
+            # 读取状态与同步依赖关系之间计划可能被其他线程修改，版本一致时才缓存
+            if cache.version == version:
+                cache.prompt_version = version
+                cache.prompt = prompt
+            return prompt
+    
+    def _render_context_prompt(self, status: Dict, dependency_text: str, dependency_title: str = "## 任务依赖关系",
+                               executable_tasks: Optional[List[Dict]] = None) -> str:
         prompt_parts = [
             "# 任务执行上下文",
-            f"## 总体目标\n{goal}",
+            f"## 总体目标\n{status['meta']['goal']}",
             "",
             "## 当前状态"
         ]
@@ -213,24 +332,26 @@ class DependencyPromptGenerator:
             prompt_parts.append("- 当前没有活动任务")
         
         # 可执行任务
-        executable = self.pm.getExecutableTaskList()
-        if executable["success"] and len(executable["data"]) > 0:
+        if executable_tasks is None:
+            executable = self.pm.getExecutableTaskList()
+            executable_tasks = executable["data"] if executable["success"] else []
+        if len(executable_tasks) > 0:
             prompt_parts.append("\n## 可执行任务")
-            for task in executable["data"]:
+            for task in executable_tasks:
                 prompt_parts.append(f"- [{task['id']}] {task['name']}")
         
         # 任务依赖关系
         prompt_parts.extend([
             "",
-            "## 任务依赖关系",
-            self._generate_dependency_text(tasks)
+            dependency_title,
+            dependency_text
         ])
         
         # 执行建议
         prompt_parts.extend([
             "",
             "## 执行建议",
-            self._generate_execution_suggestions(tasks, state)
+            self._generate_execution_suggestions(status["task_counts"], status["state"])
         ])
         
         return "\n".join(prompt_parts)
@@ -340,39 +461,23 @@ class DependencyPromptGenerator:
         
         return "\n".join(prompt_parts)
     
-    def _generate_dependency_text(self, tasks: List[Dict]) -> str:
-        """生成依赖关系文本描述"""
-        lines = []
-        
-        for task in tasks:
-            deps = task.get("dependencies", [])
-            if deps:
-                dep_names = []
-                for dep_id in deps:
-                    dep_task = next((t for t in tasks if t["id"] == dep_id), None)
-                    if dep_task:
-                        dep_names.append(f"[{dep_id}] {dep_task['name']}")
-                
-                lines.append(f"- [{task['id']}] {task['name']} 依赖于: {', '.join(dep_names)}")
-            else:
-                lines.append(f"- [{task['id']}] {task['name']} (无依赖)")
-        
-        return "\n".join(lines) if lines else "没有任务依赖关系"
+    @staticmethod
+    def _dependency_line(task: Dict, names: Dict[int, str]) -> str:
+        """生成单个任务的依赖关系文本行，依赖任务的名称从 ID -> 名称 映射中查找"""
+        deps = task.get("dependencies", [])
+        if deps:
+            dep_names = [f"[{dep_id}] {names[dep_id]}" for dep_id in deps if dep_id in names]
+            return f"- [{task['id']}] {task['name']} 依赖于: {', '.join(dep_names)}"
+        return f"- [{task['id']}] {task['name']} (无依赖)"
     
-    def _generate_execution_suggestions(self, tasks: List[Dict], state: Dict) -> str:
-        """生成执行建议"""
+    def _generate_execution_suggestions(self, task_counts: Dict, state: Dict) -> str:
+        """生成执行建议（状态计数来自 getPlanStatus，无需遍历任务）"""
         suggestions = []
         
-        # 分析任务状态
-        status_counts = {}
-        for task in tasks:
-            status = task["status"]
-            status_counts[status] = status_counts.get(status, 0) + 1
-        
-        total_tasks = len(tasks)
-        completed = status_counts.get("completed", 0)
-        failed = status_counts.get("failed", 0)
-        pending = status_counts.get("pending", 0)
+        total_tasks = task_counts["total"]
+        completed = task_counts.get("completed", 0)
+        failed = task_counts.get("failed", 0)
+        pending = task_counts.get("pending", 0)
         
         # 进度建议
         if completed > 0:
@@ -19,6 +19,8 @@ class TaskInput(BaseModel):
     name: str
     dependencies: List[Union[str, int]]
     reasoning: str
+    estimated_duration: Optional[float] = None
+    priority: Optional[int] = None
 
 class DependencyEdit(BaseModel):
     """
@@ -40,11 +42,23 @@ class TaskOutput(BaseModel):
     dependencies: List[int]
     reasoning: str
     result: Optional[str] = None
+    estimated_duration: Optional[float] = None
+    started_at: Optional[float] = None
+    duration: Optional[float] = None
+    priority: Optional[int] = None
+
+class TaskPageResponse(ToolResponse[List[dict]]):
+    """
+    用于getTaskList工具的响应模型。指定 fields 时任务只包含所选字段。
+    """
+    next_cursor: Optional[str] = Field(None, description="下一页的游标，没有下一页时为空；仅在指定 limit 时返回。")
 
 class PlanStatusMeta(BaseModel):
     goal: str
     created_at: str
     updated_at: str
+    version: int = 0
+    priority_policy: str = "fifo"
 
 class PlanStatusState(BaseModel):
     current_task_id: Optional[int]
@@ -70,4 +84,26 @@ class PlanStatusData(BaseModel):
     meta: PlanStatusMeta
     state: PlanStatusState
     progress: PlanProgress
-    task_counts: PlanTaskCounts 
\ No newline at end of file
+    task_counts: PlanTaskCounts 
+
+class ScheduledTask(BaseModel):
+    id: int
+    name: str
+    status: str
+    duration: float
+    earliest_start: float
+    earliest_finish: float
+    latest_start: float
+    latest_finish: float
+    slack: float
+    critical: bool
+
+class CriticalPathData(BaseModel):
+    """
+    用于getCriticalPath工具，定义其返回数据的详细模型。
+    """
+    makespan: float
+    critical_path: List[int]
+    default_duration: float
+    observed_tasks: int
+    tasks: List[ScheduledTask]
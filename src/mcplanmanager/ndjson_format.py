@@ -0,0 +1,68 @@
+"""
+计划的 NDJSON 流式格式
+第一行是头部 {"format", "version", "meta", "state", "task_count"}，之后每行一个任务（按计划顺序）。
+导出和导入都逐行处理，不会在内存中拼出整个计划的 JSON 文本或字典，适合写入文件或分块 HTTP 响应。
+"""
+
+import json
+from typing import Dict, Iterable, Iterator, Tuple, Union
+
+FORMAT_NAME = "mcplan-ndjson"
+FORMAT_VERSION = 1
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def iter_plan_lines(meta: Dict, state: Dict, tasks: Iterable[Dict], task_count: int) -> Iterator[str]:
+    """逐行生成计划的 NDJSON 文本（每行以换行符结尾）"""
+    yield _encode({
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "meta": meta,
+        "state": state,
+        "task_count": task_count
+    }) + "\n"
+    for task in tasks:
+        yield _encode(task) + "\n"
+
+
+def read_plan_lines(lines: Iterable[Union[str, bytes]]) -> Tuple[Dict, Iterator[Dict]]:
+    """
+    解析 NDJSON 计划，返回 (头部, 任务迭代器)。任务在迭代时才逐行解析。
+    格式错误时抛出 ValueError（头部错误在调用时抛出，任务行错误在迭代到该行时抛出）。
+    """
+    numbered = enumerate(lines, start=1)
+    header = None
+    for line_number, line in numbered:
+        if line.strip():
+            header = _parse_line(line, line_number)
+            break
+    if not isinstance(header, dict) or header.get("format") != FORMAT_NAME:
+        raise ValueError("Missing NDJSON plan header")
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported NDJSON plan version: {header.get('version')}")
+    if not isinstance(header.get("meta"), dict) or not isinstance(header.get("state"), dict):
+        raise ValueError("NDJSON plan header must contain meta and state objects")
+    return header, _iter_tasks(numbered, header.get("task_count"))
+
+
+def _iter_tasks(numbered: Iterator[Tuple[int, Union[str, bytes]]], task_count) -> Iterator[Dict]:
+    count = 0
+    for line_number, line in numbered:
+        if not line.strip():
+            continue
+        task = _parse_line(line, line_number)
+        if not isinstance(task, dict) or not all(key in task for key in ("id", "status", "dependencies")):
+            raise ValueError(f"line {line_number}: not a task object")
+        count += 1
+        yield task
+    # 头部记录了任务数，可以发现被截断的流
+    if task_count is not None and count != task_count:
+        raise ValueError(f"expected {task_count} tasks but got {count} (truncated stream?)")
+
+
+def _parse_line(line: Union[str, bytes], line_number: int):
+    try:
+        return json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"line {line_number}: {e}") from None
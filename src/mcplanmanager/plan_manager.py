@@ -1,7 +1,137 @@
-import json
+import bisect
+import functools
+import heapq
+import itertools
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Union
-from copy import deepcopy
+from typing import Dict, Iterable, List, Optional, Sequence, Set, TextIO, Union
+
+from .binary_format import encode_plan_text, decode_plan_text
+from .ndjson_format import iter_plan_lines, read_plan_lines
+from .task_record import TASK_FIELDS, TaskRecord
+from .wal import apply_record
+
+
+# 在依赖解析中视为"已满足"的任务状态
+SATISFIED_STATUSES = ("completed", "skipped")
+
+# getSubgraph 支持的聚焦方式
+FOCUS_MODES = ("ancestors", "descendants", "neighborhood", "frontier")
+
+# 既没有估计值、计划中也还没有观测到的完成耗时时，任务的默认时长（秒）
+DEFAULT_TASK_DURATION = 1.0
+
+# startNextTask/claimTasks 选择可执行任务的优先级策略（保存在计划的 meta["priority_policy"] 中，默认 fifo）：
+#   fifo: 按计划顺序，排在前面的可执行任务优先
+#   priority: 任务的 priority 字段（整数）越大越优先
+#   critical_path: 从该任务到计划结束的最长估计路径（含自身）越长越优先
+#   most_dependents: 直接依赖该任务的任务越多越优先
+#   shortest_estimated: 估计时长越短越优先
+# 同等优先级的任务按计划顺序排列，因此选择结果只取决于计划内容，导出再导入、换出再换入或从日志恢复后保持不变
+PRIORITY_POLICIES = ("fifo", "priority", "critical_path", "most_dependents", "shortest_estimated")
+
+# 没有估计值的任务按默认时长参与排序；默认时长（已完成任务的平均耗时）相对建堆时偏离超过该比例时重建优先队列
+PRIORITY_DEFAULT_DRIFT = 0.2
+
+
+def normalize_task_list_query(status_filter: Union[str, List[str], None], limit: Optional[int],
+                              cursor: Optional[str], fields: Optional[List[str]]) -> tuple:
+    """
+    校验 getTaskList 的分页参数（PlanManager 与 storage.StoredPlanView 共用）
+
+    Returns:
+        tuple: (状态列表或 None, 游标对应的任务ID或 None, 错误消息或 None)
+    """
+    if isinstance(status_filter, str):
+        statuses = [status_filter] if status_filter else None
+    else:
+        statuses = list(dict.fromkeys(status_filter)) if status_filter else None
+    if limit is not None and limit < 1:
+        return None, None, "limit must be at least 1"
+    if fields is not None:
+        unknown = [field for field in fields if field not in TASK_FIELDS]
+        if unknown:
+            return None, None, f"Unknown fields: {unknown}. Available fields: {sorted(TASK_FIELDS)}"
+    after_id = None
+    if cursor is not None:
+        try:
+            after_id = int(cursor)
+        except ValueError:
+            return None, None, f"Invalid cursor: {cursor!r}"
+    return statuses, after_id, None
+
+
+class _OrderedTaskIds:
+    """
+    按计划顺序排列的任务ID集合（状态索引的一项）
+    分块保存：插入和删除只移动一个块内的元素，不会因为集合很大而退化为 O(n)。
+    任务的顺序由调用方传入的 position 函数（任务ID -> 在计划中的下标）决定。
+    """
+
+    BLOCK_SIZE = 256
+
+    __slots__ = ("_blocks",)
+
+    def __init__(self):
+        self._blocks: List[List[int]] = []
+
+    def _locate(self, position: int, key) -> tuple:
+        """第一个位置不小于 position 的元素所在的 (块下标, 块内下标)"""
+        blocks = self._blocks
+        block_index = bisect.bisect_left(blocks, position, key=lambda block: key(block[-1]))
+        if block_index == len(blocks):
+            return block_index, 0
+        return block_index, bisect.bisect_left(blocks[block_index], position, key=key)
+
+    def append(self, task_id: int) -> None:
+        """追加到末尾（调用方保证任务位于所有已有任务之后）"""
+        if not self._blocks or len(self._blocks[-1]) >= self.BLOCK_SIZE:
+            self._blocks.append([task_id])
+        else:
+            self._blocks[-1].append(task_id)
+
+    def insert(self, task_id: int, key) -> None:
+        blocks = self._blocks
+        position = key(task_id)
+        if not blocks or key(blocks[-1][-1]) < position:
+            self.append(task_id)
+            return
+        block_index, index = self._locate(position, key)
+        block = blocks[block_index]
+        block.insert(index, task_id)
+        if len(block) > 2 * self.BLOCK_SIZE:
+            blocks[block_index:block_index + 1] = [block[:self.BLOCK_SIZE], block[self.BLOCK_SIZE:]]
+
+    def remove(self, task_id: int, key) -> None:
+        block_index, index = self._locate(key(task_id), key)
+        block = self._blocks[block_index]
+        del block[index]
+        if not block:
+            del self._blocks[block_index]
+
+    def iter_from(self, position: int, key):
+        """从第一个位置不小于 position 的任务开始按计划顺序迭代"""
+        block_index, index = self._locate(position, key) if position else (0, 0)
+        if block_index < len(self._blocks):
+            yield from self._blocks[block_index][index:]
+            for block in self._blocks[block_index + 1:]:
+                yield from block
+
+
+def _synchronized(method):
+    """
+    在计划锁内执行方法，保证并发调用看到并修改的是一致的索引和调度器状态。
+    方法正常返回时推进版本，启用预写日志时在释放锁之前把本次调用产生的修改写入日志；
+    方法抛出异常时不记录任何修改。修改计划的方法都先完成全部校验再开始修改，因此抛出异常的调用不会留下修改。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            result = method(self, *args, **kwargs)
+            self._journal_changes(method.__name__)
+            return result
+    return wrapper
 
 
 class PlanManager:
@@ -12,15 +142,84 @@ class PlanManager:
     使用纯内存模式，适用于托管环境和无文件系统权限的场景
     """
     
-    def __init__(self, initial_plan_data: Optional[Dict] = None):
+    def __init__(self, initial_plan_data: Optional[Dict] = None, journal=None):
         """
-        初始化PlanManager（纯内存模式）
+        初始化PlanManager（默认为纯内存模式）
         
         Args:
             initial_plan_data: 初始计划数据（可选）
+            journal: 预写日志（可选，见 wal.PlanJournal）。提供时每次修改都会写入日志，
+                     initial_plan_data 应为从该日志恢复出的计划
         """
-        # 使用提供的数据或创建默认数据
-        self.plan_data = initial_plan_data if initial_plan_data else self._create_empty_plan()
+        # 计划锁：所有公开方法都在锁内执行，多线程并发调用时不会重复领取任务或分配重复ID
+        self._lock = threading.RLock()
+        # 使用提供的数据或创建默认数据；任务在内部保存为 TaskRecord，只在对外返回时生成字典视图
+        self.plan_data = self._adopt_plan(initial_plan_data) if initial_plan_data else self._create_empty_plan()
+        # 任务ID -> 任务记录 的索引，保证按ID查找为 O(1)
+        self._task_index: Dict[int, TaskRecord] = {}
+        # 调度器状态（Kahn 算法）：
+        #   _dependents: 依赖ID -> 依赖它的任务ID集合（反向邻接表）
+        #   _unmet_counts: 任务ID -> 尚未满足的依赖数量
+        #   _ready: 可执行任务ID（pending 且依赖全部满足）的集合
+        #   _ready_order: 同一批任务ID，按计划顺序排列
+        self._dependents: Dict[int, set] = {}
+        self._unmet_counts: Dict[int, int] = {}
+        self._ready: Set[int] = set()
+        self._ready_order = _OrderedTaskIds()
+        # 非 fifo 策略的优先队列：(优先级键, 计划中的下标, 任务ID) 的小顶堆，None 表示需要（重新）建堆
+        # 任务离开就绪集合或优先级变化时不从堆中删除，弹出时与 _ready 和 _ready_keys 比对后跳过旧记录；
+        # 在计划中间插入任务会改变已入堆任务的下标，此时堆需要重建
+        #   _ready_keys: 堆中就绪任务的当前优先级键
+        #   _heap_policy / _heap_default: 建堆时的策略和默认时长，_heap_uses_default 表示有优先级键用到了默认时长
+        #   _bottom_levels: critical_path 策略使用的任务ID -> 最长估计路径，依赖结构或估计时长变化时失效
+        self._ready_heap: Optional[List[tuple]] = None
+        self._ready_keys: Dict[int, float] = {}
+        self._heap_policy: Optional[str] = None
+        self._heap_default = DEFAULT_TASK_DURATION
+        self._heap_uses_default = False
+        self._bottom_levels: Optional[Dict[int, float]] = None
+        self._levels_use_default = False
+        # 动态拓扑序（Pearce-Kelly）：任务ID -> 序号，保证每个任务的序号大于其所有依赖
+        # 新增依赖边时只需在受影响的序号区间内检查环路并调整顺序
+        self._topo_order: Dict[int, int] = {}
+        self._next_topo_rank = 0
+        self._next_task_id = 0
+        # 各状态的任务数量，随每次状态变化增量维护，使状态统计为 O(1)
+        self._status_counts: Dict[str, int] = {}
+        # 状态索引：状态 -> 该状态的任务ID列表（按计划顺序），getTaskList 按状态分页时无需扫描整个计划
+        self._status_tasks: Dict[str, _OrderedTaskIds] = {}
+        # 任务ID -> 在 plan_data["tasks"] 中的下标，插入/删除任务后失效（None）并按需重建
+        self._positions: Optional[Dict[int, int]] = None
+        # 任务租约：任务ID -> {"worker_id", "expires_at"(时间戳)}，以及按到期时间排序的小顶堆
+        # 堆中可能残留已释放或已续约的旧记录，弹出时与 _leases 比对后跳过
+        self._leases: Dict[int, Dict] = {}
+        self._lease_heap: List[tuple] = []
+        # 已完成任务的实际耗时（任务的 duration 字段）之和与个数，作为没有估计值的任务的默认时长
+        self._duration_total = 0.0
+        self._duration_count = 0
+        # 预写日志的修改记录：本次调用中被修改/新增/删除的任务ID，计划是否被整体替换，meta/state 是否变化
+        self._journal = journal
+        self._dirty_tasks: Dict[int, None] = {}
+        self._added_tasks: set = set()
+        self._removed_tasks: set = set()
+        self._plan_replaced = False
+        self._state_changed = False
+        # 计划版本：每次产生修改的调用结束时 +1（同一次调用只 +1），保存在 meta["version"] 中。
+        # 为增量导出记录每个任务最后一次修改、新增、删除时的版本，三个字典都按版本升序排列；
+        # _history_floor 之前（计划被整体替换之前）的版本无法计算增量，只能导出完整计划
+        self._version = 0
+        self._version_bumped = False
+        self._history_floor = 0
+        self._task_versions: Dict[int, int] = {}
+        self._added_versions: Dict[int, int] = {}
+        self._removed_versions: Dict[int, int] = {}
+        # dumpPlan 的快照缓存：计划没有变化时重复导出直接返回同一个快照，O(1)。
+        # 计划变化后快照失效但仍被保留到下一次导出，重建时未修改任务的字典视图仍被它引用，因而可以复用
+        self._dumped: Optional[Dict] = None
+        self._dumped_valid = False
+        self._rebuild_indexes()
+        # 初始数据本身就来自日志（或尚未持久化的空计划），不需要再写入
+        self._journal_changes(None, record=False)
     
     def _create_empty_plan(self) -> Dict:
         """创建空的计划数据结构"""
@@ -37,85 +236,737 @@ class PlanManager:
             "tasks": []
         }
     
+    @staticmethod
+    def _adopt_plan(plan_data: Dict) -> Dict:
+        """把外部的计划字典转换为内部表示（任务转换为 TaskRecord），调用方的数据不会被改动"""
+        adopted = dict(plan_data)
+        adopted["meta"] = dict(plan_data["meta"])
+        adopted["state"] = dict(plan_data["state"])
+        adopted["tasks"] = [TaskRecord.from_dict(task) for task in plan_data["tasks"]]
+        return adopted
+    
+    def _rebuild_indexes(self) -> None:
+        """根据 plan_data["tasks"] 重建内部索引和调度器状态"""
+        self._task_index = {task.id: task for task in self.plan_data["tasks"]}
+        self._dependents = {}
+        self._unmet_counts = {}
+        self._ready = set()
+        self._ready_order = _OrderedTaskIds()
+        self._ready_heap = None
+        self._ready_keys = {}
+        self._bottom_levels = None
+        self._status_counts = {}
+        self._status_tasks = {}
+        self._positions = None
+        self._duration_total = 0.0
+        self._duration_count = 0
+        for task in self.plan_data["tasks"]:
+            self._observe_duration(task, 1)
+            self._status_counts[task.status] = self._status_counts.get(task.status, 0) + 1
+            if task.status not in self._status_tasks:
+                self._status_tasks[task.status] = _OrderedTaskIds()
+            self._status_tasks[task.status].append(task.id)
+            for dep_id in set(task.dependencies):
+                self._dependents.setdefault(dep_id, set()).add(task.id)
+        for task in self.plan_data["tasks"]:
+            self._unmet_counts[task.id] = self._count_unmet_dependencies(task.dependencies)
+            self._refresh_ready(task)
+        self._rebuild_topological_order()
+        self._next_task_id = self._compute_next_task_id()
+        self._load_leases()
+        self._version = max(self._version, self.plan_data["meta"].get("version", 0))
+        self.plan_data["meta"]["version"] = self._version
+        self._history_floor = self._version
+        self._task_versions = {}
+        self._added_versions = {}
+        self._removed_versions = {}
+        self._plan_replaced = True
+    
+    def _rebuild_topological_order(self) -> None:
+        """用 Kahn 算法一次性计算所有任务的拓扑序号，O(V+E)"""
+        in_degrees = {
+            task_id: sum(1 for dep_id in set(task.dependencies) if dep_id in self._task_index)
+            for task_id, task in self._task_index.items()
+        }
+        queue = [task_id for task_id, degree in in_degrees.items() if degree == 0]
+        self._topo_order = {}
+        for task_id in queue:
+            self._topo_order[task_id] = len(self._topo_order)
+            for dependent_id in self._dependents.get(task_id, ()):
+                in_degrees[dependent_id] -= 1
+                if in_degrees[dependent_id] == 0:
+                    queue.append(dependent_id)
+        # 存在环路时（例如通过构造函数传入的未校验数据），剩余任务按原顺序排在最后
+        for task_id in self._task_index:
+            if task_id not in self._topo_order:
+                self._topo_order[task_id] = len(self._topo_order)
+        self._next_topo_rank = len(self._topo_order)
+    
+    def _reorder_for_edge(self, dep_id: int, task_id: int,
+                          rank_log: Optional[List[tuple]] = None) -> Optional[List[int]]:
+        """
+        Pearce-Kelly 动态拓扑排序：在 task_id 依赖 dep_id 这条边加入后维护拓扑序。
+        只搜索序号位于 [序号(task_id), 序号(dep_id)] 区间内的任务，与整个计划的规模无关。
+
+        Args:
+            rank_log: 如果提供，会记录被修改任务的 (任务ID, 原序号)，用于回滚。
+
+        Returns:
+            Optional[List[int]]: 这条边形成的环路，没有环路时返回 None。
+        """
+        order = self._topo_order
+        if dep_id not in order or task_id not in order:
+            return None
+        upper, lower = order[dep_id], order[task_id]
+        if lower > upper:
+            return None
+        if dep_id == task_id:
+            return [task_id, task_id]
+        
+        # 正向搜索：所有（间接）依赖 task_id 且序号小于 dep_id 的任务
+        parents: Dict[int, Optional[int]] = {task_id: None}
+        stack = [task_id]
+        forward = []
+        while stack:
+            current_id = stack.pop()
+            forward.append(current_id)
+            for dependent_id in self._dependents.get(current_id, ()):
+                if dependent_id == dep_id:
+                    path = [current_id]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    return [task_id, dep_id] + path
+                if dependent_id not in parents and order[dependent_id] < upper:
+                    parents[dependent_id] = current_id
+                    stack.append(dependent_id)
+        
+        # 反向搜索：dep_id 的所有（间接）依赖中序号大于 task_id 的任务
+        seen = {dep_id}
+        stack = [dep_id]
+        backward = []
+        while stack:
+            current_id = stack.pop()
+            backward.append(current_id)
+            for prerequisite_id in self._task_index[current_id].dependencies:
+                if prerequisite_id in order and prerequisite_id not in seen and order[prerequisite_id] > lower:
+                    seen.add(prerequisite_id)
+                    stack.append(prerequisite_id)
+        
+        # 复用这些任务原有的序号，把反向集合整体排到正向集合之前
+        backward.sort(key=order.__getitem__)
+        forward.sort(key=order.__getitem__)
+        affected = backward + forward
+        for affected_id, rank in zip(affected, sorted(order[affected_id] for affected_id in affected)):
+            if rank_log is not None and order[affected_id] != rank:
+                rank_log.append((affected_id, order[affected_id]))
+            order[affected_id] = rank
+        return None
+    
+    def _rollback_topological_order(self, rank_log: List[tuple]) -> None:
+        for task_id, rank in reversed(rank_log):
+            self._topo_order[task_id] = rank
+    
+    def _snapshot(self) -> Dict:
+        """
+        生成计划的只读快照。
+        任务以字典视图导出，未修改过的任务复用之前的视图，因此频繁导出时只有被修改的任务会生成新字典；
+        计划自上次导出以来没有变化时直接返回缓存的快照。
+        """
+        if self._dumped_valid and not self._has_pending_changes():
+            return self._dumped
+        snapshot = dict(self.plan_data)
+        snapshot["meta"] = dict(self.plan_data["meta"])
+        snapshot["state"] = self._exported_state()
+        snapshot["tasks"] = [task.to_dict() for task in self.plan_data["tasks"]]
+        # 调用中途（修改尚未结束）生成的快照之后可能还会变化，不作为有效缓存
+        self._dumped = snapshot
+        self._dumped_valid = not self._has_pending_changes()
+        return snapshot
+    
+    def _has_pending_changes(self) -> bool:
+        """本次调用是否已经修改了计划（修改记录在调用结束时由 _journal_changes 清空）"""
+        return bool(self._plan_replaced or self._dirty_tasks or self._removed_tasks or self._state_changed)
+    
+    def _exported_state(self) -> Dict:
+        """导出用的 state 副本，运行期间只保存在 _leases 中的租约会一并写入"""
+        state = dict(self.plan_data["state"])
+        if self._leases:
+            state["leases"] = {
+                str(task_id): {"worker_id": lease["worker_id"], "expires_at": datetime.fromtimestamp(lease["expires_at"]).isoformat()}
+                for task_id, lease in self._leases.items()
+            }
+        return state
+    
+    def _journal_changes(self, operation: Optional[str], record: bool = True) -> None:
+        """
+        把本次调用产生的修改写入预写日志，并清空修改记录。
+        日志记录的是被修改任务调用结束时的完整内容（物理日志），回放结果与时间无关；
+        计划被整体替换（initializePlan/loadPlan）或日志累积到阈值时直接压缩为快照。
+        有修改时同时推进计划版本，并记录被修改任务的版本供增量导出使用。
+        """
+        if self._has_pending_changes():
+            self._dumped_valid = False
+            if record:
+                self._bump_version()
+                self._track_versions()
+        if record and self._journal is not None:
+            if self._plan_replaced or (self._journal.should_compact and (self._dirty_tasks or self._state_changed)):
+                self._journal.compact(self._snapshot())
+            elif self._dirty_tasks or self._removed_tasks or self._state_changed:
+                self._journal.append({
+                    "op": operation,
+                    "meta": dict(self.plan_data["meta"]),
+                    "state": self._exported_state(),
+                    "upsert": [self._task_index[task_id].to_dict() for task_id in self._dirty_tasks],
+                    "insert": {str(task_id): self._task_position(task_id) for task_id in self._added_tasks},
+                    "remove": list(self._removed_tasks)
+                })
+        self._dirty_tasks.clear()
+        self._added_tasks.clear()
+        self._removed_tasks.clear()
+        self._plan_replaced = False
+        self._state_changed = False
+        self._version_bumped = False
+    
+    def _bump_version(self) -> None:
+        """本次调用第一次产生修改时推进计划版本"""
+        if not self._version_bumped:
+            self._version += 1
+            self.plan_data["meta"]["version"] = self._version
+            self._version_bumped = True
+    
+    def _track_versions(self) -> None:
+        """把本次调用修改、新增、删除的任务登记到当前版本（移到各字典末尾，保持按版本升序）"""
+        version = self._version
+        if self._plan_replaced:
+            self._history_floor = version
+            self._task_versions.clear()
+            self._added_versions.clear()
+            self._removed_versions.clear()
+            return
+        # 先处理删除再处理新增：同一次调用中删除后又以相同ID新增的任务需要两条记录都保留
+        for task_id in self._removed_tasks:
+            self._task_versions.pop(task_id, None)
+            self._added_versions.pop(task_id, None)
+            self._removed_versions.pop(task_id, None)
+            self._removed_versions[task_id] = version
+        for task_id in self._added_tasks:
+            self._added_versions.pop(task_id, None)
+            self._added_versions[task_id] = version
+        for task_id in self._dirty_tasks:
+            self._task_versions.pop(task_id, None)
+            self._task_versions[task_id] = version
+    
+    def _load_leases(self) -> None:
+        """从 state["leases"] 恢复租约，只保留仍处于 in_progress 的任务；运行期间租约只保存在 _leases 中"""
+        self._leases = {}
+        self._lease_heap = []
+        if "leases" not in self.plan_data["state"]:
+            return
+        self.plan_data["state"] = dict(self.plan_data["state"])
+        for task_id, lease in self.plan_data["state"].pop("leases").items():
+            task = self._task_index.get(int(task_id))
+            if task and task.status == "in_progress":
+                self._grant_lease(int(task_id), lease["worker_id"], datetime.fromisoformat(lease["expires_at"]).timestamp())
+    
+    def _grant_lease(self, task_id: int, worker_id: str, expires_at: float) -> None:
+        """为任务登记（或续约）租约"""
+        self._leases[task_id] = {"worker_id": worker_id, "expires_at": expires_at}
+        heapq.heappush(self._lease_heap, (expires_at, task_id))
+        self._state_changed = True
+    
+    def _expire_leases(self) -> None:
+        """把租约已过期的任务退回 pending。惰性执行，没有过期租约时为 O(1)"""
+        now = time.time()
+        expired = False
+        while self._lease_heap and self._lease_heap[0][0] <= now:
+            expires_at, task_id = heapq.heappop(self._lease_heap)
+            lease = self._leases.get(task_id)
+            if lease is None or lease["expires_at"] != expires_at:
+                continue
+            self._set_status(self._writable_task(task_id), "pending")
+            if self.plan_data["state"]["current_task_id"] == task_id:
+                self.plan_data["state"]["current_task_id"] = None
+            expired = True
+        if expired:
+            self._update_timestamp()
+    
+    def _task_position(self, task_id: int) -> int:
+        if self._positions is None:
+            self._positions = {task.id: i for i, task in enumerate(self.plan_data["tasks"])}
+        return self._positions[task_id]
+    
+    def _position_key(self):
+        """任务ID -> 下标 的查找函数，供状态索引排序使用（比逐次调用 _task_position 快）"""
+        if self._positions is None:
+            self._positions = {task.id: i for i, task in enumerate(self.plan_data["tasks"])}
+        return self._positions.__getitem__
+    
+    def _add_to_status_index(self, status: str, task_id: int) -> None:
+        """按计划顺序把任务插入状态索引"""
+        if status not in self._status_tasks:
+            self._status_tasks[status] = _OrderedTaskIds()
+        self._status_tasks[status].insert(task_id, self._position_key())
+    
+    def _remove_from_status_index(self, status: str, task_id: int) -> None:
+        """从状态索引中移除任务（任务此时必须仍在计划中）"""
+        self._status_tasks[status].remove(task_id, self._position_key())
+    
+    def _writable_task(self, task_id: int) -> TaskRecord:
+        """返回即将被修改的任务记录：登记到本次调用的修改记录中，并使已导出的字典视图与它脱钩"""
+        task = self._task_index[task_id]
+        self._dirty_tasks[task_id] = None
+        task.invalidate()
+        return task
+    
+    def _is_satisfied(self, task_id: int) -> bool:
+        """任务是否存在且处于已满足状态（不存在的依赖视为未满足）"""
+        task = self._task_index.get(task_id)
+        return task is not None and task.status in SATISFIED_STATUSES
+    
+    def _count_finished_tasks(self) -> int:
+        """已完成或已跳过的任务数量，O(1)"""
+        return sum(self._status_counts.get(status, 0) for status in SATISFIED_STATUSES)
+    
+    def _count_unmet_dependencies(self, dependencies: Sequence[int]) -> int:
+        return sum(1 for dep_id in set(dependencies) if not self._is_satisfied(dep_id))
+    
+    def _refresh_ready(self, task: TaskRecord) -> None:
+        """根据状态和未满足依赖数，把任务加入或移出就绪集合"""
+        task_id = task.id
+        if task.status == "pending" and self._unmet_counts.get(task_id) == 0:
+            if task_id not in self._ready:
+                self._ready.add(task_id)
+                self._ready_order.insert(task_id, self._position_key())
+                if self._ready_heap is not None:
+                    self._push_ready(task_id)
+        else:
+            self._discard_ready(task_id)
+    
+    def _discard_ready(self, task_id: int) -> None:
+        if task_id in self._ready:
+            self._ready.discard(task_id)
+            self._ready_order.remove(task_id, self._position_key())
+        self._ready_keys.pop(task_id, None)
+    
+    def _propagate_satisfaction(self, task_id: int, delta: int) -> None:
+        """任务的满足状态变化时，调整所有依赖它的任务的未满足计数，O(出度)"""
+        for dependent_id in self._dependents.get(task_id, ()):
+            self._unmet_counts[dependent_id] += delta
+            self._refresh_ready(self._task_index[dependent_id])
+    
+    def _set_status(self, task: TaskRecord, status: str) -> None:
+        """修改任务状态，并增量维护调度器状态"""
+        was_satisfied = task.status in SATISFIED_STATUSES
+        self._record_timing(task, status)
+        self._status_counts[task.status] -= 1
+        self._status_counts[status] = self._status_counts.get(status, 0) + 1
+        self._remove_from_status_index(task.status, task.id)
+        self._add_to_status_index(status, task.id)
+        task.status = status
+        if status != "in_progress":
+            # 任务离开 in_progress（完成、失败、跳过、重置、过期）时租约随之释放
+            self._leases.pop(task.id, None)
+        is_satisfied = status in SATISFIED_STATUSES
+        if was_satisfied != is_satisfied:
+            self._propagate_satisfaction(task.id, -1 if is_satisfied else 1)
+        self._refresh_ready(task)
+    
+    def _record_timing(self, task: TaskRecord, status: str) -> None:
+        """
+        状态变化时记录任务的耗时（任务须已通过 _writable_task 取得）：
+        进入 in_progress 时记录 started_at，完成时根据 started_at 记录实际耗时 duration（秒）
+        """
+        self._observe_duration(task, -1)
+        if status == "in_progress" and task.status != "in_progress":
+            self._set_task_extra(task, started_at=round(time.time(), 3))
+        elif status == "completed" and task.extra and task.extra.get("started_at") is not None:
+            self._set_task_extra(task, duration=round(max(time.time() - task.extra["started_at"], 0.0), 3))
+        if status == "completed":
+            self._observe_duration(task, 1, status)
+    
+    def _observe_duration(self, task: TaskRecord, sign: int, status: Optional[str] = None) -> None:
+        """把已完成任务的实际耗时计入（sign=1）或移出（sign=-1）默认时长的统计"""
+        if (status or task.status) == "completed" and task.extra:
+            duration = task.extra.get("duration")
+            if isinstance(duration, (int, float)):
+                self._duration_total += sign * duration
+                self._duration_count += sign
+    
+    @staticmethod
+    def _set_task_extra(task: TaskRecord, **fields) -> None:
+        """修改任务的附加字段，值为 None 时删除该字段（记录须已 invalidate）"""
+        extra = dict(task.extra) if task.extra else {}
+        for key, value in fields.items():
+            if value is None:
+                extra.pop(key, None)
+            else:
+                extra[key] = value
+        task.extra = extra or None
+    
+    @staticmethod
+    def _validate_duration(value) -> Optional[str]:
+        """校验 estimated_duration，合法时返回 None，否则返回错误消息"""
+        if value is None:
+            return None
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            return f"estimated_duration must be a non-negative number of seconds, got {value!r}"
+        return None
+    
+    @staticmethod
+    def _validate_priority(value) -> Optional[str]:
+        """校验 priority，合法时返回 None，否则返回错误消息"""
+        if value is None:
+            return None
+        if isinstance(value, bool) or not isinstance(value, int):
+            return f"priority must be an integer, got {value!r}"
+        return None
+    
+    def _default_duration(self) -> float:
+        """没有估计值的任务的默认时长：已观测到的平均完成耗时，没有观测数据时为 DEFAULT_TASK_DURATION"""
+        if self._duration_count:
+            return self._duration_total / self._duration_count
+        return DEFAULT_TASK_DURATION
+    
+    def _link_dependency(self, dep_id: int, task_id: int) -> None:
+        """登记 task_id 依赖 dep_id 这条边（反向邻接表 + 未满足计数）"""
+        self._dependents.setdefault(dep_id, set()).add(task_id)
+        if not self._is_satisfied(dep_id):
+            self._unmet_counts[task_id] += 1
+        self._reprioritize(dep_id, structural=True)
+    
+    def _unlink_dependency(self, dep_id: int, task_id: int) -> None:
+        """注销 task_id 依赖 dep_id 这条边"""
+        dependents = self._dependents[dep_id]
+        dependents.discard(task_id)
+        if not dependents:
+            del self._dependents[dep_id]
+        if not self._is_satisfied(dep_id):
+            self._unmet_counts[task_id] -= 1
+        self._reprioritize(dep_id, structural=True)
+    
+    # 可执行任务的优先级
+    
+    def _priority_policy(self) -> str:
+        policy = self.plan_data["meta"].get("priority_policy", "fifo")
+        return policy if policy in PRIORITY_POLICIES else "fifo"
+    
+    def _take_ready_tasks(self, max_n: int) -> List[int]:
+        """按计划的优先级策略取出最多 max_n 个可执行任务的ID，调用方随后把它们标记为 in_progress"""
+        policy = self._priority_policy()
+        if policy == "fifo":
+            return list(itertools.islice(self._ready_order.iter_from(0, None), max_n))
+        heap = self._priority_queue(policy)
+        taken = []
+        while heap and len(taken) < max_n:
+            key, _, task_id = heapq.heappop(heap)
+            if task_id in self._ready and self._ready_keys.get(task_id) == key:
+                del self._ready_keys[task_id]
+                taken.append(task_id)
+        return taken
+    
+    def _priority_queue(self, policy: str) -> List[tuple]:
+        """返回与 policy 一致的优先队列，必要时重新建堆（O(R log R)，critical_path 另需 O(V+E) 计算最长路径）"""
+        heap = self._ready_heap
+        if heap is not None and self._heap_policy == policy:
+            uses_default = self._levels_use_default if policy == "critical_path" else self._heap_uses_default
+            if uses_default and abs(self._default_duration() - self._heap_default) > PRIORITY_DEFAULT_DRIFT * self._heap_default:
+                self._bottom_levels = None
+            elif len(heap) > 2 * len(self._ready_keys) + 64:
+                # 旧记录过多时压缩
+                position = self._position_key()
+                heap = self._ready_heap = [(key, position(task_id), task_id) for task_id, key in self._ready_keys.items()]
+                heapq.heapify(heap)
+                return heap
+            else:
+                return heap
+        
+        self._heap_policy = policy
+        self._heap_default = self._default_duration()
+        self._heap_uses_default = False
+        if policy == "critical_path" and self._bottom_levels is None:
+            self._bottom_levels = self._compute_bottom_levels(self._heap_default)
+        self._ready_keys = {task_id: self._priority_key(task_id) for task_id in self._ready}
+        position = self._position_key()
+        heap = self._ready_heap = [(key, position(task_id), task_id) for task_id, key in self._ready_keys.items()]
+        heapq.heapify(heap)
+        return heap
+    
+    def _priority_key(self, task_id: int) -> float:
+        """任务在当前优先队列策略下的排序键，越小越优先"""
+        policy = self._heap_policy
+        if policy == "most_dependents":
+            return -len(self._dependents.get(task_id, ()))
+        if policy == "critical_path":
+            return -self._bottom_levels[task_id]
+        extra = self._task_index[task_id].extra
+        if policy == "priority":
+            return -(extra.get("priority", 0) if extra else 0)
+        estimate = extra.get("estimated_duration") if extra else None
+        if estimate is None:
+            self._heap_uses_default = True
+            return self._heap_default
+        return estimate
+    
+    def _push_ready(self, task_id: int) -> None:
+        key = self._priority_key(task_id)
+        if self._ready_keys.get(task_id) != key:
+            self._ready_keys[task_id] = key
+            heapq.heappush(self._ready_heap, (key, self._task_position(task_id), task_id))
+    
+    def _reprioritize(self, task_id: int, structural: bool = False) -> None:
+        """
+        task_id 的优先级可能变化时调用（依赖边、估计时长、priority 字段变化）。
+        structural 表示依赖结构或估计时长变化：缓存的最长路径失效，critical_path 策略的优先队列在下次取任务时重建
+        """
+        if structural:
+            self._bottom_levels = None
+            if self._heap_policy == "critical_path":
+                self._ready_heap = None
+        if self._ready_heap is not None and task_id in self._ready:
+            self._push_ready(task_id)
+    
+    def _compute_bottom_levels(self, default_duration: float) -> Dict[int, float]:
+        """
+        每个任务到计划结束的最长估计路径（含自身，即 b-level）：按拓扑序逆序遍历一次，O(V log V + E)。
+        只取决于依赖结构和估计时长，与任务状态无关，因此只在二者变化后重新计算
+        """
+        levels: Dict[int, float] = {}
+        task_index = self._task_index
+        uses_default = False
+        for task_id in sorted(task_index, key=self._topo_order.__getitem__, reverse=True):
+            extra = task_index[task_id].extra
+            estimate = extra.get("estimated_duration") if extra else None
+            if estimate is None:
+                estimate, uses_default = default_duration, True
+            levels[task_id] = estimate + max((levels[dependent_id] for dependent_id in self._dependents.get(task_id, ())), default=0.0)
+        self._levels_use_default = uses_default
+        return levels
+    
+    def _replace_dependencies(self, new_dependencies: Dict[int, List[int]]) -> Optional[List[int]]:
+        """
+        原子地替换一个或多个任务的依赖列表。
+        先移除所有被删除的边，再逐条加入新增的边并做增量环路检测（Pearce-Kelly），
+        这样每条边检查时图中的其余边都满足当前拓扑序。出现环路时完整回滚。
+        任务记录只在确认没有环路之后才登记为已修改，被回滚的编辑不会使缓存失效，也不会推进版本或写入日志。
+
+        Args:
+            new_dependencies: 任务ID -> 新的依赖ID列表（依赖必须已验证存在）
+
+        Returns:
+            Optional[List[int]]: 形成的环路，成功时返回 None。
+        """
+        old_dependencies = {task_id: self._task_index[task_id].dependencies for task_id in new_dependencies}
+        added_edges = []
+        for task_id, dependencies in new_dependencies.items():
+            old_set, new_set = set(old_dependencies[task_id]), set(dependencies)
+            for dep_id in old_set - new_set:
+                self._unlink_dependency(dep_id, task_id)
+            # 拓扑序的反向搜索读取依赖列表，因此依赖列表要与已登记的边保持一致（临时修改，回滚时原样恢复）
+            self._task_index[task_id].dependencies = tuple(dep_id for dep_id in old_dependencies[task_id] if dep_id in new_set)
+            added_edges.extend((dep_id, task_id) for dep_id in new_set - old_set)
+        
+        rank_log = []
+        for position, (dep_id, task_id) in enumerate(added_edges):
+            self._link_dependency(dep_id, task_id)
+            self._task_index[task_id].dependencies += (dep_id,)
+            cycle = self._reorder_for_edge(dep_id, task_id, rank_log)
+            if cycle:
+                for linked_dep_id, linked_task_id in added_edges[:position + 1]:
+                    self._unlink_dependency(linked_dep_id, linked_task_id)
+                for task_id, dependencies in old_dependencies.items():
+                    for dep_id in set(dependencies) - set(new_dependencies[task_id]):
+                        self._link_dependency(dep_id, task_id)
+                    self._task_index[task_id].dependencies = dependencies
+                self._rollback_topological_order(rank_log)
+                return cycle
+        
+        for task_id, dependencies in new_dependencies.items():
+            task = self._writable_task(task_id)
+            task.dependencies = tuple(dependencies)
+            self._refresh_ready(task)
+        return None
+    
+    def _index_task(self, task: TaskRecord) -> None:
+        """把新任务登记到索引和调度器中"""
+        task_id = task.id
+        self._task_index[task_id] = task
+        self._dirty_tasks[task_id] = None
+        self._added_tasks.add(task_id)
+        self._status_counts[task.status] = self._status_counts.get(task.status, 0) + 1
+        self._add_to_status_index(task.status, task_id)
+        self._topo_order[task_id] = self._next_topo_rank
+        self._next_topo_rank += 1
+        self._next_task_id = max(self._next_task_id, task_id + 1)
+        for dep_id in set(task.dependencies):
+            self._dependents.setdefault(dep_id, set()).add(task_id)
+        self._unmet_counts[task_id] = self._count_unmet_dependencies(task.dependencies)
+        # 新任务改变了其依赖的最长路径和后继数量，须在加入就绪集合之前使缓存失效
+        self._reprioritize(task_id, structural=True)
+        for dep_id in set(task.dependencies):
+            self._reprioritize(dep_id)
+        self._refresh_ready(task)
+        self._observe_duration(task, 1)
+        if task.status in SATISFIED_STATUSES:
+            self._propagate_satisfaction(task_id, -1)
+    
+    def _unindex_task(self, task: TaskRecord) -> None:
+        """把任务从索引和调度器中移除（在任务从 plan_data["tasks"] 中删除之前调用）"""
+        task_id = task.id
+        self._observe_duration(task, -1)
+        if task.status in SATISFIED_STATUSES:
+            self._propagate_satisfaction(task_id, 1)
+        for dep_id in set(task.dependencies):
+            dependents = self._dependents[dep_id]
+            dependents.discard(task_id)
+            if not dependents:
+                del self._dependents[dep_id]
+            self._reprioritize(dep_id, structural=True)
+        del self._task_index[task_id]
+        self._status_counts[task.status] -= 1
+        self._remove_from_status_index(task.status, task_id)
+        del self._topo_order[task_id]
+        del self._unmet_counts[task_id]
+        self._discard_ready(task_id)
+        self._leases.pop(task_id, None)
+        self._dirty_tasks.pop(task_id, None)
+        if task_id in self._added_tasks:
+            self._added_tasks.discard(task_id)
+        else:
+            self._removed_tasks.add(task_id)
+        if task_id + 1 == self._next_task_id:
+            self._next_task_id = self._compute_next_task_id()
+    
     def _update_timestamp(self) -> None:
         """更新时间戳"""
         self.plan_data["meta"]["updated_at"] = datetime.now().isoformat()
+        self._state_changed = True
+        self._bump_version()
     
     def _get_next_task_id(self) -> int:
         """获取下一个任务ID（从0开始）"""
-        if not self.plan_data["tasks"]:
-            return 0
-        return max(task["id"] for task in self.plan_data["tasks"]) + 1
+        return self._next_task_id
     
-    def _find_task_by_id(self, task_id: int) -> Optional[Dict]:
-        """根据ID查找任务"""
-        for task in self.plan_data["tasks"]:
-            if task["id"] == task_id:
-                return task
-        return None
+    def _compute_next_task_id(self) -> int:
+        """
+        计算下一个可用的任务ID
+        同时跳过被引用但不存在的依赖ID，保证新任务不会被任何已有任务依赖
+        """
+        return max(max(self._task_index, default=-1), max(self._dependents, default=-1)) + 1
+    
+    def _find_task_by_id(self, task_id: int) -> Optional[TaskRecord]:
+        """根据ID查找任务（基于索引，O(1)）"""
+        return self._task_index.get(task_id)
     
-    def _check_dependencies_satisfied(self, task: Dict) -> bool:
+    def _check_dependencies_satisfied(self, task: TaskRecord) -> bool:
         """检查任务的依赖是否已满足（已完成或已跳过）"""
-        for dep_id in task["dependencies"]:
-            dep_task = self._find_task_by_id(dep_id)
-            if not dep_task or dep_task["status"] not in ["completed", "skipped"]:
-                return False
-        return True
-    
-    def _detect_circular_dependency(self, task_id: int, dependencies: List[int], tasks_list: List[Dict] = None) -> bool:
-        """检测循环依赖"""
-        # 使用提供的任务列表或者当前计划的任务列表
-        tasks_to_check = tasks_list if tasks_list is not None else self.plan_data["tasks"]
-        
-        def find_task_in_list(tid: int) -> Optional[Dict]:
-            for task in tasks_to_check:
-                if task["id"] == tid:
-                    return task
-            return None
-        
-        def has_path(from_id: int, to_id: int, visited: set) -> bool:
-            if from_id == to_id:
-                return True
-            if from_id in visited:
-                return False
-            
-            visited.add(from_id)
-            task = find_task_in_list(from_id)
-            if task:
-                for dep_id in task["dependencies"]:
-                    if has_path(dep_id, to_id, visited.copy()):
-                        return True
-            return False
-        
-        for dep_id in dependencies:
-            if has_path(dep_id, task_id, set()):
-                return True
-        return False
+        return self._unmet_counts.get(task.id) == 0
     
+    def _find_cycle(self, dependencies: Dict[int, Sequence[int]]) -> Optional[List[int]]:
+        """
+        在整个依赖图（任务ID -> 依赖ID列表）中查找环路。
+        迭代式三色 DFS，一次遍历完成，复杂度 O(V+E)，不受递归深度限制。
+
+        Returns:
+            Optional[List[int]]: 找到的第一个环路，没有环路时返回 None。
+        """
+        visiting, done = 1, 2
+        marks: Dict[int, int] = {}
+        for root_id in dependencies:
+            if root_id in marks:
+                continue
+            marks[root_id] = visiting
+            stack = [(root_id, iter(dependencies[root_id]))]
+            while stack:
+                current_id, deps_iter = stack[-1]
+                for dep_id in deps_iter:
+                    if dep_id not in dependencies:
+                        continue
+                    mark = marks.get(dep_id)
+                    if mark == visiting:
+                        path = [node_id for node_id, _ in stack]
+                        return path[path.index(dep_id):] + [dep_id]
+                    if mark is None:
+                        marks[dep_id] = visiting
+                        stack.append((dep_id, iter(dependencies[dep_id])))
+                        break
+                else:
+                    marks[current_id] = done
+                    stack.pop()
+        return None
     
+    @staticmethod
+    def _format_cycle(cycle: List[int]) -> str:
+        return " -> ".join(str(task_id) for task_id in cycle)
     
-    def loadPlan(self, plan_data: Dict) -> Dict:
+    @_synchronized
+    def loadPlan(self, plan_data: Union[Dict, str, bytes]) -> Dict:
         """
         直接加载一个完整的计划对象，替换现有计划。
+        计划的版本号（meta.version）比当前版本新时原样保留，否则推进到当前版本 + 1，
+        因此 loadPlan(dumpPlan()) 得到的副本可以继续应用源计划的 dumpPlanDelta(version)。
 
         Args:
-            plan_data (Dict): 符合PlanManager内部数据结构的完整计划字典。
+            plan_data (Union[Dict, str, bytes]): 符合PlanManager内部数据结构的完整计划字典，
+                或 dumpPlan(format="binary") 导出的二进制计划（base64 文本或原始字节）。
 
         Returns:
             Dict: 操作结果。
         """
+        if isinstance(plan_data, (str, bytes)):
+            try:
+                plan_data = decode_plan_text(plan_data)
+            except ValueError as e:
+                return {"success": False, "message": f"Invalid binary plan: {e}"}
+
         # (可选) 在这里可以添加对 plan_data 结构的验证
         # 例如，检查 'meta', 'state', 'tasks' 等关键字段是否存在
         if not all(k in plan_data for k in ["meta", "state", "tasks"]):
             return {"success": False, "message": "Invalid plan structure provided."}
         
-        self.plan_data = deepcopy(plan_data)
+        # 不深拷贝：任务转换为内部记录，字符串等值对象直接共享，调用方的数据不会被改动
+        return self._install_plan(self._adopt_plan(plan_data))
+    
+    @_synchronized
+    def loadPlanStream(self, lines: Iterable[Union[str, bytes]]) -> Dict:
+        """
+        从 NDJSON 流（见 ndjson_format，例如打开的文件）逐行加载计划，替换现有计划。
+        每行解析后立即转换为任务记录，不会先构造整个计划的字典。
+
+        Args:
+            lines: 按行迭代的文本或字节，例如以文本模式打开的文件。
+
+        Returns:
+            Dict: 操作结果。
+        """
+        try:
+            header, tasks = read_plan_lines(lines)
+            records = [TaskRecord.from_dict(task) for task in tasks]
+        except (ValueError, TypeError) as e:
+            return {"success": False, "message": f"Invalid NDJSON plan: {e}"}
+        return self._install_plan({"meta": dict(header["meta"]), "state": dict(header["state"]), "tasks": records})
+    
+    def _install_plan(self, plan_data: Dict) -> Dict:
+        """用已转换为内部表示的计划替换当前计划"""
+        # 拓扑序只对无环图有意义，拒绝包含循环依赖的计划
+        cycle = self._find_cycle({task.id: task.dependencies for task in plan_data["tasks"]})
+        if cycle:
+            return {"success": False, "message": f"Invalid plan: circular dependency detected: {self._format_cycle(cycle)}"}
+        
+        previous_version = self._version
+        self.plan_data = plan_data
+        self._rebuild_indexes()
+        if self._version > previous_version:
+            # 导入的计划版本比当前版本新（例如另一个实例 dumpPlan 的结果）时保留其版本号，
+            # 副本用 loadPlan 建立基线后可以直接应用源计划自该版本起的增量；否则照常推进版本
+            self._version_bumped = True
         self._update_timestamp()
         
         return {"success": True, "message": "Plan loaded successfully."}
     
     # 核心流程函数
     
+    @_synchronized
     def getCurrentTask(self) -> Dict:
         """获取当前正在执行的任务"""
         current_id = self.plan_data["state"]["current_task_id"]
@@ -126,74 +977,100 @@ class PlanManager:
         if not task:
             return {"success": False, "message": f"Current task {current_id} not found"}
         
-        return {"success": True, "data": task}
+        return {"success": True, "data": task.to_dict()}
     
+    @_synchronized
     def startNextTask(self) -> Dict:
         """自动开始下一个可执行的任务"""
-        # 查找可执行的任务
-        executable_tasks = []
-        for task in self.plan_data["tasks"]:
-            if (task["status"] == "pending" and 
-                self._check_dependencies_satisfied(task)):
-                executable_tasks.append(task)
-        
-        if not executable_tasks:
+        self._expire_leases()
+        if not self._ready:
             return {"success": False, "message": "No executable tasks available", "data": None}
         
-        # 选择第一个可执行的任务
-        next_task = executable_tasks[0]
-        next_task["status"] = "in_progress"
-        self.plan_data["state"]["current_task_id"] = next_task["id"]
+        # 按计划的优先级策略选择可执行任务（默认 fifo：计划中排在最前的可执行任务）
+        next_task = self._writable_task(self._take_ready_tasks(1)[0])
+        self._set_status(next_task, "in_progress")
+        self.plan_data["state"]["current_task_id"] = next_task.id
         self.plan_data["state"]["status"] = "running"
         
         self._update_timestamp()
         
         return {
             "success": True,
-            "data": next_task,
-            "message": f"Started task {next_task['id']}: {next_task['name']}"
+            "data": next_task.to_dict(),
+            "message": f"Started task {next_task.id}: {next_task.name}"
         }
     
-    def completeTask(self, task_id: int, result: str) -> Dict:
-        """标记任务为完成状态"""
+    def _check_lease_holder(self, task_id: int, worker_id: Optional[str]) -> Optional[str]:
+        """
+        租约防护：指定 worker_id 时，只有仍持有该任务租约的 worker 可以完成或标记失败，
+        租约已过期（并可能已被其他 worker 重新领取）的 worker 的迟到调用会被拒绝。合法时返回 None，否则返回错误消息
+        """
+        if worker_id is None:
+            return None
+        lease = self._leases.get(task_id)
+        if lease is None or lease["worker_id"] != worker_id:
+            return f"Task {task_id} is not leased to worker {worker_id}"
+        return None
+    
+    @_synchronized
+    def completeTask(self, task_id: int, result: str, worker_id: Optional[str] = None) -> Dict:
+        """
+        标记任务为完成状态
+        通过 claimTasks 领取任务的 worker 应传入自己的 worker_id，租约已不属于它时完成会被拒绝
+        """
         task = self._find_task_by_id(task_id)
         if not task:
             return {"success": False, "message": f"Task {task_id} not found", "data": None}
         
-        if task["status"] != "in_progress":
+        self._expire_leases()
+        if task.status != "in_progress":
             return {"success": False, "message": f"Task {task_id} is not in progress", "data": None}
+        error = self._check_lease_holder(task_id, worker_id)
+        if error:
+            return {"success": False, "message": error, "data": None}
         
-        task["status"] = "completed"
-        task["result"] = result
+        leased = task_id in self._leases
+        task = self._writable_task(task_id)
+        self._set_status(task, "completed")
+        task.result = result
         
         # 如果这是当前任务，清除当前任务ID
         if self.plan_data["state"]["current_task_id"] == task_id:
             self.plan_data["state"]["current_task_id"] = None
             
             # 检查是否所有任务都完成了
-            all_completed = all(
-                task["status"] in ["completed", "skipped"] 
-                for task in self.plan_data["tasks"]
-            )
-            if all_completed:
+            if self._count_finished_tasks() == len(self._task_index):
                 self.plan_data["state"]["status"] = "completed"
+        elif leased and self._count_finished_tasks() == len(self._task_index):
+            # 通过 claimTasks 领取的任务不是当前任务，同样需要检查计划是否已全部完成
+            self.plan_data["state"]["status"] = "completed"
         
         self._update_timestamp()
         
         return {
             "success": True,
-            "data": task,
+            "data": task.to_dict(),
             "message": "Task completed successfully"
         }
     
-    def failTask(self, task_id: int, error_message: str, should_retry: bool = True) -> Dict:
-        """标记任务失败"""
+    @_synchronized
+    def failTask(self, task_id: int, error_message: str, should_retry: bool = True, worker_id: Optional[str] = None) -> Dict:
+        """
+        标记任务失败
+        通过 claimTasks 领取任务的 worker 应传入自己的 worker_id，租约已不属于它时标记会被拒绝
+        """
         task = self._find_task_by_id(task_id)
         if not task:
             return {"success": False, "message": f"Task {task_id} not found", "data": None}
         
-        task["status"] = "failed"
-        task["result"] = error_message
+        self._expire_leases()
+        error = self._check_lease_holder(task_id, worker_id)
+        if error:
+            return {"success": False, "message": error, "data": None}
+        
+        task = self._writable_task(task_id)
+        self._set_status(task, "failed")
+        task.result = error_message
         
         # 如果这是当前任务，清除当前任务ID
         if self.plan_data["state"]["current_task_id"] == task_id:
@@ -203,126 +1080,156 @@ class PlanManager:
         
         return {
             "success": True,
-            "data": task,
+            "data": task.to_dict(),
             "message": f"Task failed: {error_message}"
         }
     
     # 任务管理函数
     
+    @_synchronized
     def addTask(self, name: str, dependencies: List[int], reasoning: str, 
-                after_task_id: Optional[int] = None) -> Dict:
-        """添加新任务到计划中"""
+                after_task_id: Optional[int] = None, estimated_duration: Optional[float] = None,
+                priority: Optional[int] = None) -> Dict:
+        """
+        添加新任务到计划中
+        estimated_duration 为可选的估计耗时（秒），用于 getCriticalPath 和按估计时长排序的优先级策略；
+        priority 为可选的优先级（整数，越大越优先），用于 priority 策略
+        """
+        error = self._validate_duration(estimated_duration) or self._validate_priority(priority)
+        if error:
+            return {"success": False, "message": error}
         # 验证依赖任务存在
         for dep_id in dependencies:
             if not self._find_task_by_id(dep_id):
                 return {"success": False, "message": f"Dependency task {dep_id} not found"}
         
+        # 新任务的ID从未被依赖过，只会引入指向已有任务的边，不可能形成环路，
+        # 拓扑序号直接取最大值即可
         new_id = self._get_next_task_id()
-        
-        # 检测循环依赖
-        if self._detect_circular_dependency(new_id, dependencies):
-            return {"success": False, "message": "Circular dependency detected"}
             
-        new_task = {
-            "id": new_id,
-            "name": name,
-            "status": "pending",
-            "dependencies": dependencies,
-            "reasoning": reasoning,
-            "result": None
-        }
+        extra = {key: value for key, value in (("estimated_duration", estimated_duration), ("priority", priority)) if value is not None}
+        new_task = TaskRecord(new_id, name, "pending", tuple(dependencies), reasoning, extra=extra or None)
         
         # 插入任务
+        tasks = self.plan_data["tasks"]
         if after_task_id is not None:
-            try:
-                # 寻找插入位置
-                insert_index = next(i for i, task in enumerate(self.plan_data["tasks"]) if task["id"] == after_task_id) + 1
-                self.plan_data["tasks"].insert(insert_index, new_task)
-            except StopIteration:
+            if after_task_id not in self._task_index:
                 return {"success": False, "message": f"Task with id {after_task_id} not found"}
+            # 寻找插入位置
+            tasks.insert(self._task_position(after_task_id) + 1, new_task)
+            self._positions = None
+            # 之后的任务下标都后移了一位，优先队列中记录的下标已失效
+            self._ready_heap = None
         else:
-            self.plan_data["tasks"].append(new_task)
+            tasks.append(new_task)
+            if self._positions is not None:
+                self._positions[new_id] = len(tasks) - 1
+        self._index_task(new_task)
             
         self._update_timestamp()
         
         return {
             "success": True,
-            "data": new_task,
+            "data": new_task.to_dict(),
             "message": "Task added successfully"
         }
     
+    @_synchronized
     def updateTask(self, task_id: int, updates: Dict) -> Dict:
         """更新任务信息"""
-        task = self = self._find_task_by_id(task_id)
+        task = self._find_task_by_id(task_id)
         if not task:
             raise ValueError(f"Task {task_id} not found")
         
-        if task["status"] not in ["pending"]:
-            raise ValueError(f"Task {task_id} cannot be edited in {task['status']} status")
+        if task.status not in ["pending"]:
+            raise ValueError(f"Task {task_id} cannot be edited in {task.status} status")
         
-        # 更新字段
+        # 先校验所有字段，任何一个字段不合法时整个更新都不生效
         for key, value in updates.items():
-            if key in ["name", "reasoning"]:
-                task[key] = value
+            if key == "estimated_duration":
+                error = self._validate_duration(value)
+                if error:
+                    raise ValueError(error)
+            elif key == "priority":
+                error = self._validate_priority(value)
+                if error:
+                    raise ValueError(error)
             elif key == "dependencies":
                 # 验证新依赖
                 for dep_id in value:
                     if not self._find_task_by_id(dep_id):
                         raise ValueError(f"Dependency task {dep_id} not found")
-                
-                # 检测循环依赖
-                if self._detect_circular_dependency(task_id, value):
-                    raise ValueError("Update would create circular dependency")
-                
-                task["dependencies"] = value
+        
+        # 检测循环依赖
+        # 只对新增的边做增量环路检测，失败时自动回滚；依赖最先替换，出现环路时其他字段尚未修改
+        if "dependencies" in updates:
+            cycle = self._replace_dependencies({task_id: updates["dependencies"]})
+            if cycle:
+                raise ValueError(f"Update would create circular dependency: {self._format_cycle(cycle)}")
+        
+        # 更新字段
+        task = self._writable_task(task_id)
+        for key, value in updates.items():
+            if key in ["name", "reasoning"]:
+                setattr(task, key, value)
+            elif key == "estimated_duration":
+                self._set_task_extra(task, estimated_duration=value)
+                self._reprioritize(task_id, structural=True)
+            elif key == "priority":
+                self._set_task_extra(task, priority=value)
+                self._reprioritize(task_id)
         
         self._update_timestamp()
         
         return {
-            "updated_task": task,
+            "updated_task": task.to_dict(),
             "message": "Task updated successfully"
         }
     
+    @_synchronized
     def skipTask(self, task_id: int, reason: str) -> Dict:
         """跳过任务"""
         task = self._find_task_by_id(task_id)
         if not task:
             return {"success": False, "message": f"Task {task_id} not found"}
         
-        if task["status"] not in ["pending", "failed"]:
-             return {"success": False, "message": f"Only pending or failed tasks can be skipped. Task {task_id} has status '{task['status']}'"}
+        if task.status not in ["pending", "failed"]:
+             return {"success": False, "message": f"Only pending or failed tasks can be skipped. Task {task_id} has status '{task.status}'"}
         
-        task["status"] = "skipped"
-        task["result"] = f"Skipped: {reason}"
+        task = self._writable_task(task_id)
+        self._set_status(task, "skipped")
+        task.result = f"Skipped: {reason}"
         
         self._update_timestamp()
         
         return {
             "success": True,
-            "data": task,
+            "data": task.to_dict(),
             "message": f"Task {task_id} skipped. Reason: {reason}"
         }
     
+    @_synchronized
     def removeTask(self, task_id: int) -> Dict:
         """删除任务（仅限pending状态）"""
         task = self._find_task_by_id(task_id)
         if not task:
             raise ValueError(f"Task {task_id} not found")
         
-        if task["status"] != "pending":
-            raise ValueError(f"Only pending tasks can be removed")
+        if task.status != "pending":
+            raise ValueError("Only pending tasks can be removed")
         
-        # 检查是否有其他任务依赖此任务
-        dependent_tasks = []
-        for t in self.plan_data["tasks"]:
-            if task_id in t["dependencies"]:
-                dependent_tasks.append(t["id"])
+        # 检查是否有其他任务依赖此任务（反向邻接表，O(出度)）
+        dependent_tasks = sorted(self._dependents.get(task_id, ()))
         
         if dependent_tasks:
             raise ValueError(f"Task {task_id} has dependent tasks: {dependent_tasks}")
         
         # 移除任务
-        self.plan_data["tasks"] = [t for t in self.plan_data["tasks"] if t["id"] != task_id]
+        position = self._task_position(task_id)
+        self._unindex_task(task)
+        del self.plan_data["tasks"][position]
+        self._positions = None
+        self._ready_heap = None
         
         self._update_timestamp()
         
@@ -333,21 +1240,65 @@ class PlanManager:
     
     # 查询函数
     
-    def getTaskList(self, status_filter: Optional[str] = None) -> Dict:
-        """获取任务列表，可按状态过滤"""
-        if status_filter:
-            tasks_to_return = [
-                task for task in self.plan_data["tasks"] 
-                if task["status"] == status_filter
-            ]
+    @_synchronized
+    def getTaskList(self, status_filter: Union[str, List[str], None] = None, limit: Optional[int] = None,
+                    cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> Dict:
+        """
+        获取任务列表（按计划顺序），可按一个或多个状态过滤，支持分页和字段投影。
+
+        Args:
+            status_filter: 状态或状态列表，省略时返回所有任务
+            limit: 每页最多返回的任务数，省略时不分页
+            cursor: 上一页返回的 next_cursor，从它之后继续
+            fields: 只返回这些字段，省略时返回完整任务
+
+        Returns:
+            Dict: 分页时额外包含 next_cursor，没有下一页时为 None。
+                  按状态分页走状态索引，一页的代价与页大小（和游标定位）相关，与计划大小无关。
+        """
+        statuses, after_id, error = normalize_task_list_query(status_filter, limit, cursor, fields)
+        if error:
+            return {"success": False, "message": error, "data": None}
+        self._expire_leases()
+        start = 0
+        if after_id is not None:
+            if after_id not in self._task_index:
+                return {"success": False, "message": f"Invalid cursor: task {after_id} no longer exists", "data": None}
+            start = self._task_position(after_id) + 1
+        # 多取一个任务，用来判断是否还有下一页
+        stop = None if limit is None else limit + 1
+
+        if statuses is None:
+            tasks = self.plan_data["tasks"][start:None if stop is None else start + stop]
         else:
-            tasks_to_return = self.plan_data["tasks"]
-        
-        return {"success": True, "data": tasks_to_return}
+            task_ids = []
+            for status in statuses:
+                if status in self._status_tasks:
+                    task_ids.extend(itertools.islice(self._status_tasks[status].iter_from(start, self._position_key()), stop))
+            if len(statuses) > 1:
+                task_ids.sort(key=self._position_key())
+            tasks = [self._task_index[task_id] for task_id in task_ids[:stop]]
+
+        has_more = limit is not None and len(tasks) > limit
+        if has_more:
+            tasks = tasks[:limit]
+        if fields is None:
+            data = [task.to_dict() for task in tasks]
+        else:
+            data = [
+                {field: list(task.dependencies) if field == "dependencies" else getattr(task, field) for field in fields}
+                for task in tasks
+            ]
+        response = {"success": True, "data": data}
+        if limit is not None:
+            response["next_cursor"] = str(tasks[-1].id) if has_more else None
+        return response
     
+    @_synchronized
     def getPlanStatus(self) -> Dict:
         """获取计划状态"""
-        total_tasks = len(self.plan_data["tasks"])
+        self._expire_leases()
+        total_tasks = len(self._task_index)
         if total_tasks == 0:
             return {
                 "success": True, 
@@ -359,13 +1310,10 @@ class PlanManager:
                 }
             }
 
-        completed_count = sum(1 for task in self.plan_data["tasks"] if task["status"] in ["completed", "skipped"])
+        # 直接读取增量维护的状态计数，无需遍历任务
+        completed_count = self._count_finished_tasks()
         progress_percentage = (completed_count / total_tasks) * 100 if total_tasks > 0 else 0
-        
-        task_counts = {}
-        for task in self.plan_data["tasks"]:
-            status = task["status"]
-            task_counts[status] = task_counts.get(status, 0) + 1
+        task_counts = self._status_counts
 
         status_data = {
             "meta": self.plan_data["meta"],
@@ -386,25 +1334,163 @@ class PlanManager:
         }
         return {"success": True, "data": status_data}
         
+    @_synchronized
     def getTaskById(self, task_id: int) -> Dict:
         """根据ID获取单个任务"""
         task = self._find_task_by_id(task_id)
         if task:
-            return {"success": True, "data": task}
+            return {"success": True, "data": task.to_dict()}
         else:
             return {"success": False, "message": f"Task with id {task_id} not found", "data": None}
 
+    @_synchronized
+    def getDependents(self, task_id: int) -> Dict:
+        """获取直接依赖指定任务的所有任务（按ID排序）"""
+        if task_id not in self._task_index:
+            return {"success": False, "message": f"Task with id {task_id} not found", "data": None}
+        
+        dependents = [self._task_index[dependent_id].to_dict() for dependent_id in sorted(self._dependents.get(task_id, ()))]
+        return {"success": True, "data": dependents}
+
+    @_synchronized
+    def getSubgraph(self, focus: str, task_id: Optional[int] = None, hops: Optional[int] = None) -> Dict:
+        """
+        获取依赖图的一个切片（按ID排序的任务列表）。只沿依赖和反向邻接索引遍历，耗时与切片大小成正比，与计划大小无关。
+
+        Args:
+            focus: 聚焦方式
+                - "ancestors": task_id 及其所有前置任务（直接和间接）
+                - "descendants": task_id 及其所有后续任务（直接和间接）
+                - "neighborhood": 与 task_id 相距不超过 hops 跳的任务（不区分方向，hops 默认为 1）
+                - "frontier": 执行前沿，即可执行、进行中和失败的任务（忽略 task_id 和 hops）
+            task_id: 聚焦的任务
+            hops: 最多沿依赖走多少跳，省略时 ancestors/descendants 不限制
+        """
+        if focus not in FOCUS_MODES:
+            return {"success": False, "message": f"Unknown focus: {focus}. Available: {list(FOCUS_MODES)}", "data": None}
+        if hops is not None and hops < 0:
+            return {"success": False, "message": "hops must be non-negative", "data": None}
+        
+        if focus == "frontier":
+            self._expire_leases()
+            task_ids = set(self._ready)
+            for status in ("in_progress", "failed"):
+                if status in self._status_tasks:
+                    task_ids.update(self._status_tasks[status].iter_from(0, None))
+        else:
+            if task_id is None:
+                return {"success": False, "message": f"task_id is required when focus is {focus}", "data": None}
+            if task_id not in self._task_index:
+                return {"success": False, "message": f"Task with id {task_id} not found", "data": None}
+            if focus == "neighborhood" and hops is None:
+                hops = 1
+            task_ids = self._reachable_tasks(task_id, upstream=focus != "descendants", downstream=focus != "ancestors", hops=hops)
+        
+        return {"success": True, "data": [self._task_index[subgraph_id].to_dict() for subgraph_id in sorted(task_ids)]}
+    
+    def _reachable_tasks(self, task_id: int, upstream: bool, downstream: bool, hops: Optional[int]) -> Set[int]:
+        """从 task_id 出发逐层广度优先遍历，返回 hops 跳以内能到达的任务ID（含自身）"""
+        reached = {task_id}
+        layer = [task_id]
+        distance = 0
+        while layer and (hops is None or distance < hops):
+            distance += 1
+            next_layer = []
+            for current_id in layer:
+                neighbors = []
+                if upstream:
+                    neighbors.extend(self._task_index[current_id].dependencies)
+                if downstream:
+                    neighbors.extend(self._dependents.get(current_id, ()))
+                for neighbor_id in neighbors:
+                    if neighbor_id not in reached and neighbor_id in self._task_index:
+                        reached.add(neighbor_id)
+                        next_layer.append(neighbor_id)
+            layer = next_layer
+        return reached
+
+    @_synchronized
     def getExecutableTaskList(self) -> Dict:
-        """获取所有可执行的任务列表"""
-        executable_tasks = []
-        for task in self.plan_data["tasks"]:
-            if task["status"] == "pending" and self._check_dependencies_satisfied(task):
-                executable_tasks.append(task)
+        """获取所有可执行的任务列表（按计划顺序）"""
+        self._expire_leases()
+        executable_tasks = [self._task_index[task_id].to_dict() for task_id in self._ready_order.iter_from(0, None)]
         
         return {"success": True, "data": executable_tasks}
     
+    # 多 worker 并行执行
+    
+    @_synchronized
+    def claimTasks(self, worker_id: str, max_n: int = 1, lease_seconds: float = 300) -> Dict:
+        """
+        为一个 worker 原子地领取最多 max_n 个可执行任务并标记为 in_progress（按计划的优先级策略选择）。
+        每个任务带有 lease_seconds 秒的租约，到期前未完成（且未续约）的任务会退回 pending，
+        可以被其他 worker 重新领取。
+        """
+        if max_n < 1:
+            return {"success": False, "message": "max_n must be at least 1", "data": None}
+        if lease_seconds <= 0:
+            return {"success": False, "message": "lease_seconds must be positive", "data": None}
+        
+        self._expire_leases()
+        if not self._ready:
+            return {"success": False, "message": "No executable tasks available", "data": None}
+        
+        expires_at = time.time() + lease_seconds
+        claimed = []
+        for task_id in self._take_ready_tasks(max_n):
+            task = self._writable_task(task_id)
+            self._set_status(task, "in_progress")
+            self._grant_lease(task_id, worker_id, expires_at)
+            claimed.append(task.to_dict())
+        self.plan_data["state"]["status"] = "running"
+        
+        self._update_timestamp()
+        
+        return {
+            "success": True,
+            "data": claimed,
+            "message": f"Worker {worker_id} claimed {len(claimed)} task(s), lease expires at {datetime.fromtimestamp(expires_at).isoformat()}"
+        }
+    
+    @_synchronized
+    def renewLeases(self, worker_id: str, lease_seconds: float = 300) -> Dict:
+        """为 worker 仍持有的所有租约续期，已过期并被收回的任务不会续约"""
+        if lease_seconds <= 0:
+            return {"success": False, "message": "lease_seconds must be positive", "data": None}
+        
+        self._expire_leases()
+        task_ids = [task_id for task_id, lease in self._leases.items() if lease["worker_id"] == worker_id]
+        if not task_ids:
+            return {"success": False, "message": f"Worker {worker_id} holds no active leases", "data": None}
+        
+        expires_at = time.time() + lease_seconds
+        for task_id in task_ids:
+            self._grant_lease(task_id, worker_id, expires_at)
+        
+        return {
+            "success": True,
+            "data": [self._task_index[task_id].to_dict() for task_id in task_ids],
+            "message": f"Renewed {len(task_ids)} lease(s) for worker {worker_id} until {datetime.fromtimestamp(expires_at).isoformat()}"
+        }
+    
+    @_synchronized
+    def setPriorityPolicy(self, policy: str) -> Dict:
+        """
+        设置 startNextTask/claimTasks 选择可执行任务的优先级策略（见 PRIORITY_POLICIES），保存在计划的 meta 中。
+        非 fifo 策略使用按优先级键排序的小顶堆，每次取任务 O(log R)；critical_path 的最长路径按依赖结构和估计时长缓存，
+        只在二者变化后的下一次取任务时重新计算。
+        """
+        if policy not in PRIORITY_POLICIES:
+            return {"success": False, "message": f"Unknown priority policy: {policy}. Available: {list(PRIORITY_POLICIES)}", "data": None}
+        
+        self.plan_data["meta"]["priority_policy"] = policy
+        self._update_timestamp()
+        
+        return {"success": True, "message": f"Priority policy set to {policy}", "data": {"priority_policy": policy}}
+    
     # 控制函数
     
+    @_synchronized
     def pausePlan(self) -> Dict:
         """暂停整个计划"""
         self.plan_data["state"]["status"] = "paused"
@@ -412,6 +1498,7 @@ class PlanManager:
         
         return {"message": "Plan paused successfully"}
     
+    @_synchronized
     def resumePlan(self) -> Dict:
         """恢复计划执行"""
         if self.plan_data["state"]["status"] == "paused":
@@ -422,13 +1509,15 @@ class PlanManager:
         else:
             raise ValueError("Plan is not in paused status")
     
+    @_synchronized
     def resetPlan(self) -> Dict:
         """重置计划（将所有任务状态重置为pending）"""
         reset_count = 0
-        for task in self.plan_data["tasks"]:
-            if task["status"] != "pending":
-                task["status"] = "pending"
-                task["result"] = None
+        for task_id, task in list(self._task_index.items()):
+            if task.status != "pending":
+                task = self._writable_task(task_id)
+                self._set_status(task, "pending")
+                task.result = None
                 reset_count += 1
         
         self.plan_data["state"]["current_task_id"] = None
@@ -442,15 +1531,18 @@ class PlanManager:
         }
     
 
+    @_synchronized
     def edit_dependencies_in_batch(self, edits: List[Dict]) -> Dict:
         """
         以批量方式编辑多个任务的依赖关系
-        该操作是事务性的：所有编辑指令在应用前都会被验证。
+        该操作是事务性的：所有编辑指令先在一个只记录被编辑任务新依赖列表的覆盖层上验证，
+        再一次性应用；应用时只对新增的边做增量环路检测，出现环路则按撤销日志回滚，
+        整个过程不复制计划。
         """
         try:
             # --- 验证阶段 ---
-            original_tasks_copy = deepcopy(self.plan_data["tasks"])
-            temp_tasks_map = {task['id']: task for task in original_tasks_copy}
+            # 覆盖层：任务ID -> 编辑后的依赖列表，同一任务的多条指令按顺序叠加
+            staged: Dict[int, List[int]] = {}
             
             for edit in edits:
                 task_id = edit.get("task_id")
@@ -459,45 +1551,42 @@ class PlanManager:
                 if task_id is None or action is None:
                     raise ValueError("Each edit must contain 'task_id' and 'action'")
 
-                task_to_edit = temp_tasks_map.get(task_id)
+                task_to_edit = self._task_index.get(task_id)
                 if not task_to_edit:
                     raise ValueError(f"Task {task_id} not found in plan")
 
                 if action == "set":
                     new_deps = edit.get("dependencies", [])
                     for dep_id in new_deps:
-                        if dep_id not in temp_tasks_map:
+                        if dep_id not in self._task_index:
                             raise ValueError(f"Dependency task {dep_id} not found")
-                    task_to_edit["dependencies"] = new_deps
+                    staged[task_id] = list(new_deps)
 
                 elif action == "update":
                     add_deps = edit.get("add", [])
                     remove_deps = edit.get("remove", [])
                     
-                    current_deps_set = set(task_to_edit["dependencies"])
+                    current_deps_set = set(staged.get(task_id, task_to_edit.dependencies))
                     
                     for dep_id in add_deps:
-                        if dep_id not in temp_tasks_map:
+                        if dep_id not in self._task_index:
                             raise ValueError(f"Dependency task to add ({dep_id}) not found")
                         current_deps_set.add(dep_id)
                     
                     current_deps_set.difference_update(remove_deps)
-                    task_to_edit["dependencies"] = list(current_deps_set)
+                    staged[task_id] = list(current_deps_set)
                     
                 else:
                     raise ValueError(f"Invalid action '{action}' for task {task_id}")
 
-            # --- 循环依赖检测阶段 ---
-            temp_tasks_list = list(temp_tasks_map.values())
-            for task in temp_tasks_list:
-                if self._detect_circular_dependency(task["id"], task["dependencies"], tasks_list=temp_tasks_list):
-                    raise ValueError(f"Circular dependency detected for task {task['id']} after applying edits.")
-
             # --- 应用阶段 ---
-            self.plan_data["tasks"] = temp_tasks_list
+            # 只替换被编辑任务的依赖列表；环路检测只覆盖新增边影响到的拓扑序区间，失败时完整回滚
+            cycle = self._replace_dependencies(staged)
+            if cycle:
+                raise ValueError(f"Circular dependency detected after applying edits: {self._format_cycle(cycle)}")
             self._update_timestamp()
             
-            results = [{"task_id": edit["task_id"], "new_dependencies": temp_tasks_map[edit["task_id"]]["dependencies"]} for edit in edits]
+            results = [{"task_id": edit["task_id"], "new_dependencies": staged[edit["task_id"]]} for edit in edits]
 
             return {
                 "success": True,
@@ -509,6 +1598,7 @@ class PlanManager:
     
     # 工具函数
     
+    @_synchronized
     def initializePlan(self, goal: str, tasks: List[Dict]) -> Dict:
         """
         初始化计划
@@ -516,6 +1606,17 @@ class PlanManager:
         if not tasks:
             return {"success": False, "message": "At least one task is required"}
         
+        # 处理任务列表（在替换现有计划之前完成校验，失败时现有计划保持不变）
+        try:
+            # First pass: create tasks and map names to IDs
+            processed_tasks, task_name_to_id = self._process_tasks_pass_one(tasks)
+            # Second pass: resolve dependencies
+            self._process_tasks_pass_two(tasks, processed_tasks, task_name_to_id)
+            # Third pass: detect circular dependencies
+            self._check_all_circular_dependencies(processed_tasks)
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        
         current_time = datetime.now().isoformat()
         
         # 重置计划数据
@@ -529,30 +1630,18 @@ class PlanManager:
                 "current_task_id": None,
                 "status": "idle"
             },
-            "tasks": []
+            "tasks": processed_tasks
         }
-        
-        # 处理任务列表
-        try:
-            # First pass: create tasks and map names to IDs
-            processed_tasks, task_name_to_id = self._process_tasks_pass_one(tasks)
-            # Second pass: resolve dependencies
-            self._process_tasks_pass_two(tasks, processed_tasks, task_name_to_id)
-            # Third pass: detect circular dependencies
-            self._check_all_circular_dependencies(processed_tasks)
-        except ValueError as e:
-            return {"success": False, "message": str(e)}
-
-        self.plan_data["tasks"] = processed_tasks
+        self._rebuild_indexes()
         self._update_timestamp()
         
         return {
             "success": True,
             "message": "Plan initialized successfully",
-            "data": self.plan_data
+            "data": self._snapshot()
         }
 
-    def _process_tasks_pass_one(self, tasks: List[Dict]) -> tuple[List[Dict], Dict[str, int]]:
+    def _process_tasks_pass_one(self, tasks: List[Dict]) -> tuple[List[TaskRecord], Dict[str, int]]:
         processed_tasks = []
         task_name_to_id = {}
         for i, task_input in enumerate(tasks):
@@ -567,25 +1656,23 @@ class PlanManager:
                 raise ValueError(f"Duplicate task name '{task_name}' found.")
             task_name_to_id[task_name] = task_id
             
-            processed_task = {
-                "id": task_id,
-                "name": task_name,
-                "status": "pending",
-                "dependencies": [],
-                "reasoning": task_input.get("reasoning", f"Execute task: {task_name}"),
-                "result": None
-            }
+            extra = {key: task_input[key] for key in ("estimated_duration", "priority") if task_input.get(key) is not None}
+            error = self._validate_duration(extra.get("estimated_duration")) or self._validate_priority(extra.get("priority"))
+            if error:
+                raise ValueError(f"Task '{task_name}': {error}")
+            processed_task = TaskRecord(task_id, task_name, "pending", (), task_input.get("reasoning", f"Execute task: {task_name}"),
+                                        extra=extra or None)
             processed_tasks.append(processed_task)
         return processed_tasks, task_name_to_id
 
-    def _process_tasks_pass_two(self, tasks: List[Dict], processed_tasks: List[Dict], task_name_to_id: Dict[str, int]):
+    def _process_tasks_pass_two(self, tasks: List[Dict], processed_tasks: List[TaskRecord], task_name_to_id: Dict[str, int]):
         for i, task_input in enumerate(tasks):
             dependencies = task_input.get("dependencies", [])
             processed_dependencies = []
             for dep in dependencies:
                 if isinstance(dep, str):
                     if dep not in task_name_to_id:
-                        raise ValueError(f"Task '{processed_tasks[i]['name']}' depends on unknown task '{dep}'")
+                        raise ValueError(f"Task '{processed_tasks[i].name}' depends on unknown task '{dep}'")
                     processed_dependencies.append(task_name_to_id[dep])
                 elif isinstance(dep, int):
                     if not (0 <= dep < len(tasks)):
@@ -593,21 +1680,262 @@ class PlanManager:
                     processed_dependencies.append(dep)
                 else:
                     raise ValueError("Dependencies must be task names (strings) or 0-based indices (integers)")
-            processed_tasks[i]["dependencies"] = sorted(list(set(processed_dependencies)))
+            processed_tasks[i].dependencies = tuple(sorted(set(processed_dependencies)))
 
-    def _check_all_circular_dependencies(self, processed_tasks: List[Dict]):
-        for task in processed_tasks:
-            if self._detect_circular_dependency(task["id"], task["dependencies"], tasks_list=processed_tasks):
-                raise ValueError(f"Circular dependency detected for task {task['id']}")
+    def _check_all_circular_dependencies(self, processed_tasks: List[TaskRecord]):
+        cycle = self._find_cycle({task.id: task.dependencies for task in processed_tasks})
+        if cycle:
+            raise ValueError(f"Circular dependency detected: {self._format_cycle(cycle)}")
 
-    def dumpPlan(self) -> Dict:
-        """导出完整的计划数据为一个字典对象。"""
+    @_synchronized
+    def dumpPlan(self, format: str = "json") -> Dict:
+        """
+        导出完整的计划数据。
+        format 为 "json" 时返回快照字典，未修改过的任务复用之前导出的字典视图，计划没有变化时直接返回上一次的快照（O(1)），
+        调用方不应修改它；
+        为 "binary" 时返回紧凑的列式二进制编码（base64 文本，见 binary_format），可直接交给 loadPlan。
+        """
+        if format not in ("json", "binary"):
+            return {"success": False, "message": f"Unsupported dump format: {format}", "data": None}
+        snapshot = self._snapshot()
         return {
             "success": True,
-            "data": deepcopy(self.plan_data),
+            "data": encode_plan_text(snapshot) if format == "binary" else snapshot,
             "message": "Plan dumped successfully."
         }
 
+    @_synchronized
+    def dumpPlanStream(self, stream: TextIO) -> Dict:
+        """
+        以 NDJSON 格式（见 ndjson_format）把计划逐个任务写入文本流，例如文件。
+        每次只序列化一个任务，峰值内存与计划大小无关；写入期间持有计划锁，写出的是一致的快照。
+        """
+        tasks = self.plan_data["tasks"]
+        lines = iter_plan_lines(
+            dict(self.plan_data["meta"]), self._exported_state(), (task.to_dict() for task in tasks), len(tasks)
+        )
+        for line in lines:
+            stream.write(line)
+        return {"success": True, "message": f"Plan streamed ({len(tasks)} tasks).", "data": {"task_count": len(tasks)}}
+
+    @_synchronized
+    def dumpPlanDelta(self, since_version: int) -> Dict:
+        """
+        导出自 since_version 以来的增量：被修改或新增的任务、新增任务的位置、被删除的任务ID，以及最新的 meta 和 state。
+        耗时只与变化的任务数有关。since_version 早于计划最近一次被整体替换时，返回完整计划（full=True）。
+        """
+        if since_version < 0 or since_version > self._version:
+            return {"success": False, "message": f"Unknown plan version {since_version}; current version is {self._version}", "data": None}
+        if since_version < self._history_floor:
+            return {
+                "success": True,
+                "message": f"Plan was replaced after version {since_version}; full plan returned.",
+                "data": {"since_version": since_version, "version": self._version, "full": True, "plan": self._snapshot()}
+            }
+
+        upsert = []
+        for task_id, version in reversed(self._task_versions.items()):
+            if version <= since_version:
+                break
+            upsert.append(self._task_index[task_id].to_dict())
+        upsert.reverse()
+        insert = {}
+        for task_id, version in reversed(self._added_versions.items()):
+            if version <= since_version:
+                break
+            insert[str(task_id)] = self._task_position(task_id)
+        remove = []
+        for task_id, version in reversed(self._removed_versions.items()):
+            if version <= since_version:
+                break
+            remove.append(task_id)
+
+        return {
+            "success": True,
+            "message": f"{len(upsert)} tasks changed and {len(remove)} tasks removed since version {since_version}.",
+            "data": {
+                "since_version": since_version,
+                "version": self._version,
+                "full": False,
+                "meta": dict(self.plan_data["meta"]),
+                "state": self._exported_state(),
+                "upsert": upsert,
+                "insert": insert,
+                "remove": remove
+            }
+        }
+
+    @_synchronized
+    def applyPlanDelta(self, delta: Dict) -> Dict:
+        """
+        应用 dumpPlanDelta 导出的增量，把计划推进到增量的版本。
+        增量必须基于当前版本（since_version 等于当前版本）；完整增量（full=True）等同于 loadPlan，但保留其版本号和时间戳。
+        """
+        if not all(k in delta for k in ("since_version", "version", "full")):
+            return {"success": False, "message": "Invalid delta structure provided."}
+        if delta["version"] < self._version:
+            return {"success": False, "message": f"Delta version {delta['version']} is older than the current plan version {self._version}"}
+
+        try:
+            if delta["full"]:
+                plan_data = delta.get("plan")
+                if not isinstance(plan_data, dict) or not all(k in plan_data for k in ("meta", "state", "tasks")):
+                    return {"success": False, "message": "Invalid plan structure provided."}
+                plan_data = self._adopt_plan(plan_data)
+            else:
+                if delta["since_version"] != self._version:
+                    return {
+                        "success": False,
+                        "message": f"Delta is based on version {delta['since_version']} but the plan is at version {self._version}"
+                    }
+                # 增量与预写日志记录格式相同，直接按日志回放的方式应用到计划的浅拷贝上，
+                # 未变化的任务记录被新计划原样沿用，变化的任务由字典转换为新记录
+                # 删除在这里按记录的属性完成，apply_record 只负责按下标替换和插入
+                removed = set(delta["remove"])
+                plan_data = dict(self.plan_data)
+                plan_data["tasks"] = [task for task in self.plan_data["tasks"] if task.id not in removed]
+                positions = {task.id: index for index, task in enumerate(plan_data["tasks"])}
+                apply_record(plan_data, {**delta, "remove": []}, positions)
+                plan_data["meta"] = dict(plan_data["meta"])
+                plan_data["state"] = dict(plan_data["state"])
+                plan_data["tasks"] = [
+                    task if isinstance(task, TaskRecord) else TaskRecord.from_dict(task) for task in plan_data["tasks"]
+                ]
+        except (KeyError, IndexError, TypeError) as e:
+            return {"success": False, "message": f"Invalid delta: {e!r}"}
+
+        cycle = self._find_cycle({task.id: task.dependencies for task in plan_data["tasks"]})
+        if cycle:
+            return {"success": False, "message": f"Invalid plan: circular dependency detected: {self._format_cycle(cycle)}"}
+
+        plan_data["meta"]["version"] = delta["version"]
+        self.plan_data = plan_data
+        self._rebuild_indexes()
+        # 版本号直接取增量的版本，本次调用不再额外推进
+        self._version_bumped = True
+        self._state_changed = True
+
+        return {"success": True, "message": f"Plan advanced to version {self._version}.", "data": {"version": self._version}}
+
+    @_synchronized
+    def getCriticalPath(self) -> Dict:
+        """
+        估计剩余工作的排程：一次拓扑遍历（Kahn，O(V+E)）算出每个未完成任务的最早/最晚开始时间和松弛时间，
+        以及决定总耗时的关键路径。假设可并行执行的任务数不受限制。
+
+        任务的剩余时长：已完成/已跳过为 0；进行中为估计时长减去已执行的时间（不小于 0）；其余为估计时长。
+        估计时长优先使用任务的 estimated_duration，否则使用计划中已完成任务的平均实际耗时（duration），
+        还没有观测数据时为 DEFAULT_TASK_DURATION。时间单位为秒，以当前时刻为 0。
+        """
+        schedule = self._compute_schedule()
+        if schedule is None:
+            return {"success": False, "message": "Plan contains a circular dependency", "data": None}
+        
+        tasks = []
+        for task_id in schedule["order"]:
+            task = self._task_index[task_id]
+            if task.status in SATISFIED_STATUSES:
+                continue
+            earliest_start = schedule["earliest_start"][task_id]
+            latest_start = schedule["latest_start"][task_id]
+            duration = schedule["durations"][task_id]
+            slack = latest_start - earliest_start
+            tasks.append({
+                "id": task_id,
+                "name": task.name,
+                "status": task.status,
+                "duration": round(duration, 3),
+                "earliest_start": round(earliest_start, 3),
+                "earliest_finish": round(earliest_start + duration, 3),
+                "latest_start": round(latest_start, 3),
+                "latest_finish": round(latest_start + duration, 3),
+                "slack": round(slack, 3),
+                "critical": slack <= schedule["tolerance"]
+            })
+        
+        return {
+            "success": True,
+            "data": {
+                "makespan": round(schedule["makespan"], 3),
+                "critical_path": schedule["critical_path"],
+                "default_duration": round(self._default_duration(), 3),
+                "observed_tasks": self._duration_count,
+                "tasks": tasks
+            }
+        }
+    
+    def _remaining_duration(self, task: TaskRecord, default_duration: float, now: float) -> float:
+        if task.status in SATISFIED_STATUSES:
+            return 0.0
+        extra = task.extra
+        estimate = extra.get("estimated_duration") if extra else None
+        if estimate is None:
+            estimate = default_duration
+        if task.status == "in_progress" and extra and extra.get("started_at") is not None:
+            return max(estimate - (now - extra["started_at"]), 0.0)
+        return float(estimate)
+    
+    def _compute_schedule(self) -> Optional[Dict]:
+        """关键路径法（CPM）：正向遍历求最早开始时间，反向遍历求最晚开始时间。存在环路时返回 None"""
+        now = time.time()
+        default_duration = self._default_duration()
+        task_index = self._task_index
+        durations = {}
+        in_degrees = {}
+        for task_id, task in task_index.items():
+            durations[task_id] = self._remaining_duration(task, default_duration, now)
+            in_degrees[task_id] = sum(1 for dep_id in set(task.dependencies) if dep_id in task_index)
+        
+        # 正向：任务出队时所有依赖都已计算完毕，最早开始时间为依赖的最晚完成时间
+        order = [task_id for task_id, degree in in_degrees.items() if degree == 0]
+        earliest_start: Dict[int, float] = {}
+        earliest_finish: Dict[int, float] = {}
+        predecessor: Dict[int, Optional[int]] = {}
+        for task_id in order:
+            start, critical_dep = 0.0, None
+            for dep_id in task_index[task_id].dependencies:
+                finish = earliest_finish.get(dep_id, 0.0)
+                if finish > start:
+                    start, critical_dep = finish, dep_id
+            earliest_start[task_id] = start
+            earliest_finish[task_id] = start + durations[task_id]
+            predecessor[task_id] = critical_dep
+            for dependent_id in self._dependents.get(task_id, ()):
+                in_degrees[dependent_id] -= 1
+                if in_degrees[dependent_id] == 0:
+                    order.append(dependent_id)
+        if len(order) != len(task_index):
+            return None
+        
+        makespan = max(earliest_finish.values(), default=0.0)
+        # 反向：最晚完成时间为所有后继最晚开始时间的最小值，没有后继时为总耗时
+        latest_start: Dict[int, float] = {}
+        for task_id in reversed(order):
+            finish = min((latest_start[dependent_id] for dependent_id in self._dependents.get(task_id, ())), default=makespan)
+            latest_start[task_id] = finish - durations[task_id]
+        
+        # 关键路径：从最晚完成的任务沿“决定其开始时间的依赖”回溯，略过已完成的任务
+        critical_path = []
+        if makespan > 0:
+            task_id = max(order, key=lambda candidate: earliest_finish[candidate])
+            while task_id is not None:
+                if task_index[task_id].status not in SATISFIED_STATUSES:
+                    critical_path.append(task_id)
+                task_id = predecessor[task_id]
+            critical_path.reverse()
+        
+        return {
+            "order": order,
+            "durations": durations,
+            "earliest_start": earliest_start,
+            "latest_start": latest_start,
+            "makespan": makespan,
+            "critical_path": critical_path,
+            # 浮点误差范围内的松弛时间视为 0
+            "tolerance": 1e-9 * max(makespan, 1.0)
+        }
+    
+    @_synchronized
     def getDependencyGraph(self) -> Dict:
         """获取依赖关系图数据"""
         nodes = []
@@ -615,15 +1943,15 @@ class PlanManager:
         
         for task in self.plan_data["tasks"]:
             nodes.append({
-                "id": task["id"],
-                "name": task["name"],
-                "status": task["status"]
+                "id": task.id,
+                "name": task.name,
+                "status": task.status
             })
             
-            for dep_id in task["dependencies"]:
+            for dep_id in task.dependencies:
                 edges.append({
                     "from": dep_id,
-                    "to": task["id"]
+                    "to": task.id
                 })
         
         return {
@@ -0,0 +1,243 @@
+"""
+多计划注册表
+按计划ID（或 MCP 会话ID）管理多个 PlanManager，
+每个计划一把锁，空闲计划按 LRU 顺序换出到溢出存储中，需要时再透明地换入。
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .plan_manager import PlanManager
+from .storage import MemorySpillStore, StoredPlanView
+
+DEFAULT_PLAN_ID = "default"
+
+logger = logging.getLogger(__name__)
+
+
+class _PlanEntry:
+    """注册表中的一个活跃计划：管理器、计划锁、预写日志，以及正在使用它的调用数"""
+
+    def __init__(self, manager: PlanManager, journal=None):
+        self.manager = manager
+        self.journal = journal
+        self.lock = threading.RLock()
+        self.pins = 0
+
+
+class PlanRegistry:
+    """
+    计划注册表
+    同一计划上的调用由该计划的锁串行化，不同计划之间互不阻塞。
+    活跃计划数超过上限时，最久未使用且当前没有调用的计划会被换出到溢出存储。
+    提供 wal_store（见 wal.WriteAheadLogStore）时，每个计划的修改都写入预写日志，
+    日志本身就是持久化的换出存储：换出时只需关闭日志，换入时从日志恢复。
+    """
+
+    def __init__(self, max_active_plans: int = 128, spill_store=None,
+                 manager_factory: Callable[..., PlanManager] = PlanManager, wal_store=None):
+        if max_active_plans < 1:
+            raise ValueError("max_active_plans must be at least 1")
+        self.max_active_plans = max_active_plans
+        self.spill_store = spill_store if spill_store is not None else MemorySpillStore()
+        self.wal_store = wal_store
+        self._manager_factory = manager_factory
+        self._active: "OrderedDict[str, _PlanEntry]" = OrderedDict()
+        # 正在通过 StoredPlanView 读取的换出计划及读取数；这些计划换入时推迟删除存储中的副本，
+        # 等最后一个读取结束后再删除（记录在 _deferred_deletes 中）
+        self._readers: Dict[str, int] = {}
+        self._deferred_deletes = set()
+        # 已移出 _active、正在注册表锁外写入溢出存储的计划；同一计划的 open/drop 在 _spill_done 上等待写入结束
+        self._spilling: Dict[str, _PlanEntry] = {}
+        self._lock = threading.Lock()
+        self._spill_done = threading.Condition(self._lock)
+
+    @contextmanager
+    def open(self, plan_id: Optional[str] = None) -> Iterator[PlanManager]:
+        """
+        获取计划并持有它的锁，在 with 块内独占使用该计划。
+        不存在的计划会被创建为空计划；已换出的计划会先从溢出存储中恢复。
+        """
+        plan_id = plan_id or DEFAULT_PLAN_ID
+        with self._lock:
+            self._wait_for_spill(plan_id)
+            entry = self._active.get(plan_id)
+            if entry is None:
+                entry = self._restore(plan_id)
+                self._active[plan_id] = entry
+            else:
+                self._active.move_to_end(plan_id)
+            # 被占用的计划不会被换出
+            entry.pins += 1
+        try:
+            with entry.lock:
+                yield entry.manager
+        finally:
+            with self._lock:
+                entry.pins -= 1
+                victims = self._select_idle()
+            self._evict_idle(victims)
+
+    @contextmanager
+    def read(self, plan_id: Optional[str] = None) -> Iterator:
+        """
+        只读访问计划。计划驻留在内存中时与 open 相同；
+        已换出到支持查询的存储（如 SQLitePlanStore）时返回 StoredPlanView，直接在存储的索引上查询而不换入计划；
+        计划中有到期的租约时仍然换入，由 PlanManager 把到期的任务退回 pending。
+        注册表锁只在检查计划位置时持有，视图查询期间其他计划的调用（包括 with 块内的嵌套调用）不受阻塞；
+        查询期间计划被换入时，存储中的副本保留到读取结束后再删除。
+        """
+        plan_id = plan_id or DEFAULT_PLAN_ID
+        with self._lock:
+            # 正在换出的计划在存储中可能只有旧副本，交给 open 等待写入结束
+            stored = (plan_id not in self._active and plan_id not in self._spilling and self.wal_store is None
+                      and self.spill_store.supports_queries and self.spill_store.contains(plan_id))
+            if stored:
+                self._readers[plan_id] = self._readers.get(plan_id, 0) + 1
+        if stored:
+            try:
+                if not self.spill_store.has_expired_leases(plan_id):
+                    yield StoredPlanView(self.spill_store, plan_id)
+                    return
+            finally:
+                self._release_reader(plan_id)
+        with self.open(plan_id) as manager:
+            yield manager
+
+    def drop(self, plan_id: str) -> bool:
+        """删除一个计划（无论是否已换出），返回计划是否存在"""
+        with self._lock:
+            self._wait_for_spill(plan_id)
+            entry = self._active.pop(plan_id, None)
+            self._deferred_deletes.discard(plan_id)
+            if self.wal_store is not None:
+                if entry is not None:
+                    entry.journal.close()
+                persisted = plan_id in self.wal_store.keys()
+                self.wal_store.delete(plan_id)
+                return entry is not None or persisted
+            spilled = self.spill_store.contains(plan_id)
+            self.spill_store.delete(plan_id)
+            return entry is not None or spilled
+
+    def exists(self, plan_id: str) -> bool:
+        """计划是否存在（驻留在内存中或已换出），不会像 open 那样创建空计划"""
+        with self._lock:
+            if plan_id in self._active or plan_id in self._spilling:
+                return True
+            if self.wal_store is not None:
+                return plan_id in self.wal_store.keys()
+            return self.spill_store.contains(plan_id)
+
+    def list_plans(self) -> List[str]:
+        """列出所有计划ID，包括已换出的计划"""
+        with self._lock:
+            stored = self.wal_store.keys() if self.wal_store is not None else self.spill_store.keys()
+            return sorted(set(self._active) | set(self._spilling) | set(stored))
+
+    def active_plans(self) -> List[str]:
+        """列出当前驻留在内存中的计划ID，按从最久未使用到最近使用排序"""
+        with self._lock:
+            return list(self._active)
+
+    def recover(self) -> List[str]:
+        """启动时回放预写日志中的所有计划（超出上限的计划回放后会压缩并换出），返回恢复的计划ID"""
+        if self.wal_store is None:
+            return []
+        plan_ids = sorted(self.wal_store.keys())
+        for plan_id in plan_ids:
+            with self.open(plan_id):
+                pass
+        return plan_ids
+
+    def _restore(self, plan_id: str) -> _PlanEntry:
+        """创建计划管理器，如果计划曾被换出则从溢出存储（或预写日志）中加载"""
+        if self.wal_store is not None:
+            journal = self.wal_store.open(plan_id)
+            return _PlanEntry(self._manager_factory(journal.recover(), journal=journal), journal)
+        plan_data = self.spill_store.load(plan_id)
+        # 换出的数据来自 dumpPlan，直接交给构造函数重建索引，不经过 loadPlan 以保留原有时间戳
+        manager = self._manager_factory(plan_data)
+        if plan_data is not None:
+            if plan_id in self._readers:
+                self._deferred_deletes.add(plan_id)
+            else:
+                self.spill_store.delete(plan_id)
+        return _PlanEntry(manager)
+
+    def _release_reader(self, plan_id: str) -> None:
+        """结束一次对换出计划的读取；最后一个读取结束时删除读取期间已换入的计划在存储中的副本"""
+        with self._lock:
+            self._readers[plan_id] -= 1
+            if self._readers[plan_id]:
+                return
+            del self._readers[plan_id]
+            # 计划正在换出时由换出结束后的 _finish_spill 决定是否删除
+            if plan_id in self._deferred_deletes and plan_id not in self._spilling:
+                self._deferred_deletes.discard(plan_id)
+                self.spill_store.delete(plan_id)
+
+    def _wait_for_spill(self, plan_id: str) -> None:
+        """等待计划的换出写入结束（调用方需持有注册表锁）"""
+        while plan_id in self._spilling:
+            self._spill_done.wait()
+
+    def _select_idle(self) -> List[Tuple[str, _PlanEntry]]:
+        """
+        按 LRU 顺序选出超出上限的空闲计划，移出 _active 并登记为正在换出（调用方需持有注册表锁）。
+        选出的计划交给 _evict_idle 在注册表锁外写出。
+        """
+        excess = len(self._active) - self.max_active_plans
+        victims = []
+        for plan_id, entry in self._active.items():
+            if len(victims) >= excess:
+                break
+            if entry.pins == 0:
+                victims.append((plan_id, entry))
+        for plan_id, entry in victims:
+            del self._active[plan_id]
+            self._spilling[plan_id] = entry
+        return victims
+
+    def _evict_idle(self, victims: List[Tuple[str, _PlanEntry]]) -> None:
+        """
+        把 _select_idle 选出的计划写到溢出存储（或关闭其日志）。
+        写入在注册表锁外进行，不会阻塞其他计划的调用，只有同一计划的 open/drop 等待写入结束。
+        保存失败的计划放回内存并记录错误，不会把异常抛给恰好触发换出的其他计划的调用。
+        """
+        for plan_id, entry in victims:
+            saved = failed = False
+            try:
+                if entry.journal is not None:
+                    # 计划已经持久化在日志中，换出时只需刷出并关闭日志
+                    entry.journal.close()
+                else:
+                    plan_data = entry.manager.dumpPlan()["data"]
+                    # 从未初始化过的空计划（例如只被查询过的计划ID）无需保存
+                    if plan_data["tasks"] or plan_data["meta"]["goal"]:
+                        self.spill_store.save(plan_id, plan_data)
+                        saved = True
+            except Exception:
+                logger.exception("Failed to spill plan %r; keeping it in memory", plan_id)
+                failed = True
+            with self._lock:
+                self._finish_spill(plan_id, entry, saved, failed)
+
+    def _finish_spill(self, plan_id: str, entry: _PlanEntry, saved: bool, failed: bool) -> None:
+        """结束一个计划的换出并唤醒等待它的调用（调用方需持有注册表锁）"""
+        del self._spilling[plan_id]
+        if failed:
+            # 放回最久未使用的位置，下一次换出时重试
+            self._active[plan_id] = entry
+            self._active.move_to_end(plan_id, last=False)
+        if saved:
+            # 存储中的副本已被最新数据覆盖，不再需要推迟删除
+            self._deferred_deletes.discard(plan_id)
+        elif plan_id in self._deferred_deletes and plan_id not in self._readers:
+            # 换出期间结束的读取没有删除旧副本，这里补上
+            self._deferred_deletes.discard(plan_id)
+            self.spill_store.delete(plan_id)
+        self._spill_done.notify_all()
@@ -0,0 +1,116 @@
+"""
+按任务增量维护的渲染缓存
+可视化和上下文提示词都是“每个任务渲染出一段文本，再按固定顺序拼接”。TaskRenderCache 为每个任务缓存渲染结果，
+通过 PlanManager.dumpPlanDelta 与计划同步：计划没有变化时 O(1)，否则只重新渲染变化的任务，
+渲染结果和顺序都没有变化时保留拼接好的输出。
+缓存跟随 PlanManager 对象保存（plan_cache），生成器每次调用都新建也能命中，计划被换出内存后随之释放。
+"""
+
+import bisect
+import threading
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+
+_plan_caches: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+_plan_caches_lock = threading.Lock()
+
+
+def plan_cache(plan_manager, key: str, factory: Callable[[], Any]) -> Any:
+    """获取（必要时创建）挂在 plan_manager 上、名为 key 的缓存对象"""
+    with _plan_caches_lock:
+        caches = _plan_caches.get(plan_manager)
+        if caches is None:
+            caches = _plan_caches[plan_manager] = {}
+        cache = caches.get(key)
+        if cache is None:
+            cache = caches[key] = factory()
+        return cache
+
+
+class TaskRenderCache:
+    """
+    单个计划的按任务渲染缓存。
+
+    render(task, names) 返回任务的渲染结果（可以是字符串或元组等任意可比较的值），
+    names 为 任务ID -> 名称 的映射，渲染结果引用了依赖任务的名称时，依赖任务改名后会重新渲染其直接后继。
+    sort_by_id 为 True 时按任务ID排列，否则按计划顺序排列。
+    使用者在持有 lock 时调用 sync，再读取 entries/order，并把组装好的文本保存在 output 上（结果变化时会被置为 None）。
+    """
+
+    def __init__(self, render: Callable[[Dict, Dict[int, str]], Any], sort_by_id: bool = False):
+        self.render = render
+        self.sort_by_id = sort_by_id
+        self.lock = threading.Lock()
+        self.version: Optional[int] = None  # entries/order 对应的计划版本，None 表示尚未构建
+        self.names: Dict[int, str] = {}
+        self.entries: Dict[int, Any] = {}
+        self.order: List[int] = []
+        self.output: Optional[Any] = None
+
+    def sync(self, plan_manager) -> bool:
+        """把缓存同步到计划的最新版本，计划无法导出时返回 False"""
+        if self.version is not None:
+            delta_result = plan_manager.dumpPlanDelta(self.version)
+            if delta_result["success"]:
+                delta = delta_result["data"]
+                if delta["full"]:
+                    self._rebuild(delta["plan"]["tasks"], delta["version"])
+                else:
+                    self._apply_delta(plan_manager, delta)
+                return True
+
+        dump_result = plan_manager.dumpPlan()
+        if not dump_result.get("success"):
+            return False
+        plan_data = dump_result["data"]
+        self._rebuild(plan_data["tasks"], plan_data["meta"]["version"])
+        return True
+
+    def ordered_entries(self):
+        """按显示顺序迭代各任务的渲染结果"""
+        entries = self.entries
+        return (entries[task_id] for task_id in self.order)
+
+    def _rebuild(self, tasks: List[Dict], version: int) -> None:
+        self.names = {task["id"]: task["name"] for task in tasks}
+        self.entries = {task["id"]: self.render(task, self.names) for task in tasks}
+        self.order = sorted(self.names) if self.sort_by_id else [task["id"] for task in tasks]
+        self.output = None
+        self.version = version
+
+    def _apply_delta(self, plan_manager, delta: Dict) -> None:
+        # 与 wal.apply_record 的回放顺序一致：先删除，再按最终下标升序插入新任务
+        if delta["remove"]:
+            removed = set(delta["remove"])
+            self.order = [task_id for task_id in self.order if task_id not in removed]
+            for task_id in removed:
+                self.names.pop(task_id, None)
+                self.entries.pop(task_id, None)
+            self.output = None
+        if delta["insert"]:
+            inserts = sorted(((int(task_id), position) for task_id, position in delta["insert"].items()), key=lambda item: item[1])
+            for task_id, position in inserts:
+                if self.sort_by_id:
+                    bisect.insort(self.order, task_id)
+                else:
+                    self.order.insert(position, task_id)
+            self.output = None
+
+        # 先更新所有名称再渲染，新任务之间的依赖也能取到名称
+        changed = list(delta["upsert"])
+        renamed = []
+        for task in changed:
+            old_name = self.names.get(task["id"])
+            if old_name != task["name"]:
+                if old_name is not None:
+                    renamed.append(task["id"])
+                self.names[task["id"]] = task["name"]
+        for task_id in renamed:
+            changed.extend(plan_manager.getDependents(task_id)["data"])
+
+        for task in changed:
+            entry = self.render(task, self.names)
+            if self.entries.get(task["id"]) != entry:
+                self.entries[task["id"]] = entry
+                self.output = None
+        self.version = delta["version"]
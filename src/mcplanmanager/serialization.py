@@ -0,0 +1,58 @@
+"""
+工具响应的序列化
+FastMCP 默认用 pydantic_core.to_json(indent=2) 序列化工具返回值，大计划上 getTaskList/dumpPlan 的耗时主要花在这里。
+dumps_response 输出紧凑 JSON：任务视图（TaskView）直接拼接缓存的 JSON 文本（见 TaskView.to_json），
+不含任务视图的列表和其余标量整体交给标准库 json 编码。
+"""
+
+import json
+
+import pydantic_core
+
+from .task_record import TaskView
+
+
+def _default(value):
+    # pydantic 模型等非 JSON 原生类型，与 FastMCP 默认序列化器的处理方式一致
+    return pydantic_core.to_jsonable_python(value, fallback=str)
+
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default).encode
+
+
+def _encode_key(key) -> str:
+    # 与 json 模块一致：非字符串键转换为对应的 JSON 字面量文本
+    return _encode(key if isinstance(key, str) else _encode(key))
+
+
+def _write(value, parts: list) -> None:
+    value_type = type(value)
+    if value_type is TaskView:
+        parts.append(value.to_json())
+    elif value_type is dict:
+        parts.append("{")
+        first = True
+        for key, item in value.items():
+            if not first:
+                parts.append(",")
+            first = False
+            parts.append(_encode_key(key))
+            parts.append(":")
+            _write(item, parts)
+        parts.append("}")
+    elif (value_type is list or value_type is tuple) and any(type(item) is TaskView for item in value):
+        parts.append("[")
+        for index, item in enumerate(value):
+            if index:
+                parts.append(",")
+            _write(item, parts)
+        parts.append("]")
+    else:
+        parts.append(_encode(value))
+
+
+def dumps_response(value) -> str:
+    """把工具返回值序列化为紧凑 JSON 文本，作为 FastMCP 的 tool_serializer"""
+    parts: list = []
+    _write(value, parts)
+    return "".join(parts)
@@ -0,0 +1,358 @@
+"""
+计划存储
+注册表把换出的计划保存到这里的存储引擎中：
+  - MemorySpillStore: 内存中的压缩 JSON
+  - FileSpillStore: 每个计划一个 JSON 文件
+  - SQLitePlanStore: 规范化的 SQLite 表（任务表、双向索引的依赖边表、状态索引），
+    可以不把计划换入内存，直接在索引上回答只读查询
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+from urllib.parse import quote, unquote
+
+from .plan_manager import SATISFIED_STATUSES, normalize_task_list_query
+from .task_record import TASK_FIELDS
+
+
+class PlanStore:
+    """
+    计划存储接口
+    save/load/delete/keys 是换出和换入计划所需的最小接口；
+    supports_queries 为 True 的存储还提供 query_* 方法，用于直接查询已换出的计划。
+    """
+
+    supports_queries = False
+
+    def save(self, plan_id: str, plan_data: Dict) -> None:
+        raise NotImplementedError
+
+    def load(self, plan_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def delete(self, plan_id: str) -> None:
+        raise NotImplementedError
+
+    def keys(self) -> List[str]:
+        raise NotImplementedError
+
+    def contains(self, plan_id: str) -> bool:
+        return plan_id in self.keys()
+
+
+class MemorySpillStore(PlanStore):
+    """把换出的计划序列化为 JSON 字符串保存在内存中，丢弃索引等派生结构"""
+
+    def __init__(self):
+        self._plans: Dict[str, str] = {}
+
+    def save(self, plan_id: str, plan_data: Dict) -> None:
+        self._plans[plan_id] = json.dumps(plan_data, ensure_ascii=False, separators=(",", ":"))
+
+    def load(self, plan_id: str) -> Optional[Dict]:
+        encoded = self._plans.get(plan_id)
+        return json.loads(encoded) if encoded is not None else None
+
+    def delete(self, plan_id: str) -> None:
+        self._plans.pop(plan_id, None)
+
+    def keys(self) -> List[str]:
+        return list(self._plans)
+
+
+class FileSpillStore(PlanStore):
+    """把换出的计划以 JSON 文件的形式保存在指定目录中，每个计划一个文件"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, plan_id: str) -> str:
+        # 计划ID来自客户端，编码后再作为文件名，避免路径穿越
+        return os.path.join(self.directory, quote(plan_id, safe="") + ".json")
+
+    def save(self, plan_id: str, plan_data: Dict) -> None:
+        path = self._path(plan_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(plan_data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def load(self, plan_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(plan_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def delete(self, plan_id: str) -> None:
+        try:
+            os.remove(self._path(plan_id))
+        except FileNotFoundError:
+            pass
+
+    def keys(self) -> List[str]:
+        return [unquote(name[:-len(".json")]) for name in os.listdir(self.directory) if name.endswith(".json")]
+
+
+class SQLitePlanStore(PlanStore):
+    """
+    SQLite 存储引擎
+    tasks 表按 (plan_id, id) 组织，并带有 (plan_id, status, position) 状态索引；
+    edges 表以 (plan_id, task_id, position) 为主键，另有 (plan_id, dep_id) 反向索引，
+    因此按状态过滤、可执行任务、依赖任务和依赖图查询都只访问相关的索引范围。
+    """
+
+    supports_queries = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS plans (
+            plan_id TEXT PRIMARY KEY,
+            meta TEXT NOT NULL,
+            state TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tasks (
+            plan_id TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            name TEXT,
+            status TEXT NOT NULL,
+            reasoning TEXT,
+            result TEXT,
+            extra TEXT,
+            PRIMARY KEY (plan_id, id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (plan_id, status, position);
+        CREATE INDEX IF NOT EXISTS tasks_by_position ON tasks (plan_id, position);
+        CREATE TABLE IF NOT EXISTS edges (
+            plan_id TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            dep_id INTEGER NOT NULL,
+            PRIMARY KEY (plan_id, task_id, position)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS edges_by_dependency ON edges (plan_id, dep_id);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def save(self, plan_id: str, plan_data: Dict) -> None:
+        task_rows = []
+        edge_rows = []
+        for position, task in enumerate(plan_data["tasks"]):
+            # 任务的固定字段（TASK_FIELDS）各占一列，其余字段作为 JSON 保存在 extra 列中
+            extra = {key: value for key, value in task.items() if key not in TASK_FIELDS}
+            name, reasoning, result = task.get("name"), task.get("reasoning"), task.get("result")
+            # 非字符串的 name/reasoning/result（通过 loadPlan 导入的任意数据）原样保存在 extra 中；
+            # 缺失的 name 也放在 extra 中，name 列写入空字符串，兼容旧版本建表时 name 列的 NOT NULL 约束
+            if not isinstance(name, str):
+                extra["name"], name = name, ""
+            if not isinstance(reasoning, (str, type(None))):
+                extra["reasoning"], reasoning = reasoning, None
+            if not isinstance(result, (str, type(None))):
+                extra["result"], result = result, None
+            task_rows.append((plan_id, task["id"], position, name, task["status"], reasoning, result,
+                              json.dumps(extra, ensure_ascii=False) if extra else None))
+            edge_rows.extend((plan_id, task["id"], index, dep_id) for index, dep_id in enumerate(task["dependencies"]))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete(plan_id)
+                self._conn.execute("INSERT INTO plans VALUES (?, ?, ?)", (
+                    plan_id, json.dumps(plan_data["meta"], ensure_ascii=False), json.dumps(plan_data["state"], ensure_ascii=False)
+                ))
+                self._conn.executemany("INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?)", task_rows)
+                self._conn.executemany("INSERT INTO edges VALUES (?, ?, ?, ?)", edge_rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def load(self, plan_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT meta, state FROM plans WHERE plan_id = ?", (plan_id,)).fetchone()
+            if row is None:
+                return None
+            tasks = self._query_tasks("SELECT * FROM tasks WHERE plan_id = ? ORDER BY position", (plan_id,), plan_id)
+        return {"meta": json.loads(row[0]), "state": json.loads(row[1]), "tasks": tasks}
+
+    def delete(self, plan_id: str) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._delete(plan_id)
+            self._conn.execute("COMMIT")
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT plan_id FROM plans")]
+
+    def contains(self, plan_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM plans WHERE plan_id = ?", (plan_id,)).fetchone() is not None
+
+    def has_expired_leases(self, plan_id: str) -> bool:
+        """换出的计划中是否有已经到期的租约（到期的任务需要换入计划后才能退回 pending）"""
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM plans WHERE plan_id = ?", (plan_id,)).fetchone()
+        if row is None:
+            return False
+        now = time.time()
+        leases = json.loads(row[0]).get("leases", {})
+        return any(datetime.fromisoformat(lease["expires_at"]).timestamp() <= now for lease in leases.values())
+
+    def query_tasks(self, plan_id: str, statuses: Optional[List[str]] = None,
+                    after_id: Optional[int] = None, limit: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        按计划顺序返回任务，指定 statuses 时走状态索引。
+        after_id 为分页游标：只返回计划中位于该任务之后的任务，该任务不存在时返回 None。
+        """
+        conditions, params = ["plan_id = ?"], [plan_id]
+        if statuses:
+            conditions.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        with self._lock:
+            if after_id is not None:
+                row = self._conn.execute("SELECT position FROM tasks WHERE plan_id = ? AND id = ?", (plan_id, after_id)).fetchone()
+                if row is None:
+                    return None
+                conditions.append("position > ?")
+                params.append(row[0])
+            sql = f"SELECT * FROM tasks WHERE {' AND '.join(conditions)} ORDER BY position"
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit)
+            return self._query_tasks(sql, tuple(params), plan_id)
+
+    def query_executable_tasks(self, plan_id: str) -> List[Dict]:
+        """状态为 pending 且所有依赖都已满足（存在且已完成或已跳过）的任务，按计划顺序"""
+        placeholders = ", ".join("?" for _ in SATISFIED_STATUSES)
+        with self._lock:
+            return self._query_tasks(f"""
+                SELECT t.* FROM tasks t
+                WHERE t.plan_id = ? AND t.status = 'pending' AND NOT EXISTS (
+                    SELECT 1 FROM edges e
+                    LEFT JOIN tasks d ON d.plan_id = e.plan_id AND d.id = e.dep_id
+                    WHERE e.plan_id = t.plan_id AND e.task_id = t.id
+                      AND (d.status IS NULL OR d.status NOT IN ({placeholders}))
+                )
+                ORDER BY t.position
+            """, (plan_id, *SATISFIED_STATUSES), plan_id)
+
+    def query_dependents(self, plan_id: str, task_id: int) -> Optional[List[Dict]]:
+        """直接依赖指定任务的任务（按ID排序），任务不存在时返回 None"""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM tasks WHERE plan_id = ? AND id = ?", (plan_id, task_id)).fetchone() is None:
+                return None
+            return self._query_tasks("""
+                SELECT * FROM tasks WHERE plan_id = ? AND id IN (
+                    SELECT task_id FROM edges WHERE plan_id = ? AND dep_id = ?
+                )
+                ORDER BY id
+            """, (plan_id, plan_id, task_id), plan_id)
+
+    def query_dependency_graph(self, plan_id: str) -> Dict:
+        """依赖图的节点和边，顺序与 PlanManager.getDependencyGraph 一致"""
+        with self._lock:
+            nodes = [
+                {"id": task_id, "name": json.loads(extra).get("name", name) if extra else name, "status": status}
+                for task_id, name, status, extra in self._conn.execute(
+                    "SELECT id, name, status, extra FROM tasks WHERE plan_id = ? ORDER BY position", (plan_id,)
+                )
+            ]
+            edges = [
+                {"from": dep_id, "to": task_id}
+                for dep_id, task_id in self._conn.execute("""
+                    SELECT e.dep_id, e.task_id FROM edges e
+                    JOIN tasks t ON t.plan_id = e.plan_id AND t.id = e.task_id
+                    WHERE e.plan_id = ?
+                    ORDER BY t.position, e.position
+                """, (plan_id,))
+            ]
+        return {"nodes": nodes, "edges": edges}
+
+    def _delete(self, plan_id: str) -> None:
+        self._conn.execute("DELETE FROM edges WHERE plan_id = ?", (plan_id,))
+        self._conn.execute("DELETE FROM tasks WHERE plan_id = ?", (plan_id,))
+        self._conn.execute("DELETE FROM plans WHERE plan_id = ?", (plan_id,))
+
+    def _query_tasks(self, sql: str, params: tuple, plan_id: str) -> List[Dict]:
+        """执行任务查询，并只为查到的任务加载依赖列表（调用方需持有锁）"""
+        rows = self._conn.execute(sql, params).fetchall()
+        if not rows:
+            return []
+        dependencies: Dict[int, List[int]] = {row[1]: [] for row in rows}
+        if len(rows) > 500:
+            # 结果较多时一次性扫描整个计划的边，避免超长的 IN 列表
+            edge_rows = self._conn.execute(
+                "SELECT task_id, dep_id FROM edges WHERE plan_id = ? ORDER BY task_id, position", (plan_id,)
+            )
+        else:
+            placeholders = ", ".join("?" for _ in rows)
+            edge_rows = self._conn.execute(
+                f"SELECT task_id, dep_id FROM edges WHERE plan_id = ? AND task_id IN ({placeholders}) ORDER BY task_id, position",
+                (plan_id, *dependencies)
+            )
+        for task_id, dep_id in edge_rows:
+            if task_id in dependencies:
+                dependencies[task_id].append(dep_id)
+        tasks = []
+        for _, task_id, _, name, status, reasoning, result, extra in rows:
+            task = {"id": task_id, "name": name, "status": status, "dependencies": dependencies[task_id],
+                    "reasoning": reasoning, "result": result}
+            if extra:
+                task.update(json.loads(extra))
+            tasks.append(task)
+        return tasks
+
+
+class StoredPlanView:
+    """
+    已换出到 SQLitePlanStore 的计划的只读视图
+    提供与 PlanManager 相同签名、返回格式和结果顺序的查询方法，查询直接在存储的索引上执行，不把计划换入内存。
+    视图不处理租约过期：有租约到期的计划由 PlanRegistry.read 换入后再查询。
+    """
+
+    def __init__(self, store: SQLitePlanStore, plan_id: str):
+        self.store = store
+        self.plan_id = plan_id
+
+    def getTaskList(self, status_filter: Union[str, List[str], None] = None, limit: Optional[int] = None,
+                    cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> Dict:
+        statuses, after_id, error = normalize_task_list_query(status_filter, limit, cursor, fields)
+        if error:
+            return {"success": False, "message": error, "data": None}
+        tasks = self.store.query_tasks(self.plan_id, statuses, after_id, None if limit is None else limit + 1)
+        if tasks is None:
+            return {"success": False, "message": f"Invalid cursor: task {after_id} no longer exists", "data": None}
+        has_more = limit is not None and len(tasks) > limit
+        if has_more:
+            tasks = tasks[:limit]
+        if fields is not None:
+            tasks = [{field: task[field] for field in fields} for task in tasks]
+        response = {"success": True, "data": tasks}
+        if limit is not None:
+            response["next_cursor"] = str(tasks[-1]["id"]) if has_more else None
+        return response
+
+    def getExecutableTaskList(self) -> Dict:
+        return {"success": True, "data": self.store.query_executable_tasks(self.plan_id)}
+
+    def getDependents(self, task_id: int) -> Dict:
+        dependents = self.store.query_dependents(self.plan_id, task_id)
+        if dependents is None:
+            return {"success": False, "message": f"Task with id {task_id} not found", "data": None}
+        return {"success": True, "data": dependents}
+
+    def getDependencyGraph(self) -> Dict:
+        return {"success": True, "data": self.store.query_dependency_graph(self.plan_id)}
@@ -0,0 +1,127 @@
+"""
+任务的内部表示
+计划内部用 __slots__ 记录保存任务，而不是每个任务一个字典：
+  - 没有每个实例的 __dict__ 和哈希表，单个任务的固定开销约为字典的三分之一
+  - 依赖保存为元组，名称、说明和状态字符串经过驻留（sys.intern），相同的字符串只保存一份
+对外（工具响应、dumpPlan、预写日志）仍然是字典：to_dict() 按需生成字典视图，
+视图被外部持有期间会被复用，任务被修改后生成新的视图，已导出的视图永远不会被改动。
+视图的 JSON 文本保存在容量有限的 LRU 缓存中，任务未被修改时重复序列化只需复用缓存（见 serialization.py）。
+"""
+
+import json
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+TASK_FIELDS = frozenset(("id", "name", "status", "dependencies", "reasoning", "result"))
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+# 任务 JSON 文本缓存的容量（文本和视图字典占用的字节数），常驻内存不随计划规模增长
+JSON_CACHE_BYTES = 8 * 1024 * 1024
+
+
+class _JsonCache:
+    """
+    视图 -> JSON 文本 的 LRU 缓存，总大小超过容量时淘汰最久未用的条目。
+    以视图为键：视图不可变，任务被修改后生成新的视图，因此缓存的文本永远与视图内容一致。
+    条目持有视图本身，任务未被修改时 to_dict() 会一直返回这个视图，下一次序列化仍能命中；
+    视图的 id 在条目存在期间也不会被其他对象复用。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self._entries: "OrderedDict[int, Tuple[TaskView, str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, view: "TaskView") -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(id(view))
+            if entry is None:
+                return None
+            self._entries.move_to_end(id(view))
+            return entry[1]
+
+    def put(self, view: "TaskView", text: str) -> None:
+        cost = sys.getsizeof(text) + sys.getsizeof(view)
+        if cost > self.capacity:
+            return
+        with self._lock:
+            if id(view) in self._entries:
+                return
+            self._entries[id(view)] = (view, text, cost)
+            self.size += cost
+            while self.size > self.capacity:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+
+_json_cache = _JsonCache(JSON_CACHE_BYTES)
+
+
+class TaskView(dict):
+    """任务的字典视图。普通字典不支持弱引用，子类化后才能被 TaskRecord 弱引用缓存"""
+
+    __slots__ = ("__weakref__",)
+
+    def to_json(self) -> str:
+        """返回视图的紧凑 JSON 文本，最近序列化过的视图直接复用缓存"""
+        text = _json_cache.get(self)
+        if text is None:
+            text = json.dumps(self, ensure_ascii=False, separators=(",", ":"), default=str)
+            _json_cache.put(self, text)
+        return text
+
+
+class TaskRecord:
+    """
+    一个任务的 __slots__ 记录
+    extra 保存 TASK_FIELDS 以外的字段（例如通过 loadPlan 导入的自定义字段），没有时为 None。
+    修改记录前必须调用 invalidate()，使之后的 to_dict() 生成新的视图。
+    """
+
+    __slots__ = ("id", "name", "status", "dependencies", "reasoning", "result", "extra", "_view")
+
+    def __init__(self, id: int, name: str, status: str, dependencies: Tuple[int, ...],
+                 reasoning: Optional[str], result: Optional[str] = None, extra: Optional[Dict] = None):
+        self.id = id
+        self.name = _intern(name)
+        self.status = _intern(status)
+        self.dependencies = dependencies
+        self.reasoning = _intern(reasoning)
+        self.result = result
+        self.extra = extra
+        self._view = None
+
+    @classmethod
+    def from_dict(cls, task: Dict) -> "TaskRecord":
+        extra = {key: value for key, value in task.items() if key not in TASK_FIELDS} if task.keys() != TASK_FIELDS else None
+        return cls(task["id"], task.get("name"), task["status"], tuple(task["dependencies"]),
+                   task.get("reasoning"), task.get("result"), extra or None)
+
+    def to_dict(self) -> TaskView:
+        """返回任务的字典视图。调用方不应修改它"""
+        view = self._view() if self._view is not None else None
+        if view is None:
+            view = TaskView(id=self.id, name=self.name, status=self.status, dependencies=list(self.dependencies),
+                            reasoning=self.reasoning, result=self.result)
+            if self.extra:
+                view.update(self.extra)
+            # 视图被释放时回调清除缓存，记录不会长期持有失效的弱引用
+            self._view = weakref.ref(view, self._drop_view)
+        return view
+
+    def invalidate(self) -> None:
+        """记录即将被修改：之后的 to_dict() 生成新的视图，已导出的视图保持不变"""
+        self._view = None
+
+    def _drop_view(self, ref: weakref.ref) -> None:
+        # 视图可能在其他线程中被释放，只清除仍指向这个视图的缓存
+        if self._view is ref:
+            self._view = None
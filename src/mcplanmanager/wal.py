@@ -0,0 +1,310 @@
+"""
+预写日志（WAL）持久化
+每个计划一个目录，包含：
+  - wal.log: 追加写入的修改记录（每行一个 JSON），记录的是每次调用后被修改任务的最新内容
+  - snapshot.json: 压缩后的完整快照，写入后日志被截断
+记录先进入内存缓冲区，由后台线程按组提交（一次写入 + 一次 fsync 覆盖一批记录），
+追加记录的调用等到包含该记录的一批落盘后才返回；恢复时加载快照并按序号回放之后的日志记录。
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional
+from urllib.parse import quote, unquote
+
+SNAPSHOT_FILE = "snapshot.json"
+LOG_FILE = "wal.log"
+
+logger = logging.getLogger(__name__)
+
+
+def _fsync_directory(directory: str) -> None:
+    """让目录项（新建或替换的文件名）也落盘"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def apply_record(plan_data: Dict, record: Dict, positions: Optional[Dict[int, int]]) -> Optional[Dict[int, int]]:
+    """
+    把一条日志记录回放到计划数据上（原地修改）。
+
+    Args:
+        plan_data: 计划数据
+        record: 日志记录
+        positions: 任务ID -> 下标 的缓存，None 表示需要重建
+
+    Returns:
+        Optional[Dict[int, int]]: 回放后仍然有效的下标缓存，任务增删后返回 None
+    """
+    plan_data["meta"] = record["meta"]
+    plan_data["state"] = record["state"]
+    tasks = plan_data["tasks"]
+    if record["remove"]:
+        removed = set(record["remove"])
+        tasks[:] = [task for task in tasks if task["id"] not in removed]
+        positions = None
+    inserts = {int(task_id): position for task_id, position in record["insert"].items()}
+    if positions is None:
+        positions = {task["id"]: index for index, task in enumerate(tasks)}
+    for task in record["upsert"]:
+        if task["id"] not in inserts:
+            tasks[positions[task["id"]]] = task
+    if inserts:
+        upserts = {task["id"]: task for task in record["upsert"]}
+        # 新任务的下标是调用结束时的最终位置，按下标升序插入即可还原顺序
+        for task_id, position in sorted(inserts.items(), key=lambda item: item[1]):
+            tasks.insert(position, upserts[task_id])
+        positions = None
+    return positions
+
+
+class PlanJournal:
+    """单个计划的预写日志"""
+
+    def __init__(self, directory: str, committer: Optional["_GroupCommitter"] = None, compact_every: int = 1000):
+        self.directory = directory
+        self.compact_every = compact_every
+        self._committer = committer
+        self._lock = threading.Lock()
+        # 已落盘（写入日志并 fsync，或包含在快照中）的最大序号，append 在 _durable 上等待它追上自己的序号
+        self._durable = threading.Condition(self._lock)
+        self._buffer: List[str] = []
+        self._file = None
+        self._seq = 0
+        self._flushed_seq = 0
+        # 刷盘失败后日志文件的末尾状态未知，之后的追加和刷盘都直接报错，不再写入
+        self._error: Optional[BaseException] = None
+        self._records_since_snapshot = 0
+        self._closed = False
+
+    @property
+    def should_compact(self) -> bool:
+        return self._records_since_snapshot >= self.compact_every
+
+    def recover(self) -> Optional[Dict]:
+        """加载快照并回放之后的日志记录，计划从未写入过时返回 None"""
+        plan_data = None
+        snapshot_seq = 0
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            plan_data, snapshot_seq = snapshot["plan"], snapshot["seq"]
+        self._seq = self._flushed_seq = snapshot_seq
+        self._records_since_snapshot = 0
+
+        log_path = os.path.join(self.directory, LOG_FILE)
+        if not os.path.exists(log_path):
+            return plan_data
+        positions = None
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时写了一半的最后一条记录，之前的记录都已完整落盘
+                    break
+                if record["seq"] <= snapshot_seq:
+                    continue
+                if plan_data is None:
+                    # 还没有快照：从空计划开始，meta 和 state 由记录整体覆盖
+                    plan_data = {"meta": {}, "state": {}, "tasks": []}
+                positions = apply_record(plan_data, record, positions)
+                self._seq = record["seq"]
+                self._records_since_snapshot += 1
+        self._flushed_seq = self._seq
+        return plan_data
+
+    def append(self, record: Dict) -> None:
+        """
+        追加一条记录并等待它落盘。记录在调用时立即序列化，由组提交线程与同一窗口内的其他记录一起写入磁盘，
+        fsync 完成后才返回，因此返回的修改在进程崩溃后一定能恢复。
+        """
+        with self._lock:
+            self._check_error()
+            self._seq += 1
+            seq = record["seq"] = self._seq
+            self._buffer.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._records_since_snapshot += 1
+        if self._committer is None:
+            self.flush()
+            return
+        self._committer.schedule(self)
+        with self._durable:
+            while self._flushed_seq < seq and not self._closed:
+                self._check_error()
+                self._durable.wait()
+
+    def flush(self) -> None:
+        """把缓冲区中的记录一次性写入日志并 fsync"""
+        with self._lock:
+            self._check_error()
+            if not self._buffer or self._closed:
+                return
+            try:
+                if self._file is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._file = open(os.path.join(self.directory, LOG_FILE), "a", encoding="utf-8")
+                self._file.write("".join(self._buffer))
+                self._buffer.clear()
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except Exception as e:
+                # 通知等待这批记录的调用：它们的修改没有落盘
+                self._error = e
+                self._durable.notify_all()
+                raise
+            self._flushed_seq = self._seq
+            self._durable.notify_all()
+
+    def _check_error(self) -> None:
+        """之前的刷盘失败过时抛出异常（调用方需持有锁）"""
+        if self._error is not None:
+            raise OSError(f"Write-ahead log in {self.directory} failed to flush: {self._error}") from self._error
+
+    def compact(self, plan_data: Dict) -> None:
+        """把完整计划写成快照并截断日志。快照已包含缓冲区中的所有修改，缓冲区直接丢弃"""
+        with self._lock:
+            if self._closed:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+            tmp_path = snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"seq": self._seq, "plan": plan_data}, f, ensure_ascii=False, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, snapshot_path)
+            _fsync_directory(self.directory)
+            # 快照落盘后再截断日志；两步之间崩溃时，恢复会按序号跳过快照已包含的记录
+            if self._file is not None:
+                self._file.close()
+            self._file = open(os.path.join(self.directory, LOG_FILE), "w", encoding="utf-8")
+            self._buffer.clear()
+            self._records_since_snapshot = 0
+            self._flushed_seq = self._seq
+            self._durable.notify_all()
+
+    def close(self) -> None:
+        """刷出剩余记录并关闭日志文件"""
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._closed = True
+            self._durable.notify_all()
+
+
+class _GroupCommitter:
+    """组提交线程：收集一个时间窗口内有新记录的日志，然后逐个刷盘"""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self._pending = set()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, journal: PlanJournal) -> None:
+        with self._cond:
+            self._pending.add(journal)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="wal-group-commit", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def flush_all(self) -> None:
+        with self._cond:
+            pending, self._pending = self._pending, set()
+        for journal in pending:
+            try:
+                journal.flush()
+            except Exception:
+                # 失败已由日志对象转交给等待落盘的调用，其余计划的日志照常刷盘
+                logger.exception("Failed to flush write-ahead log in %s", journal.directory)
+
+    def _run(self) -> None:
+        try:
+            while True:
+                with self._cond:
+                    while not self._pending:
+                        self._cond.wait()
+                # 等待一个提交窗口，让这段时间内的记录共用一次 fsync
+                time.sleep(self.interval)
+                self.flush_all()
+        finally:
+            # 线程意外退出时，下一次 schedule 会重新启动它
+            with self._cond:
+                self._thread = None
+
+
+_committers: "weakref.WeakSet[_GroupCommitter]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    for committer in list(_committers):
+        committer.flush_all()
+
+
+class WriteAheadLogStore:
+    """
+    预写日志目录：每个计划一个子目录，所有计划共用一个组提交线程
+
+    Args:
+        root: 日志根目录
+        group_commit_ms: 组提交窗口（毫秒），为 0 时每条记录都同步刷盘
+        compact_every: 日志累计多少条记录后压缩为快照
+    """
+
+    def __init__(self, root: str, group_commit_ms: float = 10, compact_every: int = 1000):
+        self.root = root
+        self.compact_every = compact_every
+        self._committer = _GroupCommitter(group_commit_ms) if group_commit_ms > 0 else None
+        if self._committer is not None:
+            _committers.add(self._committer)
+        os.makedirs(root, exist_ok=True)
+
+    def _directory(self, plan_id: str) -> str:
+        # 计划ID来自客户端，编码后再作为目录名，避免路径穿越
+        return os.path.join(self.root, quote(plan_id, safe=""))
+
+    def open(self, plan_id: str) -> PlanJournal:
+        return PlanJournal(self._directory(plan_id), self._committer, self.compact_every)
+
+    def delete(self, plan_id: str) -> None:
+        directory = self._directory(plan_id)
+        for name in (SNAPSHOT_FILE, LOG_FILE):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+    def keys(self) -> List[str]:
+        return [
+            unquote(name) for name in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, name, SNAPSHOT_FILE))
+            or os.path.exists(os.path.join(self.root, name, LOG_FILE))
+        ]
+
+    def flush(self) -> None:
+        """立即刷出所有计划中尚未提交的记录"""
+        if self._committer is not None:
+            self._committer.flush_all()
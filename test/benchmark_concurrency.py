@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 并发领取基准测试
+多个 worker 同时对同一个计划反复调用 startNextTask / completeTask，
+统计吞吐量和调用延迟，并断言没有任何任务被重复领取、所有任务都恰好完成一次
+
+使用方法：
+python test/benchmark_concurrency.py [--mode sse|threads] [--workers 16] [--tasks 300]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.plan_manager import PlanManager
+
+
+def build_tasks(size: int, max_deps: int, seed: int = 42) -> List[Dict]:
+    """生成一个分层的任务列表，每个任务依赖若干个前面的任务，让 worker 之间既有并行也有等待"""
+    rnd = random.Random(seed)
+    tasks = []
+    for i in range(size):
+        window = range(max(0, i - 30), i)
+        deps = rnd.sample(list(window), min(len(window), rnd.randint(0, max_deps)))
+        tasks.append({"name": f"task-{i}", "dependencies": [f"task-{d}" for d in sorted(deps)], "reasoning": "concurrency"})
+    return tasks
+
+
+def extract_data(response):
+    """从 MCP 响应中提取 JSON 数据"""
+    if isinstance(response, list) and len(response) > 0 and hasattr(response[0], "text"):
+        return json.loads(response[0].text)
+    return response
+
+
+def percentile(samples: List[float], ratio: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+async def run_sse(url: str, workers: int, tasks: List[Dict]) -> Dict:
+    """通过 SSE 连接并发调用服务端，每个 worker 使用独立的客户端会话，共同操作同一个 plan_id"""
+    from fastmcp import Client
+
+    plan_id = f"benchmark-concurrency-{uuid.uuid4().hex[:8]}"
+    async with Client(url) as admin:
+        init = extract_data(await admin.call_tool("initializePlan", {"goal": "并发领取基准测试", "tasks": tasks, "plan_id": plan_id}))
+        assert init.get("success"), f"初始化计划失败: {init}"
+
+    claims: List[int] = []
+    latencies: List[float] = []
+
+    async def worker():
+        async with Client(url) as client:
+            while True:
+                start = time.perf_counter()
+                started = extract_data(await client.call_tool("startNextTask", {"plan_id": plan_id}))
+                latencies.append(time.perf_counter() - start)
+                if started.get("success"):
+                    task_id = started["data"]["id"]
+                    claims.append(task_id)
+                    start = time.perf_counter()
+                    completed = extract_data(await client.call_tool("completeTask", {"task_id": task_id, "result": "done", "plan_id": plan_id}))
+                    latencies.append(time.perf_counter() - start)
+                    assert completed.get("success"), f"完成任务 {task_id} 失败: {completed}"
+                    continue
+                status = extract_data(await client.call_tool("getPlanStatus", {"plan_id": plan_id}))["data"]
+                if status["progress"]["completed_tasks"] == status["progress"]["total_tasks"]:
+                    return
+                # 剩余任务的依赖正被其他 worker 执行，稍后再试
+                await asyncio.sleep(0.002)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    elapsed = time.perf_counter() - start
+
+    async with Client(url) as admin:
+        status = extract_data(await admin.call_tool("getPlanStatus", {"plan_id": plan_id}))["data"]
+    return {"claims": claims, "latencies": latencies, "elapsed": elapsed, "status": status}
+
+
+def run_threads(workers: int, tasks: List[Dict]) -> Dict:
+    """在进程内用多个线程并发调用同一个 PlanManager"""
+    pm = PlanManager()
+    init = pm.initializePlan("并发领取基准测试", tasks)
+    assert init["success"], f"初始化计划失败: {init}"
+
+    claims: List[int] = []
+    latencies: List[float] = []
+    # 缩短线程切换间隔，尽量放大竞争窗口
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    def worker():
+        while True:
+            start = time.perf_counter()
+            started = pm.startNextTask()
+            latencies.append(time.perf_counter() - start)
+            if started["success"]:
+                task_id = started["data"]["id"]
+                claims.append(task_id)
+                start = time.perf_counter()
+                completed = pm.completeTask(task_id, "done")
+                latencies.append(time.perf_counter() - start)
+                assert completed["success"], f"完成任务 {task_id} 失败: {completed}"
+                continue
+            progress = pm.getPlanStatus()["data"]["progress"]
+            if progress["completed_tasks"] == progress["total_tasks"]:
+                return
+            time.sleep(0.0005)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    start = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    elapsed = time.perf_counter() - start
+    return {"claims": claims, "latencies": latencies, "elapsed": elapsed, "status": pm.getPlanStatus()["data"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 并发领取基准测试")
+    parser.add_argument("--mode", choices=["sse", "threads"], default="sse",
+                        help="sse: 并发调用运行中的服务端；threads: 进程内多线程调用 PlanManager")
+    parser.add_argument("--url", default="http://localhost:8080/sse", help="SSE 服务地址")
+    parser.add_argument("--workers", type=int, default=16, help="并发 worker 数量")
+    parser.add_argument("--tasks", type=int, default=300, help="计划中的任务数")
+    parser.add_argument("--deps", type=int, default=2, help="每个任务的最大依赖数量")
+    args = parser.parse_args()
+
+    tasks = build_tasks(args.tasks, args.deps)
+    print("🚀 并发领取基准测试")
+    print(f"📋 模式: {args.mode.upper()}, worker: {args.workers}, 任务数: {args.tasks}")
+    print("=" * 60)
+
+    if args.mode == "sse":
+        stats = asyncio.run(run_sse(args.url, args.workers, tasks))
+    else:
+        stats = run_threads(args.workers, tasks)
+
+    claims = Counter(stats["claims"])
+    double_claims = {task_id: count for task_id, count in claims.items() if count > 1}
+    calls = len(stats["latencies"])
+    print(f"⏱️ 总耗时: {stats['elapsed'] * 1000:.1f} ms, 调用次数: {calls}, 吞吐量: {calls / stats['elapsed']:.0f} 次/秒")
+    print(f"⏱️ 调用延迟 p50: {percentile(stats['latencies'], 0.5) * 1000:.3f} ms, "
+          f"p99: {percentile(stats['latencies'], 0.99) * 1000:.3f} ms")
+    print(f"📊 最终状态: {stats['status']['task_counts']}")
+    print("=" * 60)
+
+    assert not double_claims, f"任务被重复领取: {double_claims}"
+    assert len(claims) == args.tasks, f"领取的任务数 {len(claims)} 与计划任务数 {args.tasks} 不一致"
+    assert stats["status"]["task_counts"]["completed"] == args.tasks, f"仍有任务未完成: {stats['status']['task_counts']}"
+    print("✅ 没有任务被重复领取，所有任务恰好完成一次")
+    print("🎯 基准测试完成!")
+
+
+if __name__ == "__main__":
+    main()
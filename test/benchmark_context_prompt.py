@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 上下文提示词基准测试
+模拟智能体每轮调用 generateContextPrompt 的场景，对比旧版实现（每次 dumpPlan 全量导出、逐个依赖线性查找任务名称）
+与按计划版本缓存、按任务增量维护依赖关系行的 DependencyPromptGenerator 的单次生成耗时。
+
+测量三种情形：计划未变化、上一轮完成了一个任务（状态变化）、上一轮修改了一个被依赖任务的名称。
+另外对比完整提示词与聚焦（focus="neighborhood"，2 跳以内）提示词的生成耗时和长度，聚焦提示词不做缓存，每次都重新生成。
+
+使用方法：
+python test/benchmark_context_prompt.py [--sizes 1000,2000,5000] [--deps 3] [--rounds 5]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.dependency_tools import DependencyPromptGenerator
+from mcplanmanager.plan_manager import PlanManager
+
+
+class LegacyPromptGenerator(DependencyPromptGenerator):
+    """旧版实现：每次全量导出计划，依赖名称通过线性查找获得（O(T²·D)）"""
+
+    def generate_context_prompt(self) -> str:
+        status = self.pm.getPlanStatus()["data"]
+        plan_data = self.pm.dumpPlan()["data"]
+        tasks = plan_data["tasks"]
+        lines = []
+        for task in tasks:
+            deps = task.get("dependencies", [])
+            if deps:
+                dep_names = []
+                for dep_id in deps:
+                    dep_task = next((t for t in tasks if t["id"] == dep_id), None)
+                    if dep_task:
+                        dep_names.append(f"[{dep_id}] {dep_task['name']}")
+                lines.append(f"- [{task['id']}] {task['name']} 依赖于: {', '.join(dep_names)}")
+            else:
+                lines.append(f"- [{task['id']}] {task['name']} (无依赖)")
+        status_counts: Dict[str, int] = {}
+        for task in tasks:
+            status_counts[task["status"]] = status_counts.get(task["status"], 0) + 1
+        status_counts["total"] = len(tasks)
+        status = dict(status, task_counts=status_counts)
+        return self._render_context_prompt(status, "\n".join(lines) if lines else "没有任务依赖关系")
+
+
+def build_manager(size: int, max_deps: int, seed: int = 42) -> PlanManager:
+    """构造一个分层计划，每个任务随机依赖前 50 个任务中的若干个"""
+    rnd = random.Random(seed)
+    tasks = []
+    for i in range(size):
+        window = range(max(0, i - 50), i)
+        deps = rnd.sample(list(window), min(len(window), rnd.randint(0, max_deps)))
+        tasks.append({"name": f"task-{i}", "dependencies": [f"task-{dep}" for dep in sorted(deps)], "reasoning": f"step {i % 20} of the pipeline"})
+    pm = PlanManager()
+    pm.initializePlan("context prompt benchmark", tasks)
+    return pm
+
+
+def best_time(generate: Callable[[], str], before: Callable[[], None], rounds: int) -> float:
+    """每轮先执行 before 修改计划，再计时生成一次提示词，返回最短耗时（毫秒）"""
+    best = float("inf")
+    for _ in range(rounds):
+        before()
+        start = time.perf_counter()
+        generate()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(size: int, max_deps: int, rounds: int) -> List[float]:
+    pm = build_manager(size, max_deps)
+    legacy = LegacyPromptGenerator(pm)
+    assert legacy.generate_context_prompt() == DependencyPromptGenerator(pm).generate_context_prompt(), "两种实现的输出不一致"
+    renamed = [0]
+
+    def unchanged() -> None:
+        pass
+
+    def complete_task() -> None:
+        task = pm.startNextTask()["data"]
+        pm.completeTask(task["id"], "done")
+
+    def rename_task() -> None:
+        renamed[0] += 1
+        pm.updateTask(size // 2, {"name": f"renamed-{renamed[0]}"})
+
+    row = []
+    for before in (unchanged, complete_task, rename_task):
+        row.append(best_time(legacy.generate_context_prompt, before, rounds))
+        # 与 app 中的 generateContextPrompt 一致，每次调用都新建生成器
+        row.append(best_time(lambda: DependencyPromptGenerator(pm).generate_context_prompt(), before, rounds))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 上下文提示词基准测试")
+    parser.add_argument("--sizes", type=str, default="1000,2000,5000", help="计划规模列表（逗号分隔）")
+    parser.add_argument("--deps", type=int, default=3, help="每个任务的最大依赖数量")
+    parser.add_argument("--rounds", type=int, default=5, help="每种情形的测量轮数（取最短耗时）")
+    args = parser.parse_args()
+
+    print("🚀 上下文提示词基准测试（旧版 ms / 缓存 ms）")
+    print("=" * 80)
+    print(f"{'任务数':>8} | {'计划未变化':>20} | {'完成一个任务':>20} | {'重命名一个任务':>20}")
+    print("-" * 80)
+    for size in (int(size) for size in args.sizes.split(",")):
+        row = run(size, args.deps, args.rounds)
+        cells = [f"{row[i]:>9.2f} / {row[i + 1]:>7.3f}" for i in range(0, len(row), 2)]
+        print(f"{size:>8} | " + " | ".join(f"{cell:>20}" for cell in cells))
+    print("=" * 80)
+
+    print("\n🔍 聚焦提示词（每轮完成一个任务后生成；耗时 ms / 字符数）")
+    print("=" * 64)
+    print(f"{'任务数':>8} | {'完整提示词':>24} | {'2 跳邻域':>24}")
+    print("-" * 64)
+    for size in (int(size) for size in args.sizes.split(",")):
+        pm = build_manager(size, args.deps)
+        cells = []
+        for focus_args in ({}, {"focus": "neighborhood", "task_id": size // 2, "hops": 2}):
+            generate = lambda: DependencyPromptGenerator(pm).generate_context_prompt(**focus_args)
+            generate()
+            elapsed = best_time(generate, lambda: pm.completeTask(pm.startNextTask()["data"]["id"], "done"), args.rounds)
+            cells.append(f"{elapsed:>10.3f} / {len(generate()):>9}")
+        print(f"{size:>8} | " + " | ".join(f"{cell:>24}" for cell in cells))
+    print("=" * 64)
+    print("🎯 基准测试完成!")
+
+
+if __name__ == "__main__":
+    main()
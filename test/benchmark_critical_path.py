@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 关键路径基准测试
+测量 getCriticalPath 在不同计划规模下的耗时，以及折算到每个任务加每条依赖边的耗时，
+用来确认排程估计只做一次拓扑遍历（O(V+E)），耗时随计划规模线性增长。
+计划中一部分任务带有 estimated_duration，其余使用已完成任务的平均实际耗时。
+
+使用方法：
+python test/benchmark_critical_path.py [--sizes 10000,50000,100000] [--deps 3] [--rounds 3]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.plan_manager import PlanManager
+
+
+def build_manager(size: int, max_deps: int, seed: int = 42) -> PlanManager:
+    """构造一个分层计划，每个任务随机依赖前 50 个任务中的若干个，一半任务带有估计耗时"""
+    rnd = random.Random(seed)
+    tasks = []
+    for i in range(size):
+        window = range(max(0, i - 50), i)
+        deps = rnd.sample(list(window), min(len(window), rnd.randint(0, max_deps)))
+        task = {"name": f"task-{i}", "dependencies": [f"task-{dep}" for dep in sorted(deps)], "reasoning": f"step {i % 20} of the pipeline"}
+        if i % 2:
+            task["estimated_duration"] = rnd.uniform(1, 60)
+        tasks.append(task)
+    pm = PlanManager()
+    pm.initializePlan("critical path benchmark", tasks)
+    # 完成一批任务，让默认耗时来自观测数据，并让计划中同时存在进行中的任务
+    for _ in range(min(size // 10, 1000)):
+        pm.completeTask(pm.startNextTask()["data"]["id"], "done")
+    pm.startNextTask()
+    return pm
+
+
+def run(size: int, max_deps: int, rounds: int) -> List[float]:
+    pm = build_manager(size, max_deps)
+    edges = sum(len(task["dependencies"]) for task in pm.getTaskList(fields=["dependencies"])["data"])
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = pm.getCriticalPath()
+        best = min(best, time.perf_counter() - start)
+    assert result["success"], result["message"]
+    data = result["data"]
+    return [edges, best * 1000, best * 1e9 / (size + edges), data["makespan"], len(data["critical_path"])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 关键路径基准测试")
+    parser.add_argument("--sizes", type=str, default="10000,50000,100000", help="计划规模列表（逗号分隔）")
+    parser.add_argument("--deps", type=int, default=3, help="每个任务的最大依赖数量")
+    parser.add_argument("--rounds", type=int, default=3, help="测量轮数（取最短耗时）")
+    args = parser.parse_args()
+
+    print("🚀 关键路径基准测试")
+    print("=" * 84)
+    print(f"{'任务数':>8} | {'依赖边数':>8} | {'耗时 ms':>10} | {'ns / (V+E)':>10} | {'总耗时估计 s':>12} | {'关键路径长度':>10}")
+    print("-" * 84)
+    for size in (int(size) for size in args.sizes.split(",")):
+        edges, elapsed, per_item, makespan, path_length = run(size, args.deps, args.rounds)
+        print(f"{size:>8} | {edges:>10} | {elapsed:>10.1f} | {per_item:>10.0f} | {makespan:>16.1f} | {path_length:>14}")
+    print("=" * 84)
+    print("🎯 基准测试完成!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 优先级策略模拟基准测试
+在合成的依赖图上用离散事件模拟多个 worker 并行执行计划：空闲的 worker 通过 claimTasks 领取一个任务，
+任务按其真实耗时（模拟时间）完成后调用 completeTask，对比各优先级策略（setPriorityPolicy）得到的总耗时（makespan）。
+任务的 estimated_duration 为真实耗时乘以 ±30% 的随机误差，priority 字段为随机整数（与排程无关的人工优先级）。
+
+两类依赖图：
+  chains: 计划开头是大量互不依赖的小任务，后面是几条由耗时较长的任务组成的长链（fifo 会让长链排在小任务之后）
+  layered: 每个任务随机依赖前 50 个任务中的若干个，耗时服从对数正态分布
+下界为 max(关键路径长度, 总工作量 / worker 数)。另外给出每次 claimTasks 的平均耗时，衡量优先队列的开销。
+
+使用方法：
+python test/benchmark_priority_policies.py [--tasks 2000] [--workers 4,16] [--seed 42]
+"""
+
+import argparse
+import heapq
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.plan_manager import PRIORITY_POLICIES, PlanManager
+
+
+def chains_dag(size: int, rnd: random.Random) -> Tuple[List[Dict], List[float]]:
+    """约 80% 的任务是互不依赖的小任务（排在计划开头），其余组成 4 条长链"""
+    leaves = size * 4 // 5
+    tasks, durations = [], []
+    for i in range(leaves):
+        tasks.append({"name": f"leaf-{i}", "dependencies": [], "reasoning": "cheap leaf"})
+        durations.append(rnd.uniform(1, 3))
+    chains = 4
+    for i in range(size - leaves):
+        chain, step = i % chains, i // chains
+        dependencies = [f"chain-{chain}-{step - 1}"] if step else []
+        tasks.append({"name": f"chain-{chain}-{step}", "dependencies": dependencies, "reasoning": "long chain"})
+        durations.append(rnd.uniform(5, 15))
+    return tasks, durations
+
+
+def layered_dag(size: int, rnd: random.Random) -> Tuple[List[Dict], List[float]]:
+    """每个任务随机依赖前 50 个任务中的 0~3 个"""
+    tasks, durations = [], []
+    for i in range(size):
+        window = range(max(0, i - 50), i)
+        deps = rnd.sample(list(window), min(len(window), rnd.randint(0, 3)))
+        tasks.append({"name": f"task-{i}", "dependencies": [f"task-{dep}" for dep in sorted(deps)], "reasoning": "layered"})
+        durations.append(rnd.lognormvariate(0.8, 0.9))
+    return tasks, durations
+
+
+def annotate(tasks: List[Dict], durations: List[float], rnd: random.Random) -> None:
+    """为任务加上带误差的估计耗时和随机的人工优先级"""
+    for task, duration in zip(tasks, durations):
+        task["estimated_duration"] = round(duration * rnd.uniform(0.7, 1.3), 3)
+        task["priority"] = rnd.randint(0, 9)
+
+
+def lower_bound(tasks: List[Dict], durations: List[float], workers: int) -> float:
+    ids = {task["name"]: index for index, task in enumerate(tasks)}
+    finish = []
+    for index, task in enumerate(tasks):
+        start = max((finish[ids[dep]] for dep in task["dependencies"]), default=0.0)
+        finish.append(start + durations[index])
+    return max(max(finish), sum(durations) / workers)
+
+
+def simulate(tasks: List[Dict], durations: List[float], policy: str, workers: int) -> Tuple[float, float]:
+    """返回 (模拟的总耗时, 每次 claimTasks 的平均耗时 µs)"""
+    pm = PlanManager()
+    pm.initializePlan("priority policy benchmark", tasks)
+    pm.setPriorityPolicy(policy)
+    events: List[Tuple[float, int, int]] = []  # (完成时刻, 任务ID, worker)
+    idle = list(range(workers))
+    now, claim_time, claims = 0.0, 0.0, 0
+    while True:
+        while idle:
+            start = time.perf_counter()
+            result = pm.claimTasks(f"worker-{idle[-1]}", 1, lease_seconds=1e9)
+            claim_time += time.perf_counter() - start
+            if not result["success"]:
+                break
+            claims += 1
+            task_id = result["data"][0]["id"]
+            heapq.heappush(events, (now + durations[task_id], task_id, idle.pop()))
+        if not events:
+            break
+        now, task_id, worker = heapq.heappop(events)
+        pm.completeTask(task_id, "done")
+        idle.append(worker)
+    assert claims == len(tasks), "模拟结束时仍有任务未执行"
+    return now, claim_time / claims * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 优先级策略模拟基准测试")
+    parser.add_argument("--tasks", type=int, default=2000, help="每个依赖图的任务数量")
+    parser.add_argument("--workers", type=str, default="4,16", help="worker 数量列表（逗号分隔）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    width = 18 + 20 * len(PRIORITY_POLICIES) + 11
+    print("🚀 优先级策略模拟基准测试（模拟总耗时，括号内为相对下界的比例）")
+    print("=" * width)
+    print(f"{'依赖图':>8} {'worker':>6} | " + "".join(f"{policy:>20}" for policy in PRIORITY_POLICIES) + f" | {'下界':>8}")
+    print("-" * width)
+    overhead: Dict[str, List[float]] = {policy: [] for policy in PRIORITY_POLICIES}
+    for name, generate in (("chains", chains_dag), ("layered", layered_dag)):
+        rnd = random.Random(args.seed)
+        tasks, durations = generate(args.tasks, rnd)
+        annotate(tasks, durations, rnd)
+        for workers in (int(workers) for workers in args.workers.split(",")):
+            bound = lower_bound(tasks, durations, workers)
+            cells = []
+            for policy in PRIORITY_POLICIES:
+                makespan, claim_us = simulate(tasks, durations, policy, workers)
+                overhead[policy].append(claim_us)
+                cells.append(f"{makespan:>8.0f} ({makespan / bound:.2f})")
+            print(f"{name:>8} {workers:>6} | " + "".join(f"{cell:>20}" for cell in cells) + f" | {bound:>8.0f}")
+    print("=" * width)
+
+    print("\n⏱️ 每次 claimTasks 的平均耗时（µs，所有模拟的平均值）")
+    print("  " + "  ".join(f"{policy}: {sum(values) / len(values):.1f}" for policy, values in overhead.items()))
+    print("🎯 基准测试完成!")
+
+
+if __name__ == "__main__":
+    main()
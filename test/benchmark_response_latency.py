@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 工具响应延迟基准测试
+通过进程内的 MCP 客户端（FastMCPTransport，不经过网络）调用 getTaskList / dumpPlan，
+对比 FastMCP 默认序列化器与 dumps_response（紧凑 JSON + 任务 JSON 缓存）在不同计划规模下的单次调用延迟
+
+使用方法：
+python test/benchmark_response_latency.py [--sizes 1000,5000,10000,20000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from fastmcp import Client
+from fastmcp.tools.tool import default_serializer
+
+from mcplanmanager.app import mcp, plans
+from mcplanmanager.serialization import dumps_response
+
+
+def build_tasks(size: int) -> List[Dict]:
+    """生成一个链式计划，每个任务依赖前一个任务"""
+    return [
+        {"name": f"task-{i}", "dependencies": [f"task-{i - 1}"] if i else [], "reasoning": f"step {i % 20} of the pipeline"}
+        for i in range(size)
+    ]
+
+
+async def use_serializer(serializer: Callable) -> None:
+    """切换所有已注册工具的序列化器"""
+    for tool in (await mcp.get_tools()).values():
+        tool.serializer = serializer
+
+
+async def best_call(client: Client, tool: str, arguments: Dict, repeat: int) -> float:
+    """重复调用 repeat 次，返回最短耗时（毫秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.call_tool(tool, arguments)
+        best = min(best, time.perf_counter() - start)
+    assert json.loads(response[0].text)["success"], f"{tool} 调用失败"
+    return best * 1000
+
+
+async def run(sizes: List[int], repeat: int) -> None:
+    print("🚀 工具响应延迟基准测试")
+    print("=" * 78)
+    print(f"{'任务数':>8} | {'getTaskList 默认':>16} | {'getTaskList 快速':>16} | {'dumpPlan 默认':>14} | {'dumpPlan 快速':>14}")
+    print("-" * 78)
+    async with Client(mcp) as client:
+        for size in sizes:
+            plan_id = f"benchmark-latency-{size}"
+            await client.call_tool("initializePlan", {"goal": "响应延迟基准测试", "tasks": build_tasks(size), "plan_id": plan_id})
+            # 直接在进程内完成一半任务，让一半任务带上 result
+            with plans.open(plan_id) as plan_manager:
+                for i in range(size // 2):
+                    plan_manager.startNextTask()
+                    plan_manager.completeTask(i, f"output of task {i}")
+            row = []
+            for tool in ("getTaskList", "dumpPlan"):
+                for serializer in (default_serializer, dumps_response):
+                    await use_serializer(serializer)
+                    row.append(await best_call(client, tool, {"plan_id": plan_id}, repeat))
+            print(f"{size:>8} | {row[0]:>13.2f} ms | {row[1]:>13.2f} ms | {row[2]:>11.2f} ms | {row[3]:>11.2f} ms")
+    print("=" * 78)
+    print("🎯 基准测试完成!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 工具响应延迟基准测试")
+    parser.add_argument("--sizes", type=str, default="1000,5000,10000,20000", help="计划规模列表（逗号分隔）")
+    parser.add_argument("--repeat", type=int, default=5, help="每项测量的重复次数（取最短耗时）")
+    args = parser.parse_args()
+    asyncio.run(run([int(size) for size in args.sizes.split(",")], args.repeat))
+
+
+if __name__ == "__main__":
+    main()
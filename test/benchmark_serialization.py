@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 序列化格式基准测试
+在大计划上对比 JSON 与列式二进制格式（dumpPlan(format="binary")）的编码耗时、解码耗时和数据大小
+
+使用方法：
+python test/benchmark_serialization.py [--tasks 10000] [--deps 3] [--result-bytes 200] [--repeat 5]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.binary_format import decode_plan, decode_plan_text, encode_plan, encode_plan_text
+from mcplanmanager.plan_manager import PlanManager
+
+
+def build_plan(size: int, max_deps: int, result_bytes: int, seed: int = 42) -> Dict:
+    """构造一个分层计划并完成前一半任务，让它们带上 result"""
+    rnd = random.Random(seed)
+    tasks = []
+    for i in range(size):
+        window = range(max(0, i - 50), i)
+        deps = rnd.sample(list(window), min(len(window), rnd.randint(0, max_deps)))
+        tasks.append({"name": f"task-{i}", "dependencies": sorted(deps), "reasoning": f"step {i % 20} of the pipeline"})
+    pm = PlanManager()
+    pm.initializePlan("serialization benchmark", tasks)
+    for i in range(size // 2):
+        started = pm.startNextTask()
+        pm.completeTask(started["data"]["id"], f"output of task {i} " + "x" * result_bytes)
+    return pm.dumpPlan()["data"]
+
+
+def best_of(repeat: int, func: Callable) -> float:
+    """重复执行 repeat 次，返回最短耗时（毫秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 序列化格式基准测试")
+    parser.add_argument("--tasks", type=int, default=10000, help="计划中的任务数")
+    parser.add_argument("--deps", type=int, default=3, help="每个任务的最大依赖数量")
+    parser.add_argument("--result-bytes", type=int, default=200, help="每个已完成任务 result 的大小（字节）")
+    parser.add_argument("--repeat", type=int, default=5, help="每项测量的重复次数（取最短耗时）")
+    args = parser.parse_args()
+
+    plan = build_plan(args.tasks, args.deps, args.result_bytes)
+    json_text = json.dumps(plan, ensure_ascii=False)
+    binary = encode_plan(plan)
+    binary_text = encode_plan_text(plan)
+    assert decode_plan(binary) == plan and decode_plan_text(binary_text) == plan, "二进制格式往返后与原计划不一致"
+
+    rows = [
+        ("JSON", len(json_text.encode("utf-8")),
+         best_of(args.repeat, lambda: json.dumps(plan, ensure_ascii=False)),
+         best_of(args.repeat, lambda: json.loads(json_text))),
+        ("二进制", len(binary),
+         best_of(args.repeat, lambda: encode_plan(plan)),
+         best_of(args.repeat, lambda: decode_plan(binary))),
+        ("二进制(base64)", len(binary_text),
+         best_of(args.repeat, lambda: encode_plan_text(plan)),
+         best_of(args.repeat, lambda: decode_plan_text(binary_text))),
+    ]
+
+    print("🚀 序列化格式基准测试")
+    print(f"📋 任务数: {args.tasks}, 最大依赖数: {args.deps}, result: {args.result_bytes}B")
+    print("=" * 72)
+    print(f"{'格式':>14} | {'大小 KB':>10} | {'相对 JSON':>10} | {'编码 ms':>10} | {'解码 ms':>10}")
+    print("-" * 72)
+    json_size = rows[0][1]
+    for label, size, encode_ms, decode_ms in rows:
+        print(f"{label:>14} | {size / 1024:>10.1f} | {size / json_size:>10.1%} | {encode_ms:>10.2f} | {decode_ms:>10.2f}")
+    print("=" * 72)
+    print("🎯 基准测试完成!")
+
+
+if __name__ == "__main__":
+    main()
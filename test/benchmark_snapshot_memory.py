@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 快照内存基准测试
+在频繁 checkpoint（每一步都调用 dumpPlan）的场景下，
+对比深拷贝导出与写时复制快照导出的耗时和内存占用
+
+使用方法：
+python test/benchmark_snapshot_memory.py [--tasks 2000] [--result-kb 4] [--checkpoints 200] [--keep 20]
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from collections import deque
+from copy import deepcopy
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.plan_manager import PlanManager
+
+
+class DeepCopyPlanManager(PlanManager):
+    """每次导出都深拷贝整个计划的 PlanManager，作为对照组"""
+
+    def dumpPlan(self, format: str = "json") -> Dict:
+        return {
+            "success": True,
+            "data": deepcopy(self._snapshot()),
+            "message": "Plan dumped successfully."
+        }
+
+
+def build_plan(pm: PlanManager, tasks: int, result_kb: int) -> None:
+    """构造一个链式计划，并完成前一半任务，让它们带上较大的 result"""
+    pm.initializePlan("snapshot benchmark", [
+        {"name": f"task-{i}", "dependencies": [i - 1] if i else [], "reasoning": f"step {i}"}
+        for i in range(tasks)
+    ])
+    for i in range(tasks // 2):
+        started = pm.startNextTask()
+        pm.completeTask(started["data"]["id"], f"output of task {i} " + "x" * (result_kb * 1024))
+
+
+def run_checkpoints(pm: PlanManager, checkpoints: int, keep: int, result_kb: int) -> Dict:
+    """每完成一个任务就导出一次快照，并保留最近 keep 个快照"""
+    history = deque(maxlen=keep)
+    tracemalloc.start()
+    baseline_memory, _ = tracemalloc.get_traced_memory()
+    dump_seconds = 0.0
+    start = time.perf_counter()
+    for i in range(checkpoints):
+        started = pm.startNextTask()
+        if not started["success"]:
+            break
+        pm.completeTask(started["data"]["id"], f"checkpoint {i} " + "y" * (result_kb * 1024))
+        dump_start = time.perf_counter()
+        history.append(pm.dumpPlan()["data"])
+        dump_seconds += time.perf_counter() - dump_start
+    total_seconds = time.perf_counter() - start
+    current_memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "total_ms": total_seconds * 1000,
+        "dump_ms": dump_seconds * 1000 / max(checkpoints, 1),
+        "retained_mb": (current_memory - baseline_memory) / 1024 / 1024,
+        "peak_mb": (peak_memory - baseline_memory) / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 快照内存基准测试")
+    parser.add_argument("--tasks", type=int, default=2000, help="计划中的任务数")
+    parser.add_argument("--result-kb", type=int, default=4, help="每个已完成任务 result 的大小（KB）")
+    parser.add_argument("--checkpoints", type=int, default=200, help="checkpoint 次数（每次完成一个任务后导出）")
+    parser.add_argument("--keep", type=int, default=20, help="保留的最近快照数量")
+    args = parser.parse_args()
+
+    print("🚀 快照内存基准测试")
+    print(f"📋 任务数: {args.tasks}, result: {args.result_kb}KB, checkpoint: {args.checkpoints}, 保留快照: {args.keep}")
+    print("=" * 78)
+    print(f"{'导出方式':>10} | {'总耗时 ms':>10} | {'单次导出 ms':>12} | {'保留内存 MB':>12} | {'峰值内存 MB':>12}")
+    print("-" * 78)
+
+    for label, manager_cls in (("深拷贝", DeepCopyPlanManager), ("写时复制", PlanManager)):
+        pm = manager_cls()
+        build_plan(pm, args.tasks, args.result_kb)
+        stats = run_checkpoints(pm, args.checkpoints, args.keep, args.result_kb)
+        print(f"{label:>10} | {stats['total_ms']:>10.1f} | {stats['dump_ms']:>12.3f} | "
+              f"{stats['retained_mb']:>12.2f} | {stats['peak_mb']:>12.2f}")
+
+    print("=" * 78)
+    print("🎯 基准测试完成!")
+
+
+if __name__ == "__main__":
+    main()
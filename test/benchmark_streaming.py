@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 流式导出/导入基准测试
+对比 dumpPlan + json.dump / json.load + loadPlan 与 NDJSON 流式导出/导入（dumpPlanStream / loadPlanStream）
+在不同计划规模下的耗时和额外峰值内存。
+导出的额外峰值为导出过程中超出导出前的内存；导入的额外峰值为超出导入完成后计划本身所占内存的部分。
+
+使用方法：
+python test/benchmark_streaming.py [--sizes 10000,50000,100000] [--result-bytes 200]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.plan_manager import PlanManager
+
+
+def build_manager(size: int, result_bytes: int) -> PlanManager:
+    """构造一个链式计划并完成前一半任务，让它们带上 result"""
+    pm = PlanManager()
+    pm.initializePlan("streaming benchmark", [
+        {"name": f"task-{i}", "dependencies": [i - 1] if i else [], "reasoning": f"step {i % 20} of the pipeline"}
+        for i in range(size)
+    ])
+    for i in range(size // 2):
+        pm.startNextTask()
+        pm.completeTask(i, f"output of task {i} " + "x" * result_bytes)
+    return pm
+
+
+def measure(func: Callable) -> Tuple[float, float]:
+    """返回 (耗时毫秒, 额外峰值内存 MB)。tracemalloc 会显著拖慢执行，耗时单独测量"""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    # 峰值减去调用结束后仍保留的内存（导入时为新计划本身）
+    return elapsed * 1000, (peak - current) / 1024 / 1024
+
+
+def run(size: int, result_bytes: int, directory: str) -> List[float]:
+    pm = build_manager(size, result_bytes)
+    json_path = Path(directory) / f"plan-{size}.json"
+    ndjson_path = Path(directory) / f"plan-{size}.ndjson"
+
+    def dump_json():
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(pm.dumpPlan()["data"], f, ensure_ascii=False)
+
+    def dump_stream():
+        with open(ndjson_path, "w", encoding="utf-8") as f:
+            pm.dumpPlanStream(f)
+
+    def load_json():
+        target = PlanManager()
+        with open(json_path, "r", encoding="utf-8") as f:
+            assert target.loadPlan(json.load(f))["success"]
+        return target
+
+    def load_stream():
+        target = PlanManager()
+        with open(ndjson_path, "r", encoding="utf-8") as f:
+            assert target.loadPlanStream(f)["success"]
+        return target
+
+    row = []
+    for func in (dump_json, dump_stream, load_json, load_stream):
+        row.extend(measure(func))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 流式导出/导入基准测试")
+    parser.add_argument("--sizes", type=str, default="10000,50000,100000", help="计划规模列表（逗号分隔）")
+    parser.add_argument("--result-bytes", type=int, default=200, help="每个已完成任务 result 的大小（字节）")
+    args = parser.parse_args()
+
+    print("🚀 流式导出/导入基准测试（耗时 ms / 额外峰值内存 MB）")
+    print("=" * 100)
+    print(f"{'任务数':>8} | {'JSON 导出':>18} | {'NDJSON 导出':>18} | {'JSON 导入':>18} | {'NDJSON 导入':>18}")
+    print("-" * 100)
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (int(size) for size in args.sizes.split(",")):
+            row = run(size, args.result_bytes, directory)
+            cells = [f"{row[i]:>8.0f} / {row[i + 1]:>6.1f}" for i in range(0, len(row), 2)]
+            print(f"{size:>8} | " + " | ".join(f"{cell:>18}" for cell in cells))
+    print("=" * 100)
+    print("🎯 基准测试完成!")
+
+
+if __name__ == "__main__":
+    main()
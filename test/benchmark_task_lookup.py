@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 任务查找性能基准测试
+对比线性扫描查找与 ID 索引查找在不同计划规模下的耗时曲线
+
+使用方法：
+python test/benchmark_task_lookup.py [--sizes 500 1000 2000 5000] [--deps 3]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.plan_manager import PlanManager
+
+
+class LinearScanPlanManager(PlanManager):
+    """使用旧版线性扫描查找任务的 PlanManager，作为对照组"""
+
+    def _find_task_by_id(self, task_id: int) -> Optional[Dict]:
+        for task in self.plan_data["tasks"]:
+            if task.id == task_id:
+                return task
+        return None
+
+
+def build_layered_plan(size: int, max_deps: int, seed: int = 42) -> Dict:
+    """生成一个分层的计划数据，每个任务依赖若干个前面的任务"""
+    rnd = random.Random(seed)
+    tasks = []
+    for i in range(size):
+        window = range(max(0, i - 50), i)
+        deps = rnd.sample(list(window), min(len(window), rnd.randint(0, max_deps)))
+        tasks.append({
+            "id": i,
+            "name": f"task-{i}",
+            "status": "pending",
+            "dependencies": sorted(deps),
+            "reasoning": f"benchmark task {i}",
+            "result": None
+        })
+    plan = PlanManager()._create_empty_plan()
+    plan["meta"]["goal"] = "benchmark"
+    plan["tasks"] = tasks
+    return plan
+
+
+def time_execution_steps(pm: PlanManager, steps: int) -> float:
+    """测量 startNextTask + completeTask 一个完整步骤的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    executed = 0
+    for _ in range(steps):
+        started = pm.startNextTask()
+        if not started["success"]:
+            break
+        pm.completeTask(started["data"]["id"], "done")
+        executed += 1
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / max(executed, 1)
+
+
+def time_lookups(pm: PlanManager, size: int, lookups: int) -> float:
+    """测量 getTaskById 的平均耗时（微秒）"""
+    rnd = random.Random(7)
+    ids = [rnd.randrange(size) for _ in range(lookups)]
+    start = time.perf_counter()
+    for task_id in ids:
+        pm.getTaskById(task_id)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1_000_000 / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 任务查找性能基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000, 5000],
+                        help="参与测试的计划规模（任务数）")
+    parser.add_argument("--deps", type=int, default=3, help="每个任务的最大依赖数量")
+    parser.add_argument("--steps", type=int, default=20, help="每个规模执行的 start/complete 步数")
+    parser.add_argument("--lookups", type=int, default=2000, help="每个规模执行的 getTaskById 次数")
+    args = parser.parse_args()
+
+    print("🚀 任务查找性能基准测试")
+    print(f"📋 规模: {args.sizes}, 最大依赖数: {args.deps}")
+    print("=" * 78)
+    print(f"{'任务数':>8} | {'步骤(线性) ms':>14} | {'步骤(索引) ms':>14} | {'查找(线性) µs':>14} | {'查找(索引) µs':>14}")
+    print("-" * 78)
+
+    for size in args.sizes:
+        plan = build_layered_plan(size, args.deps)
+        row = []
+        for manager_cls in (LinearScanPlanManager, PlanManager):
+            pm = manager_cls()
+            pm.loadPlan(plan)
+            row.append((time_execution_steps(pm, args.steps), time_lookups(pm, size, args.lookups)))
+        (step_before, lookup_before), (step_after, lookup_after) = row
+        print(f"{size:>8} | {step_before:>14.3f} | {step_after:>14.3f} | {lookup_before:>14.2f} | {lookup_after:>14.2f}")
+
+    print("=" * 78)
+    print("🎯 基准测试完成!")
+
+
+if __name__ == "__main__":
+    main()
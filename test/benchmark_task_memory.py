@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 任务内存基准测试
+对比旧版的任务布局（每个任务一个字典、依赖为列表）与 TaskRecord（__slots__ 记录、依赖为元组、字符串驻留）的内存占用，
+并测量装载同一计划后整个 PlanManager（含索引）占用的内存
+
+使用方法：
+python test/benchmark_task_memory.py [--tasks 100000] [--deps 3]
+"""
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.plan_manager import PlanManager
+from mcplanmanager.task_record import TaskRecord
+
+
+def build_plan_text(size: int, max_deps: int, seed: int = 42) -> str:
+    """生成一个分层计划并序列化为 JSON 文本，每次装载都从文本解析，模拟从客户端收到的计划"""
+    rnd = random.Random(seed)
+    tasks = []
+    for i in range(size):
+        window = range(max(0, i - 50), i)
+        deps = rnd.sample(list(window), min(len(window), rnd.randint(0, max_deps)))
+        tasks.append({
+            "id": i,
+            "name": f"task-{i}",
+            "status": rnd.choice(["pending", "pending", "completed", "skipped"]),
+            "dependencies": sorted(deps),
+            "reasoning": f"step {i % 20} of the pipeline",
+            "result": None
+        })
+    return json.dumps({
+        "meta": {"goal": "memory benchmark", "created_at": "", "updated_at": ""},
+        "state": {"current_task_id": None, "status": "idle"},
+        "tasks": tasks
+    })
+
+
+def measure(build: Callable[[], object]) -> Tuple[float, float]:
+    """返回 (构建后保留的内存字节数, 构建耗时毫秒)"""
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current - baseline, elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 任务内存基准测试")
+    parser.add_argument("--tasks", type=int, default=100000, help="计划中的任务数")
+    parser.add_argument("--deps", type=int, default=3, help="每个任务的最大依赖数量")
+    args = parser.parse_args()
+
+    plan_text = build_plan_text(args.tasks, args.deps)
+
+    def dict_layout() -> Dict:
+        return json.loads(plan_text)["tasks"]
+
+    def record_layout() -> list:
+        return [TaskRecord.from_dict(task) for task in json.loads(plan_text)["tasks"]]
+
+    def manager() -> PlanManager:
+        return PlanManager(json.loads(plan_text))
+
+    rows = [
+        ("字典列表", *measure(dict_layout)),
+        ("TaskRecord", *measure(record_layout)),
+        ("PlanManager", *measure(manager)),
+    ]
+
+    print("🚀 任务内存基准测试")
+    print(f"📋 任务数: {args.tasks}, 最大依赖数: {args.deps}")
+    print("=" * 64)
+    print(f"{'布局':>12} | {'内存 MB':>10} | {'字节/任务':>10} | {'相对字典':>10} | {'构建 ms':>10}")
+    print("-" * 64)
+    dict_bytes = rows[0][1]
+    for label, size, elapsed_ms in rows:
+        print(f"{label:>12} | {size / 1024 / 1024:>10.2f} | {size / args.tasks:>10.0f} | {size / dict_bytes:>10.1%} | {elapsed_ms:>10.1f}")
+    print("=" * 64)
+    print("🎯 基准测试完成!")
+
+
+if __name__ == "__main__":
+    main()
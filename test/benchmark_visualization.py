@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 依赖关系可视化基准测试
+模拟仪表盘定期轮询 visualizeDependencies 的场景，对比旧版实现（每次从 getDependencyGraph 重建整张图并渲染所有行）
+与按任务缓存渲染结果的 DependencyVisualizer 的单次生成耗时。
+
+测量三种情形：计划未变化、上一轮完成了一个任务（状态变化）、上一轮修改了一个任务的依赖。
+另外在由 k 个菱形串联的计划上对比旧版递归树状视图（共享子树在每个父节点下重复展开，输出随 k 指数增长）
+与只展开一次、其余位置输出回引的树状视图的耗时和输出行数。
+
+使用方法：
+python test/benchmark_visualization.py [--sizes 1000,5000] [--deps 3] [--rounds 5] [--diamonds 8,12,16]
+"""
+
+import argparse
+import gc
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.dependency_tools import DependencyVisualizer
+from mcplanmanager.plan_manager import PlanManager
+
+
+class LegacyVisualizer:
+    """旧版实现：每次调用都从 getDependencyGraph 重建节点、边和邻接表并渲染全部行"""
+
+    STATUS_COLORS = {
+        "pending": "fill:#e1f5fe", "in_progress": "fill:#fff3e0", "completed": "fill:#e8f5e8",
+        "failed": "fill:#ffebee", "skipped": "fill:#f3e5f5"
+    }
+    STATUS_SYMBOLS = {"pending": "⏳", "in_progress": "🔄", "completed": "✅", "failed": "❌", "skipped": "⏭️"}
+
+    def __init__(self, plan_manager: PlanManager):
+        self.pm = plan_manager
+
+    def generate_mermaid_graph(self) -> str:
+        graph = self.pm.getDependencyGraph()["data"]
+        code = ["flowchart TD"]
+        for node in graph["nodes"]:
+            node_id = f"T{node['id']}"
+            name = node["name"].replace('"', "'")
+            shape = f'{node_id}(("{name}"))' if node["status"] == "in_progress" else f'{node_id}["{name}"]'
+            code.append(f"    {shape}")
+            if node["status"] in self.STATUS_COLORS:
+                code.append(f"    style {node_id} {self.STATUS_COLORS[node['status']]}")
+        for edge in graph["edges"]:
+            code.append(f"    T{edge['from']} --> T{edge['to']}")
+        return "\n".join(code)
+
+    def generate_ascii_graph(self) -> str:
+        graph = self.pm.getDependencyGraph()["data"]
+        nodes = {node["id"]: node for node in graph["nodes"]}
+        dependencies = {}
+        for edge in graph["edges"]:
+            dependencies.setdefault(edge["to"], []).append(edge["from"])
+        lines = ["📋 任务依赖关系图", "=" * 50]
+        for task_id in sorted(nodes):
+            node = nodes[task_id]
+            line = f"{self.STATUS_SYMBOLS.get(node['status'], '❓')} [{task_id}] {node['name']}"
+            if task_id in dependencies:
+                line += f" (依赖: {', '.join(f'[{dep_id}]' for dep_id in sorted(dependencies[task_id]))})"
+            lines.append(line)
+        lines.extend(["", "📝 状态图例:", "⏳ 待处理  🔄 进行中  ✅ 已完成  ❌ 失败  ⏭️ 跳过"])
+        return "\n".join(lines)
+
+    def generate_tree_view(self) -> str:
+        nodes = {task["id"]: task for task in self.pm.getTaskList()["data"]}
+
+        def build_tree(node_id: int, prefix: str = "", is_last: bool = True) -> List[str]:
+            node = nodes[node_id]
+            symbol = "✅" if node["status"] == "completed" else "⏳" if node["status"] == "pending" else "🔄"
+            lines = [f"{prefix}{'└── ' if is_last else '├── '}{symbol} [{node_id}] {node['name']}"]
+            children = [task["id"] for task in self.pm.getDependents(node_id)["data"]]
+            for i, child_id in enumerate(children):
+                lines.extend(build_tree(child_id, prefix + ("    " if is_last else "│   "), i == len(children) - 1))
+            return lines
+
+        tree_lines = ["🌳 任务依赖树状图", "=" * 30]
+        for root_id in sorted(task_id for task_id, task in nodes.items() if not task["dependencies"]):
+            tree_lines.extend(build_tree(root_id))
+            tree_lines.append("")
+        return "\n".join(tree_lines)
+
+
+def build_manager(size: int, max_deps: int, seed: int = 42) -> PlanManager:
+    """构造一个分层计划，每个任务随机依赖前 50 个任务中的若干个"""
+    rnd = random.Random(seed)
+    tasks = []
+    for i in range(size):
+        window = range(max(0, i - 50), i)
+        deps = rnd.sample(list(window), min(len(window), rnd.randint(0, max_deps)))
+        tasks.append({"name": f"task-{i}", "dependencies": [f"task-{dep}" for dep in sorted(deps)], "reasoning": f"step {i % 20} of the pipeline"})
+    pm = PlanManager()
+    pm.initializePlan("visualization benchmark", tasks)
+    return pm
+
+
+def build_diamonds(count: int) -> PlanManager:
+    """构造 count 个菱形首尾相连的计划：每个汇合点同时依赖左右两个分支"""
+    tasks = [{"name": "join-0", "dependencies": [], "reasoning": "diamond"}]
+    for i in range(count):
+        join = f"join-{i}"
+        tasks.append({"name": f"left-{i}", "dependencies": [join], "reasoning": "diamond"})
+        tasks.append({"name": f"right-{i}", "dependencies": [join], "reasoning": "diamond"})
+        tasks.append({"name": f"join-{i + 1}", "dependencies": [f"left-{i}", f"right-{i}"], "reasoning": "diamond"})
+    pm = PlanManager()
+    pm.initializePlan("diamond benchmark", tasks)
+    return pm
+
+
+def best_time(generate: Callable[[], str], before: Callable[[], None], rounds: int) -> float:
+    """每轮先执行 before 修改计划，再计时生成一次可视化，返回最短耗时（毫秒）"""
+    best = float("inf")
+    for _ in range(rounds):
+        before()
+        start = time.perf_counter()
+        generate()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(size: int, max_deps: int, rounds: int, method: str) -> List[float]:
+    pm = build_manager(size, max_deps)
+    legacy = getattr(LegacyVisualizer(pm), method)
+    # 与 app 中的 visualizeDependencies 一致，每次调用都新建可视化器
+    cached = lambda: getattr(DependencyVisualizer(pm), method)()
+    assert legacy() == cached(), "两种实现的输出不一致"
+    rewired = [0]
+
+    def unchanged() -> None:
+        pass
+
+    def complete_task() -> None:
+        task = pm.startNextTask()["data"]
+        pm.completeTask(task["id"], "done")
+
+    def rewire_task() -> None:
+        # 在两个依赖集合之间来回切换最后一个任务的依赖
+        rewired[0] += 1
+        pm.updateTask(size - 1, {"dependencies": [size - 2 - rewired[0] % 2]})
+
+    row = []
+    for before in (unchanged, complete_task, rewire_task):
+        row.append(best_time(legacy, before, rounds))
+        row.append(best_time(cached, before, rounds))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 依赖关系可视化基准测试")
+    parser.add_argument("--sizes", type=str, default="1000,5000", help="计划规模列表（逗号分隔）")
+    parser.add_argument("--deps", type=int, default=3, help="每个任务的最大依赖数量")
+    parser.add_argument("--rounds", type=int, default=5, help="每种情形的测量轮数（取最短耗时）")
+    parser.add_argument("--diamonds", type=str, default="8,12,16", help="树状视图测试中串联的菱形个数列表（逗号分隔）")
+    args = parser.parse_args()
+
+    print("🚀 依赖关系可视化基准测试（旧版 ms / 缓存 ms）")
+    print("=" * 92)
+    print(f"{'格式':>8} | {'任务数':>8} | {'计划未变化':>20} | {'完成一个任务':>20} | {'修改一个依赖':>20}")
+    print("-" * 92)
+    for method, label in (("generate_ascii_graph", "ascii"), ("generate_mermaid_graph", "mermaid")):
+        for size in (int(size) for size in args.sizes.split(",")):
+            row = run(size, args.deps, args.rounds, method)
+            cells = [f"{row[i]:>9.2f} / {row[i + 1]:>7.3f}" for i in range(0, len(row), 2)]
+            print(f"{label:>8} | {size:>8} | " + " | ".join(f"{cell:>20}" for cell in cells))
+    print("=" * 92)
+
+    print("\n🌳 菱形链上的树状视图（耗时 ms / 输出行数）")
+    print("=" * 64)
+    print(f"{'菱形数':>8} | {'任务数':>8} | {'旧版递归':>18} | {'共享子树回引':>18}")
+    print("-" * 64)
+    for count in (int(count) for count in args.diamonds.split(",")):
+        pm = build_diamonds(count)
+        cells = []
+        # 计划是新建的，树状视图的渲染缓存为空，测量的是完整生成一次的耗时
+        for generate in (LegacyVisualizer(pm).generate_tree_view, DependencyVisualizer(pm).generate_tree_view):
+            # 先释放上一次的输出并回收，避免旧版产生的大量对象在下一次测量中被释放
+            text = None
+            gc.collect()
+            start = time.perf_counter()
+            text = generate()
+            cells.append(f"{(time.perf_counter() - start) * 1000:>9.2f} / {len(text.splitlines()):>6}")
+        print(f"{count:>8} | {3 * count + 1:>8} | " + " | ".join(f"{cell:>18}" for cell in cells))
+    print("=" * 64)
+    print("🎯 基准测试完成!")
+
+
+if __name__ == "__main__":
+    main()
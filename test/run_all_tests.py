@@ -116,6 +116,7 @@ class TestRunner:
             ("test_complete_suite.py", "完整功能测试"),
             ("test_edge_cases.py", "边界情况测试"),
             ("test_persistence.py", "持久化功能测试"),
+            ("test_internals.py", "进程内测试"),
         ]
         
         # 运行每个测试套件
@@ -147,6 +147,22 @@ class MCPTestSuite:
         print(f"🚀 可执行任务数量: {len(executable_tasks)}")
         return data
     
+    async def test_get_dependents(self):
+        """测试获取依赖某个任务的任务列表"""
+        response = await self.client.call_tool("getDependents", {"task_id": 0})
+        data = self.extract_data(response)
+        
+        assert data.get("success", False), f"获取依赖任务失败: {data}"
+        dependent_ids = sorted(task["id"] for task in data.get("data", []))
+        assert dependent_ids == [1, 2], f"任务0的依赖任务不正确: {dependent_ids}"
+        print(f"🔗 依赖任务0的任务: {dependent_ids}")
+        
+        # 不存在的任务应该失败
+        response = await self.client.call_tool("getDependents", {"task_id": 999})
+        data = self.extract_data(response)
+        assert not data.get("success", True), "不存在的任务应该返回失败"
+        return data
+    
     async def test_start_next_task(self):
         """测试启动下一个任务"""
         response = await self.client.call_tool("startNextTask")
@@ -326,6 +342,302 @@ class MCPTestSuite:
         print(f"💬 上下文提示生成成功 (长度: {len(prompt)})")
         return prompt
     
+    async def test_multi_plan_isolation(self):
+        """测试通过 plan_id 操作的多个计划互不干扰"""
+        default_status = self.extract_data(await self.client.call_tool("getPlanStatus"))["data"]
+        
+        for plan_id, goal in (("suite-plan-a", "计划A"), ("suite-plan-b", "计划B")):
+            response = await self.client.call_tool("initializePlan", {
+                "goal": goal,
+                "tasks": [
+                    {"name": f"{goal}-步骤1", "dependencies": [], "reasoning": "隔离测试"},
+                    {"name": f"{goal}-步骤2", "dependencies": [f"{goal}-步骤1"], "reasoning": "隔离测试"}
+                ],
+                "plan_id": plan_id
+            })
+            data = self.extract_data(response)
+            assert data.get("success", False), f"初始化 {plan_id} 失败: {data}"
+        
+        started = self.extract_data(await self.client.call_tool("startNextTask", {"plan_id": "suite-plan-a"}))
+        assert started.get("success", False), f"计划A启动任务失败: {started}"
+        
+        status_a = self.extract_data(await self.client.call_tool("getPlanStatus", {"plan_id": "suite-plan-a"}))["data"]
+        status_b = self.extract_data(await self.client.call_tool("getPlanStatus", {"plan_id": "suite-plan-b"}))["data"]
+        assert status_a["meta"]["goal"] == "计划A" and status_a["task_counts"]["in_progress"] == 1, f"计划A状态不正确: {status_a}"
+        assert status_b["meta"]["goal"] == "计划B" and status_b["task_counts"]["in_progress"] == 0, f"计划B受到了计划A的影响: {status_b}"
+        
+        status_default = self.extract_data(await self.client.call_tool("getPlanStatus"))["data"]
+        assert status_default["meta"]["goal"] == default_status["meta"]["goal"], "默认计划被其他计划覆盖"
+        assert status_default["task_counts"] == default_status["task_counts"], "默认计划的任务被其他计划修改"
+        
+        print(f"🗂️ 计划A: {status_a['task_counts']}, 计划B: {status_b['task_counts']}, 默认计划未受影响")
+        return {"plan_a": status_a, "plan_b": status_b}
+    
+    async def test_claim_tasks(self):
+        """测试多 worker 批量领取任务以及租约过期后任务退回"""
+        plan_id = "suite-claim"
+        response = await self.client.call_tool("initializePlan", {
+            "goal": "并行领取测试",
+            "tasks": [{"name": f"并行任务{i}", "dependencies": [], "reasoning": "可并行"} for i in range(4)]
+                     + [{"name": "汇总", "dependencies": [f"并行任务{i}" for i in range(4)], "reasoning": "等待全部完成"}],
+            "plan_id": plan_id
+        })
+        assert self.extract_data(response).get("success", False), "初始化并行计划失败"
+        
+        first = self.extract_data(await self.client.call_tool("claimTasks", {"worker_id": "w1", "max_n": 2, "lease_seconds": 60, "plan_id": plan_id}))
+        second = self.extract_data(await self.client.call_tool("claimTasks", {"worker_id": "w2", "max_n": 10, "lease_seconds": 0.5, "plan_id": plan_id}))
+        first_ids = [task["id"] for task in first["data"]]
+        second_ids = [task["id"] for task in second["data"]]
+        assert len(first_ids) == 2 and len(second_ids) == 2, f"领取数量不正确: {first_ids}, {second_ids}"
+        assert not set(first_ids) & set(second_ids), f"同一任务被两个 worker 领取: {first_ids}, {second_ids}"
+        
+        empty = self.extract_data(await self.client.call_tool("claimTasks", {"worker_id": "w3", "plan_id": plan_id}))
+        assert not empty.get("success", True), "依赖未满足的任务不应被领取"
+        
+        # w2 的租约过期后，它领取的任务应退回并可被其他 worker 重新领取
+        await asyncio.sleep(1.0)
+        reclaimed = self.extract_data(await self.client.call_tool("claimTasks", {"worker_id": "w3", "max_n": 10, "plan_id": plan_id}))
+        assert sorted(task["id"] for task in reclaimed["data"]) == sorted(second_ids), f"过期任务未被重新领取: {reclaimed}"
+        
+        renewed = self.extract_data(await self.client.call_tool("renewLeases", {"worker_id": "w1", "plan_id": plan_id}))
+        assert renewed.get("success", False) and len(renewed["data"]) == 2, f"续约失败: {renewed}"
+        
+        # 租约防护：w2 的租约已过期，迟到的完成和失败都不能覆盖 w3 的工作
+        late_id = second_ids[0]
+        late = self.extract_data(await self.client.call_tool("completeTask", {"task_id": late_id, "result": "迟到", "worker_id": "w2", "plan_id": plan_id}))
+        assert not late.get("success", True), f"租约过期的 worker 不应能完成任务: {late}"
+        late = self.extract_data(await self.client.call_tool("failTask", {"task_id": late_id, "error_message": "迟到", "worker_id": "w2", "plan_id": plan_id}))
+        assert not late.get("success", True), f"租约过期的 worker 不应能标记任务失败: {late}"
+        owned = self.extract_data(await self.client.call_tool("completeTask", {"task_id": late_id, "result": "完成", "worker_id": "w3", "plan_id": plan_id}))
+        assert owned.get("success", False) and owned["data"]["result"] == "完成", f"持有租约的 worker 应能完成任务: {owned}"
+        
+        print(f"👷 w1 领取 {first_ids}, w2 领取 {second_ids}（过期后由 w3 重新领取，w2 迟到的完成被拒绝）")
+        return {"w1": first_ids, "w2": second_ids}
+    
+    async def test_paginated_task_list(self):
+        """测试 getTaskList 的分页、字段投影和多状态过滤"""
+        plan_id = "suite-pages"
+        response = await self.client.call_tool("initializePlan", {
+            "goal": "分页测试",
+            "tasks": [{"name": f"分页任务{i}", "dependencies": [], "reasoning": "分页"} for i in range(7)],
+            "plan_id": plan_id
+        })
+        assert self.extract_data(response).get("success", False), "初始化分页计划失败"
+        for _ in range(2):
+            started = self.extract_data(await self.client.call_tool("startNextTask", {"plan_id": plan_id}))
+            await self.client.call_tool("completeTask", {"task_id": started["data"]["id"], "result": "完成", "plan_id": plan_id})
+        await self.client.call_tool("skipTask", {"task_id": 5, "reason": "不需要", "plan_id": plan_id})
+        
+        pages, cursor = [], None
+        while True:
+            arguments = {"status_filter": ["pending", "skipped"], "limit": 2, "fields": ["id", "status"], "plan_id": plan_id}
+            if cursor:
+                arguments["cursor"] = cursor
+            page = self.extract_data(await self.client.call_tool("getTaskList", arguments))
+            assert page.get("success", False), f"分页查询失败: {page}"
+            assert all(set(task) == {"id", "status"} for task in page["data"]), f"字段投影不正确: {page['data']}"
+            pages.append([task["id"] for task in page["data"]])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert pages == [[2, 3], [4, 5], [6]], f"分页结果不正确: {pages}"
+        
+        invalid = self.extract_data(await self.client.call_tool("getTaskList", {"fields": ["id", "secret"], "plan_id": plan_id}))
+        assert not invalid.get("success", True), "未知字段应被拒绝"
+        
+        print(f"📄 分页结果: {pages}")
+        return pages
+    
+    async def test_tree_view_shared_subtrees(self):
+        """测试树状视图只展开一次共享的子树，以及深度/宽度限制"""
+        plan_id = "suite-diamond"
+        response = await self.client.call_tool("initializePlan", {
+            "goal": "菱形依赖测试",
+            "tasks": [
+                {"name": "起点", "dependencies": [], "reasoning": "菱形"},
+                {"name": "左分支", "dependencies": ["起点"], "reasoning": "菱形"},
+                {"name": "右分支", "dependencies": ["起点"], "reasoning": "菱形"},
+                {"name": "汇合", "dependencies": ["左分支", "右分支"], "reasoning": "菱形"},
+                {"name": "收尾", "dependencies": ["汇合"], "reasoning": "菱形"}
+            ],
+            "plan_id": plan_id
+        })
+        assert self.extract_data(response).get("success", False), "初始化菱形计划失败"
+        
+        async def tree(**arguments) -> str:
+            response = await self.client.call_tool("visualizeDependencies", {"format": "tree", "plan_id": plan_id, **arguments})
+            return response[0].text
+        
+        full = await tree()
+        assert full.count("[4] 收尾") == 1, f"共享的子树不应重复展开: {full}"
+        assert "↪ ⏳ [3] 汇合 (见上文)" in full, f"缺少回引: {full}"
+        
+        shallow = await tree(max_depth=1)
+        assert "[3] 汇合" not in shallow and "1 个后续任务未展开" in shallow, f"深度限制无效: {shallow}"
+        
+        narrow = await tree(max_width=1)
+        assert "[2] 右分支" not in narrow and "还有 1 个后续任务" in narrow, f"宽度限制无效: {narrow}"
+        
+        print(f"🌳 树状视图共 {len(full.splitlines())} 行（含回引）")
+        return full
+    
+    async def test_focused_views(self):
+        """测试可视化和上下文提示的子图聚焦（前置任务、后续任务、邻域、执行前沿）"""
+        plan_id = "suite-focus"
+        response = await self.client.call_tool("initializePlan", {
+            "goal": "聚焦测试",
+            "tasks": [
+                {"name": "需求", "dependencies": [], "reasoning": "聚焦"},
+                {"name": "设计", "dependencies": ["需求"], "reasoning": "聚焦"},
+                {"name": "实现", "dependencies": ["设计"], "reasoning": "聚焦"},
+                {"name": "发布", "dependencies": ["实现"], "reasoning": "聚焦"},
+                {"name": "文档", "dependencies": [], "reasoning": "聚焦"}
+            ],
+            "plan_id": plan_id
+        })
+        assert self.extract_data(response).get("success", False), "初始化聚焦计划失败"
+        
+        async def call(tool: str, **arguments) -> str:
+            response = await self.client.call_tool(tool, {"plan_id": plan_id, **arguments})
+            return response[0].text
+        
+        ancestors = await call("visualizeDependencies", format="ascii", focus="ancestors", task_id=2)
+        assert all(f"[{task_id}]" in ancestors for task_id in (0, 1, 2)), f"前置任务不完整: {ancestors}"
+        assert "[3]" not in ancestors and "[4]" not in ancestors, f"前置任务视图包含无关任务: {ancestors}"
+        
+        neighborhood = await call("visualizeDependencies", format="mermaid", focus="neighborhood", task_id=2)
+        assert "T1 --> T2" in neighborhood and "T2 --> T3" in neighborhood and "T0" not in neighborhood, f"邻域不正确: {neighborhood}"
+        
+        frontier = await call("visualizeDependencies", format="tree", focus="frontier")
+        assert "[0] 需求" in frontier and "[4] 文档" in frontier and "[1]" not in frontier, f"执行前沿不正确: {frontier}"
+        
+        prompt = await call("generateContextPrompt", focus="descendants", task_id=2)
+        assert "- [3] 发布 依赖于: [2] 实现" in prompt and "- [1] 设计" not in prompt, f"聚焦的上下文提示不正确: {prompt}"
+        
+        invalid = await call("visualizeDependencies", focus="ancestors")
+        assert invalid.startswith("Error"), f"缺少 task_id 时应返回错误: {invalid}"
+        
+        print(f"🔍 前置任务视图 {len(ancestors.splitlines())} 行，聚焦提示 {len(prompt)} 字符")
+        return prompt
+    
+    async def test_critical_path(self):
+        """测试关键路径和排程估计"""
+        plan_id = "suite-schedule"
+        response = await self.client.call_tool("initializePlan", {
+            "goal": "排程测试",
+            "tasks": [
+                {"name": "准备", "dependencies": [], "reasoning": "排程", "estimated_duration": 3},
+                {"name": "短分支", "dependencies": ["准备"], "reasoning": "排程", "estimated_duration": 2},
+                {"name": "长分支", "dependencies": ["准备"], "reasoning": "排程", "estimated_duration": 5},
+                {"name": "汇总", "dependencies": ["短分支", "长分支"], "reasoning": "排程", "estimated_duration": 1},
+                {"name": "独立", "dependencies": [], "reasoning": "排程", "estimated_duration": 1}
+            ],
+            "plan_id": plan_id
+        })
+        assert self.extract_data(response).get("success", False), "初始化排程计划失败"
+        
+        schedule = self.extract_data(await self.client.call_tool("getCriticalPath", {"plan_id": plan_id}))["data"]
+        assert schedule["makespan"] == 9 and schedule["critical_path"] == [0, 2, 3], f"关键路径不正确: {schedule}"
+        slack = {task["id"]: task["slack"] for task in schedule["tasks"]}
+        assert slack == {0: 0, 1: 3, 2: 0, 3: 0, 4: 8}, f"松弛时间不正确: {slack}"
+        
+        await self.client.call_tool("startNextTask", {"plan_id": plan_id})
+        completed = self.extract_data(await self.client.call_tool("completeTask", {"task_id": 0, "result": "完成", "plan_id": plan_id}))
+        assert completed["data"].get("duration") is not None, f"完成的任务应记录实际耗时: {completed}"
+        
+        schedule = self.extract_data(await self.client.call_tool("getCriticalPath", {"plan_id": plan_id}))["data"]
+        assert schedule["makespan"] == 6 and schedule["critical_path"] == [2, 3], f"完成任务后的关键路径不正确: {schedule}"
+        assert schedule["observed_tasks"] == 1 and 0 not in [task["id"] for task in schedule["tasks"]], f"已完成任务不应参与排程: {schedule}"
+        
+        print(f"⏱️ 剩余总耗时 {schedule['makespan']}，关键路径 {schedule['critical_path']}")
+        return schedule
+    
+    async def test_priority_policies(self):
+        """测试 startNextTask/claimTasks 的优先级策略"""
+        plan_id = "suite-priority"
+        response = await self.client.call_tool("initializePlan", {
+            "goal": "优先级测试",
+            "tasks": [
+                {"name": "小任务A", "dependencies": [], "reasoning": "优先级", "estimated_duration": 1},
+                {"name": "小任务B", "dependencies": [], "reasoning": "优先级", "estimated_duration": 2, "priority": 5},
+                {"name": "长链起点", "dependencies": [], "reasoning": "优先级", "estimated_duration": 3},
+                {"name": "长链终点", "dependencies": ["长链起点"], "reasoning": "优先级", "estimated_duration": 10}
+            ],
+            "plan_id": plan_id
+        })
+        assert self.extract_data(response).get("success", False), "初始化优先级计划失败"
+        
+        async def set_policy(policy: str) -> dict:
+            return self.extract_data(await self.client.call_tool("setPriorityPolicy", {"policy": policy, "plan_id": plan_id}))
+        
+        assert not (await set_policy("random")).get("success"), "未知策略应返回错误"
+        assert (await set_policy("critical_path")).get("success"), "设置 critical_path 策略失败"
+        status = self.extract_data(await self.client.call_tool("getPlanStatus", {"plan_id": plan_id}))
+        assert status["data"]["meta"]["priority_policy"] == "critical_path", f"策略未保存到计划中: {status}"
+        
+        started = self.extract_data(await self.client.call_tool("startNextTask", {"plan_id": plan_id}))
+        assert started["data"]["id"] == 2, f"critical_path 策略应先开始长链起点: {started}"
+        
+        await set_policy("priority")
+        claimed = self.extract_data(await self.client.call_tool("claimTasks", {"worker_id": "w1", "max_n": 2, "plan_id": plan_id}))
+        assert [task["id"] for task in claimed["data"]] == [1, 0], f"priority 策略的领取顺序不正确: {claimed}"
+        
+        print(f"🎯 critical_path 先开始 [{started['data']['id']}]，priority 领取 {[task['id'] for task in claimed['data']]}")
+        return claimed
+    
+    async def test_ready_set(self):
+        """测试可执行任务集合的增量维护：完成、跳过和编辑依赖后解锁的任务，以及导出再导入后的顺序"""
+        plan_id = "suite-ready"
+        response = await self.client.call_tool("initializePlan", {
+            "goal": "就绪集合测试",
+            "tasks": [
+                {"name": "起点", "dependencies": [], "reasoning": "就绪"},
+                {"name": "等待起点", "dependencies": ["起点"], "reasoning": "就绪"},
+                {"name": "可跳过", "dependencies": [], "reasoning": "就绪"},
+                {"name": "等待跳过", "dependencies": ["可跳过"], "reasoning": "就绪"},
+                {"name": "同时等待", "dependencies": ["起点", "可跳过"], "reasoning": "就绪"}
+            ],
+            "plan_id": plan_id
+        })
+        assert self.extract_data(response).get("success", False), "初始化就绪集合计划失败"
+        
+        async def executable(target: str = plan_id) -> list:
+            data = self.extract_data(await self.client.call_tool("getExecutableTaskList", {"plan_id": target}))
+            return [task["id"] for task in data["data"]]
+        
+        assert await executable() == [0, 2], "初始可执行任务不正确"
+        
+        await self.client.call_tool("skipTask", {"task_id": 2, "reason": "不需要", "plan_id": plan_id})
+        assert await executable() == [0, 3], "跳过任务后应解锁依赖它的任务"
+        
+        started = self.extract_data(await self.client.call_tool("startNextTask", {"plan_id": plan_id}))
+        assert started["data"]["id"] == 0, f"fifo 应按计划顺序开始任务: {started}"
+        await self.client.call_tool("completeTask", {"task_id": 0, "result": "完成", "plan_id": plan_id})
+        assert await executable() == [1, 3, 4], "完成任务后应解锁依赖它的任务，并按计划顺序排列"
+        
+        edited = self.extract_data(await self.client.call_tool("editDependencies", {
+            "edits": [{"task_id": 1, "action": "set", "dependencies": [3]}], "plan_id": plan_id
+        }))
+        assert edited.get("success", False), f"编辑依赖失败: {edited}"
+        assert await executable() == [3, 4], "新增未满足的依赖后任务应离开可执行集合"
+        
+        # 在计划中间插入的任务按计划位置参与排序，而不是排在最后
+        added = self.extract_data(await self.client.call_tool("addTask", {
+            "name": "插入", "dependencies": [], "reasoning": "就绪", "after_task_id": 0, "plan_id": plan_id
+        }))
+        assert await executable() == [added["data"]["id"], 3, 4], "插入的任务应按计划位置排列"
+        
+        dumped = self.extract_data(await self.client.call_tool("dumpPlan", {"plan_id": plan_id}))["data"]
+        loaded = self.extract_data(await self.client.call_tool("loadPlan", {"plan_data": dumped, "plan_id": "suite-ready-copy"}))
+        assert loaded.get("success", False), f"加载计划失败: {loaded}"
+        assert await executable("suite-ready-copy") == await executable(), "导出再导入后可执行任务的顺序应保持不变"
+        original = self.extract_data(await self.client.call_tool("startNextTask", {"plan_id": plan_id}))
+        copied = self.extract_data(await self.client.call_tool("startNextTask", {"plan_id": "suite-ready-copy"}))
+        assert original["data"]["id"] == copied["data"]["id"], "导出再导入后 startNextTask 应选择同一个任务"
+        
+        print(f"🟢 就绪集合增量维护正确，导入后仍先开始任务 {original['data']['id']}")
+        return await executable()
+    
     async def run_all_tests(self):
         """运行所有测试"""
         print("🚀 开始 MCPlanManager 完整功能测试")
@@ -343,6 +655,7 @@ class MCPTestSuite:
                 await self.run_test("初始化计划", self.test_initialize_plan)
                 await self.run_test("获取任务列表", self.test_get_task_list)
                 await self.run_test("获取可执行任务", self.test_get_executable_task_list)
+                await self.run_test("获取依赖任务", self.test_get_dependents)
                 
                 # 任务执行测试
                 await self.run_test("启动下一个任务", self.test_start_next_task)
@@ -358,6 +671,14 @@ class MCPTestSuite:
                 await self.run_test("编辑依赖关系", self.test_edit_dependencies)
                 await self.run_test("可视化依赖关系", self.test_visualize_dependencies)
                 await self.run_test("生成上下文提示", self.test_generate_context_prompt)
+                await self.run_test("多计划隔离", self.test_multi_plan_isolation)
+                await self.run_test("多 worker 领取任务", self.test_claim_tasks)
+                await self.run_test("分页获取任务列表", self.test_paginated_task_list)
+                await self.run_test("树状视图共享子树", self.test_tree_view_shared_subtrees)
+                await self.run_test("子图聚焦", self.test_focused_views)
+                await self.run_test("关键路径", self.test_critical_path)
+                await self.run_test("优先级策略", self.test_priority_policies)
+                await self.run_test("就绪集合增量维护", self.test_ready_set)
                 
         except Exception as e:
             print(f"❌ 客户端连接失败: {e}")
@@ -10,6 +10,7 @@ python test/test_edge_cases.py [--mode uvx|sse]
 import asyncio
 import argparse
 import json
+import random
 import sys
 from typing import Dict, Any
 from fastmcp import Client
@@ -130,6 +131,42 @@ class EdgeCaseTestSuite:
             else:
                 print(f"  ✅ 循环依赖正确拒绝: {data.get('message', 'Unknown')}")
     
+    async def test_cycle_paths(self):
+        """测试循环依赖错误中报告的环路路径，以及被拒绝的编辑不改变计划"""
+        response = await self.client.call_tool("initializePlan", {
+            "goal": "环路路径测试",
+            "tasks": [{"name": f"链{i}", "dependencies": [f"链{i - 1}"] if i else [], "reasoning": "链式依赖"} for i in range(4)]
+        })
+        assert self.extract_data(response).get("success", False), "初始化链式计划失败"
+        before = self.extract_data(await self.client.call_tool("dumpPlan"))["data"]["tasks"]
+        
+        # 直接环路：0 依赖 1，而 1 依赖 0
+        direct = self.extract_data(await self.client.call_tool("editDependencies", {"edits": [{"task_id": 0, "action": "update", "add": [1]}]}))
+        assert not direct.get("success", True), "直接环路应被拒绝"
+        assert direct["message"].endswith(": 0 -> 1 -> 0"), f"直接环路的路径不正确: {direct['message']}"
+        
+        # 间接环路：0 依赖 3，而 3 经由 2、1 依赖 0
+        indirect = self.extract_data(await self.client.call_tool("editDependencies", {"edits": [{"task_id": 0, "action": "update", "add": [3]}]}))
+        assert not indirect.get("success", True), "间接环路应被拒绝"
+        assert indirect["message"].endswith(": 0 -> 3 -> 2 -> 1 -> 0"), f"间接环路的路径不正确: {indirect['message']}"
+        
+        after = self.extract_data(await self.client.call_tool("dumpPlan"))["data"]["tasks"]
+        assert after == before, "被拒绝的编辑不应改变计划"
+        
+        # 整体校验（initializePlan）报告同样格式的路径
+        rejected = self.extract_data(await self.client.call_tool("initializePlan", {
+            "goal": "环路路径测试",
+            "tasks": [
+                {"name": "甲", "dependencies": ["丙"], "reasoning": "环路"},
+                {"name": "乙", "dependencies": ["甲"], "reasoning": "环路"},
+                {"name": "丙", "dependencies": ["乙"], "reasoning": "环路"}
+            ]
+        }))
+        assert not rejected.get("success", True), "包含环路的计划应被拒绝"
+        assert rejected["message"].endswith(": 0 -> 2 -> 1 -> 0"), f"初始化时的环路路径不正确: {rejected['message']}"
+        print(f"  ✅ 直接环路: {direct['message']}")
+        print(f"  ✅ 间接环路: {indirect['message']}")
+    
     async def test_invalid_dependencies(self):
         """测试无效依赖"""
         invalid_plan = {
@@ -264,6 +301,58 @@ class EdgeCaseTestSuite:
                     else:
                         print("  ✅ 状态一致性正确 - 没有重复启动任务")
     
+    async def test_status_counters_consistency(self):
+        """测试随机操作序列后，getPlanStatus 的增量计数与全量重新统计一致"""
+        rnd = random.Random(20240601)
+        plan = {
+            "goal": "状态计数一致性测试",
+            "tasks": [
+                {
+                    "name": f"任务{i}",
+                    "dependencies": rnd.sample(range(i), min(i, rnd.randint(0, 2))),
+                    "reasoning": "随机依赖"
+                }
+                for i in range(12)
+            ]
+        }
+        response = await self.client.call_tool("initializePlan", plan)
+        data = self.extract_data(response)
+        assert data.get("success", False), f"初始化计划失败: {data}"
+        
+        for step in range(60):
+            task_list = self.extract_data(await self.client.call_tool("getTaskList"))["data"]
+            task_id = rnd.choice(task_list)["id"]
+            operation = rnd.choice(["start_complete", "start", "fail", "skip", "add"])
+            if operation == "start_complete":
+                started = self.extract_data(await self.client.call_tool("startNextTask"))
+                if started.get("success"):
+                    await self.client.call_tool("completeTask", {"task_id": started["data"]["id"], "result": "done"})
+            elif operation == "start":
+                await self.client.call_tool("startNextTask")
+            elif operation == "fail":
+                await self.client.call_tool("failTask", {"task_id": task_id, "error_message": "随机失败"})
+            elif operation == "skip":
+                await self.client.call_tool("skipTask", {"task_id": task_id, "reason": "随机跳过"})
+            else:
+                await self.client.call_tool("addTask", {
+                    "name": f"新增任务{step}",
+                    "dependencies": [task_id],
+                    "reasoning": "随机新增"
+                })
+            
+            status = self.extract_data(await self.client.call_tool("getPlanStatus"))["data"]
+            task_list = self.extract_data(await self.client.call_tool("getTaskList"))["data"]
+            recount = {"pending": 0, "in_progress": 0, "completed": 0, "failed": 0, "skipped": 0}
+            for task in task_list:
+                recount[task["status"]] += 1
+            recount["total"] = len(task_list)
+            
+            assert status["task_counts"] == recount, f"第{step}步 ({operation}) 计数不一致: {status['task_counts']} != {recount}"
+            finished = recount["completed"] + recount["skipped"]
+            assert status["progress"]["completed_tasks"] == finished, f"第{step}步 ({operation}) 进度不一致"
+        
+        print(f"  ✅ 60 步随机操作后状态计数与全量统计一致: {status['task_counts']}")
+    
     async def run_all_edge_case_tests(self):
         """运行所有边界情况测试"""
         print("🚀 开始 MCPlanManager 边界情况测试")
@@ -278,11 +367,13 @@ class EdgeCaseTestSuite:
                 await self.run_test("无效任务ID处理", self.test_invalid_task_id)
                 await self.run_test("空计划初始化", self.test_empty_plan_initialization)
                 await self.run_test("循环依赖检测", self.test_circular_dependencies)
+                await self.run_test("环路路径报告", self.test_cycle_paths)
                 await self.run_test("无效依赖处理", self.test_invalid_dependencies)
                 await self.run_test("超长任务名称", self.test_large_task_name)
                 await self.run_test("特殊字符处理", self.test_special_characters)
                 await self.run_test("不存在操作处理", self.test_nonexistent_operations)
                 await self.run_test("状态一致性", self.test_state_consistency)
+                await self.run_test("状态计数一致性", self.test_status_counters_consistency)
                 
         except Exception as e:
             print(f"❌ 客户端连接失败: {e}")
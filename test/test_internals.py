@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+MCPlanManager 进程内测试套件
+直接在进程内调用 PlanManager 和 PlanRegistry，检查无法通过 MCP 工具观察到的内部不变量，不需要启动 MCP 服务
+
+使用方法：
+python test/test_internals.py
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mcplanmanager.plan_manager import PlanManager
+from mcplanmanager.registry import PlanRegistry
+from mcplanmanager.serialization import dumps_response
+from mcplanmanager.storage import MemorySpillStore, SQLitePlanStore, StoredPlanView
+from mcplanmanager.task_record import JSON_CACHE_BYTES
+from mcplanmanager.wal import WriteAheadLogStore
+
+
+class FailingSpillStore(MemorySpillStore):
+    """fail 为 True 时 save 抛出异常的溢出存储，用来模拟磁盘已满等写入失败"""
+
+    def __init__(self):
+        super().__init__()
+        self.fail = False
+
+    def save(self, plan_id, plan_data):
+        if self.fail:
+            raise OSError("simulated spill failure")
+        super().save(plan_id, plan_data)
+
+
+class BlockingSpillStore(MemorySpillStore):
+    """保存指定计划时阻塞到 release 被设置，用来模拟缓慢的磁盘写入"""
+
+    def __init__(self, blocked_plan_id):
+        super().__init__()
+        self.blocked_plan_id = blocked_plan_id
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def save(self, plan_id, plan_data):
+        if plan_id == self.blocked_plan_id:
+            self.entered.set()
+            self.release.wait(10)
+        super().save(plan_id, plan_data)
+
+
+class BrokenLogFile:
+    """写入时抛出异常的日志文件，用来模拟预写日志刷盘失败"""
+
+    def write(self, text):
+        raise OSError("simulated write failure")
+
+    def close(self):
+        pass
+
+
+class InternalsTestSuite:
+    def __init__(self):
+        self.test_results = []
+        self.failed_tests = []
+
+    def run_test(self, test_name: str, test_func, *args, **kwargs):
+        """运行单个测试并记录结果"""
+        print(f"\n🧪 测试: {test_name}")
+        try:
+            result = test_func(*args, **kwargs)
+            self.test_results.append({"name": test_name, "status": "PASS", "result": result})
+            print(f"✅ {test_name} - 通过")
+            return result
+        except Exception as e:
+            self.test_results.append({"name": test_name, "status": "FAIL", "error": str(e)})
+            self.failed_tests.append(test_name)
+            print(f"❌ {test_name} - 失败: {e}")
+            return None
+
+    @staticmethod
+    def assert_topological_order(manager: PlanManager, step: str) -> None:
+        """每个任务的拓扑序号都大于它的所有依赖，并且序号恰好覆盖计划中的任务"""
+        order = manager._topo_order
+        task_ids = {task["id"] for task in manager.getTaskList()["data"]}
+        assert set(order) == task_ids, f"{step}: 拓扑序与计划中的任务不一致"
+        for task in manager.getTaskList()["data"]:
+            for dep_id in task["dependencies"]:
+                assert order[dep_id] < order[task["id"]], f"{step}: 任务 {task['id']} 排在依赖 {dep_id} 之前"
+
+    def test_topological_order(self):
+        """随机增删任务、编辑依赖后，增量维护的拓扑序始终有效"""
+        rnd = random.Random(20240617)
+        manager = PlanManager()
+        manager.initializePlan("拓扑序测试", [{"name": f"任务{i}", "dependencies": [], "reasoning": "拓扑序"} for i in range(20)])
+        self.assert_topological_order(manager, "初始化")
+
+        counts = {"add": 0, "edit": 0, "update": 0, "remove": 0, "rejected": 0}
+        for step in range(400):
+            task_ids = [task["id"] for task in manager.getTaskList()["data"]]
+            operation = rnd.choice(["add", "edit", "edit", "update", "remove"])
+            if operation == "add":
+                dependencies = rnd.sample(task_ids, min(len(task_ids), rnd.randint(0, 3)))
+                after_task_id = rnd.choice(task_ids) if task_ids and rnd.random() < 0.5 else None
+                assert manager.addTask(f"新增{step}", dependencies, "随机新增", after_task_id=after_task_id)["success"]
+            elif operation == "edit":
+                edits = [
+                    {"task_id": task_id, "action": "update", "add": rnd.sample(task_ids, 1), "remove": rnd.sample(task_ids, 1)}
+                    for task_id in rnd.sample(task_ids, min(len(task_ids), 3))
+                ]
+                if not manager.edit_dependencies_in_batch(edits)["success"]:
+                    counts["rejected"] += 1
+            elif operation == "update":
+                task_id = rnd.choice(task_ids)
+                try:
+                    manager.updateTask(task_id, {"dependencies": rnd.sample(task_ids, min(len(task_ids), 2))})
+                except ValueError:
+                    counts["rejected"] += 1
+            else:
+                removable = [task_id for task_id in task_ids if not manager.getDependents(task_id)["data"]]
+                if len(removable) < 2:
+                    continue
+                manager.removeTask(rnd.choice(removable))
+            counts[operation] += 1
+            self.assert_topological_order(manager, f"第{step}步 ({operation})")
+
+        assert counts["rejected"] > 0, "随机编辑应至少触发一次环路回滚"
+        print(f"  ✅ 400 步随机操作后拓扑序始终有效: {counts}")
+        return counts
+
+    def test_cached_dump(self):
+        """计划没有变化时 dumpPlan 返回缓存的快照，任何修改（包括只改 state 的续约）都会使缓存失效"""
+        manager = PlanManager()
+        manager.initializePlan("导出缓存测试", [
+            {"name": "甲", "dependencies": [], "reasoning": "缓存"},
+            {"name": "乙", "dependencies": ["甲"], "reasoning": "缓存"}
+        ])
+        first = manager.dumpPlan()["data"]
+        assert manager.dumpPlan()["data"] is first, "计划未变化时应返回缓存的快照"
+        manager.getTaskList()
+        assert manager.dumpPlan()["data"] is first, "只读调用不应使缓存失效"
+
+        manager.claimTasks("w1", lease_seconds=60)
+        claimed = manager.dumpPlan()["data"]
+        assert claimed is not first and claimed["tasks"][0]["status"] == "in_progress", "修改后应重新导出"
+        assert first["tasks"][0]["status"] == "pending", "已导出的快照不应被后续修改改变"
+        assert claimed["tasks"][1] is first["tasks"][1], "未修改的任务应复用之前导出的字典视图"
+
+        manager.renewLeases("w1", lease_seconds=120)
+        renewed = manager.dumpPlan()["data"]
+        assert renewed is not claimed and renewed["state"]["leases"] != claimed["state"]["leases"], "续约后应重新导出"
+        print(f"  ✅ 版本 {first['meta']['version']} -> {renewed['meta']['version']}，未变化时复用快照")
+
+    def test_batch_edit_rollback(self):
+        """批量编辑依赖：形成环路时完整回滚（拓扑序、版本、反向依赖都不变），合法的编辑一次性生效"""
+        manager = PlanManager()
+        manager.initializePlan("批量编辑测试", [
+            {"name": f"任务{i}", "dependencies": [f"任务{i - 1}"] if i else [], "reasoning": "链式依赖"} for i in range(5)
+        ])
+
+        def state():
+            return (
+                dict(manager._topo_order),
+                manager.getPlanStatus()["data"]["meta"]["version"],
+                {task_id: [task["id"] for task in manager.getDependents(task_id)["data"]] for task_id in range(5)},
+                [task["id"] for task in manager.getExecutableTaskList()["data"]],
+                manager.dumpPlan()["data"]
+            )
+
+        before = state()
+        # 第一条编辑本身合法，第二条形成环路 0 -> 3 -> 2 -> 1 -> 0，整批都不应生效
+        rejected = manager.edit_dependencies_in_batch([
+            {"task_id": 4, "action": "set", "dependencies": [1]},
+            {"task_id": 0, "action": "set", "dependencies": [3]}
+        ])
+        assert not rejected["success"] and rejected["message"].endswith("0 -> 3 -> 2 -> 1 -> 0"), f"应报告环路: {rejected}"
+        after = state()
+        assert after[0] == before[0], "回滚后拓扑序应保持不变"
+        assert after[1] == before[1], "被回滚的编辑不应推进版本"
+        assert after[2] == before[2], "回滚后反向依赖应保持不变"
+        assert after[3] == before[3], "回滚后可执行任务应保持不变"
+        assert after[4] is before[4], "被回滚的编辑不应使导出缓存失效"
+
+        applied = manager.edit_dependencies_in_batch([
+            {"task_id": 2, "action": "set", "dependencies": [0]},
+            {"task_id": 4, "action": "update", "add": [1], "remove": [3]}
+        ])
+        assert applied["success"], f"合法的批量编辑失败: {applied}"
+        self.assert_topological_order(manager, "批量编辑")
+        assert manager.getPlanStatus()["data"]["meta"]["version"] == before[1] + 1, "一次批量编辑应只推进一个版本"
+        assert [task["id"] for task in manager.getDependents(0)["data"]] == [1, 2], "反向依赖未更新"
+        assert [task["id"] for task in manager.getDependents(1)["data"]] == [4], "反向依赖未更新"
+        assert manager.getTaskById(4)["data"]["dependencies"] == [1], "依赖列表未更新"
+        print(f"  ✅ 环路被拒绝: {rejected['message']}")
+        return applied["data"]
+
+    def test_failed_update_is_atomic(self):
+        """抛出异常或返回失败的修改调用不改变计划、不推进版本，也不产生增量"""
+        manager = PlanManager()
+        manager.initializePlan("原子更新测试", [
+            {"name": "甲", "dependencies": [], "reasoning": "原子"},
+            {"name": "乙", "dependencies": ["甲"], "reasoning": "原子", "priority": 1}
+        ])
+        before = manager.dumpPlan()["data"]
+        version = before["meta"]["version"]
+
+        # 合法字段在前、不合法字段在后：整个更新都不应生效
+        for task_id, updates in ((1, {"name": "改名", "reasoning": "改", "priority": "高"}),
+                                 (1, {"name": "改名", "estimated_duration": -1}),
+                                 (1, {"name": "改名", "dependencies": [99]}),
+                                 (0, {"name": "改名", "priority": 3, "dependencies": [1]})):
+            try:
+                manager.updateTask(task_id, updates)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"不合法的更新应被拒绝: {updates}")
+        rejected = manager.initializePlan("新目标", [{"name": "丙", "dependencies": ["不存在"], "reasoning": "原子"}])
+        assert not rejected["success"], "依赖不存在的计划应被拒绝"
+
+        after = manager.dumpPlan()["data"]
+        assert after == before, "失败的调用不应修改计划"
+        assert after["meta"]["version"] == version, "失败的调用不应推进版本"
+        delta = manager.dumpPlanDelta(version)["data"]
+        assert delta["upsert"] == [] and delta["remove"] == [], f"失败的调用不应产生增量: {delta}"
+
+        updated = manager.updateTask(1, {"name": "改名", "priority": 3})
+        assert updated["updated_task"]["name"] == "改名" and updated["updated_task"]["priority"] == 3, "合法的更新应全部生效"
+        assert manager.dumpPlan()["data"]["meta"]["version"] == version + 1, "一次更新应只推进一个版本"
+        print("  ✅ 4 次不合法的更新和 1 次失败的初始化都没有修改计划")
+
+    def test_failed_spill_keeps_plan(self):
+        """换出时保存失败：计划继续驻留在内存中，触发换出的其他计划的调用不受影响"""
+        store = FailingSpillStore()
+        registry = PlanRegistry(max_active_plans=1, spill_store=store)
+        with registry.open("A") as manager:
+            manager.initializePlan("计划A", [{"name": "甲", "dependencies": [], "reasoning": "换出"}])
+            manager.startNextTask()
+            expected = manager.dumpPlan()["data"]
+
+        # 收集注册表记录的错误，同时避免错误堆栈打印到测试输出中
+        errors = []
+        handler = logging.Handler()
+        handler.emit = errors.append
+        registry_logger = logging.getLogger("mcplanmanager.registry")
+        registry_logger.addHandler(handler)
+        registry_logger.propagate = False
+        store.fail = True
+        try:
+            with registry.open("B") as manager:
+                result = manager.initializePlan("计划B", [{"name": "乙", "dependencies": [], "reasoning": "换出"}])
+            assert result["success"], "计划B的调用不应受到计划A换出失败的影响"
+            assert errors and "'A'" in errors[0].getMessage(), "换出失败应记录错误"
+            assert registry.active_plans() == ["A", "B"], f"换出失败的计划应继续驻留在内存中: {registry.active_plans()}"
+            assert registry.list_plans() == ["A", "B"], f"两个计划都应存在: {registry.list_plans()}"
+            assert store.keys() == [], "失败的保存不应留下数据"
+            with registry.open("A") as manager:
+                assert manager.dumpPlan()["data"] == expected, "换出失败后计划A的数据应保持不变"
+        finally:
+            registry_logger.removeHandler(handler)
+            registry_logger.propagate = True
+
+        # 存储恢复后，下一次换出照常进行，换入的计划与换出前一致
+        store.fail = False
+        with registry.open("B"):
+            pass
+        assert registry.active_plans() == ["B"] and store.keys() == ["A"], "存储恢复后应正常换出"
+        with registry.open("A") as manager:
+            assert manager.dumpPlan()["data"] == expected, "换入后的计划应与换出前一致"
+        print("  ✅ 换出失败时计划保留在内存中，恢复后正常换出")
+
+    def test_slow_spill_does_not_block(self):
+        """换出在注册表锁外写入：一个计划写入缓慢时其他计划的调用不受阻塞，同一计划的调用等写入结束后看到完整数据"""
+        store = BlockingSpillStore("A")
+        registry = PlanRegistry(max_active_plans=1, spill_store=store)
+        with registry.open("A") as manager:
+            manager.initializePlan("计划A", [{"name": "甲", "dependencies": [], "reasoning": "慢速换出"}])
+            manager.startNextTask()
+            expected = manager.dumpPlan()["data"]
+
+        errors = []
+
+        def open_plan(plan_id, results):
+            with registry.open(plan_id) as manager:
+                results.append(manager.dumpPlan()["data"])
+
+        # 打开计划B触发计划A的换出，A的写入被阻塞
+        evicting = threading.Thread(target=lambda: self.capture_errors(lambda: open_plan("B", []), errors), daemon=True)
+        evicting.start()
+        assert store.entered.wait(5), "计划A没有被换出"
+        try:
+            started = time.monotonic()
+            with registry.open("C") as manager:
+                manager.initializePlan("计划C", [{"name": "丙", "dependencies": [], "reasoning": "不受阻塞"}])
+            assert time.monotonic() - started < 1, "其他计划的调用被计划A的写入阻塞"
+            assert "A" in registry.list_plans(), f"正在换出的计划也应被列出: {registry.list_plans()}"
+
+            # 同一计划的调用等待写入结束
+            restored = []
+            waiting = threading.Thread(target=lambda: self.capture_errors(lambda: open_plan("A", restored), errors), daemon=True)
+            waiting.start()
+            waiting.join(0.3)
+            assert waiting.is_alive(), "计划A写入结束前不应被换入"
+        finally:
+            store.release.set()
+        evicting.join(5)
+        waiting.join(5)
+        if errors:
+            raise errors[0]
+        assert restored == [expected], "等待换出结束后换入的计划应与换出前一致"
+        print("  ✅ 慢速换出只阻塞同一计划的调用")
+
+    def test_sqlite_spill_nameless_tasks(self):
+        """loadPlan 导入的无名称任务和非字符串名称可以换出到 SQLite 存储，换入后与换出前一致"""
+        plan = {
+            "meta": {"goal": "无名称任务", "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"},
+            "state": {"current_task_id": None, "status": "idle"},
+            "tasks": [
+                {"id": 1, "status": "pending", "dependencies": [], "reasoning": "没有名称"},
+                {"id": 2, "name": {"zh": "乙"}, "status": "pending", "dependencies": [1], "reasoning": "非字符串名称"},
+            ],
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            # 旧版本建表时 name 列带有 NOT NULL 约束，同样需要能保存
+            legacy_path = os.path.join(directory, "legacy.db")
+            legacy = SQLitePlanStore(legacy_path)
+            legacy._conn.executescript("DROP TABLE tasks;" + SQLitePlanStore.SCHEMA.replace("name TEXT,", "name TEXT NOT NULL,"))
+            for store in (SQLitePlanStore(os.path.join(directory, "plans.db")), legacy):
+                registry = PlanRegistry(max_active_plans=1, spill_store=store)
+                with registry.open("A") as manager:
+                    assert manager.loadPlan(plan)["success"], "无名称任务的计划应能导入"
+                    expected = manager.dumpPlan()["data"]
+                with registry.open("B") as manager:
+                    assert manager.initializePlan("计划B", [{"name": "丙", "dependencies": [], "reasoning": "触发换出"}])["success"]
+                assert registry.active_plans() == ["B"], f"计划A应已换出: {registry.active_plans()}"
+                assert registry.list_plans() == ["A", "B"], f"两个计划都应存在: {registry.list_plans()}"
+                with registry.read("A") as view:
+                    names = [node["name"] for node in view.getDependencyGraph()["data"]["nodes"]]
+                    assert names == [None, {"zh": "乙"}], f"依赖图应返回原始名称: {names}"
+                    assert [task["name"] for task in view.getTaskList()["data"]] == names, "任务列表应返回原始名称"
+                with registry.open("A") as manager:
+                    assert manager.dumpPlan()["data"] == expected, "换入后的计划应与换出前一致"
+        print("  ✅ 无名称任务在新旧两种表结构中都能换出和换入")
+
+    def test_stored_view_reads(self):
+        """换出计划的只读视图：结果顺序与驻留计划一致，到期租约会换入处理，查询期间不阻塞注册表"""
+        with tempfile.TemporaryDirectory() as directory:
+            store = SQLitePlanStore(os.path.join(directory, "plans.db"))
+            registry = PlanRegistry(max_active_plans=1, spill_store=store)
+            with registry.open("A") as manager:
+                manager.initializePlan("视图测试", [
+                    {"name": "甲", "dependencies": [], "reasoning": "视图"},
+                    {"name": "乙", "dependencies": [], "reasoning": "视图"},
+                    {"name": "丙", "dependencies": ["甲"], "reasoning": "视图"},
+                    {"name": "丁", "dependencies": [], "reasoning": "视图"},
+                ])
+                # 插入到中间的任务ID较大，计划顺序与ID顺序不同
+                manager.addTask("戊", [], "视图", after_task_id=0)
+                manager.claimTasks("w1", max_n=1, lease_seconds=0.2)
+                expected = [task["id"] for task in manager.getExecutableTaskList()["data"]]
+            assert expected == [4, 1, 3], f"驻留计划应按计划顺序返回可执行任务: {expected}"
+            with registry.open("B") as manager:
+                manager.initializePlan("计划B", [{"name": "己", "dependencies": [], "reasoning": "触发换出"}])
+
+            # 嵌套调用其他计划不会死锁，查询期间计划A被换入也不影响视图
+            def nested_read():
+                with registry.read("A") as view:
+                    assert isinstance(view, StoredPlanView), "未到期的换出计划应通过视图读取"
+                    ids = [task["id"] for task in view.getExecutableTaskList()["data"]]
+                    assert ids == expected, f"视图与驻留计划的可执行任务顺序应一致: {ids} != {expected}"
+                    with registry.open("B"):
+                        pass
+                    with registry.open("A"):
+                        pass
+                    assert registry.active_plans() == ["A"] and store.contains("A"), "读取期间换入的计划应保留存储中的副本"
+                    assert [task["id"] for task in view.getExecutableTaskList()["data"]] == expected, "换入后视图仍应可用"
+                assert not store.contains("A"), "读取结束后应删除已换入计划的副本"
+
+            errors = []
+            worker = threading.Thread(target=lambda: self.capture_errors(nested_read, errors), daemon=True)
+            worker.start()
+            worker.join(5)
+            assert not worker.is_alive(), "读取换出计划时嵌套调用注册表发生死锁"
+            if errors:
+                raise errors[0]
+
+            # 换出计划A，等租约到期后读取：任务0应退回 pending，而不是在视图中停留在 in_progress
+            with registry.open("B"):
+                pass
+            assert registry.active_plans() == ["B"] and store.contains("A"), "计划A应已换出"
+            time.sleep(0.3)
+            with registry.read("A") as reader:
+                statuses = {task["id"]: task["status"] for task in reader.getTaskList()["data"]}
+                ids = [task["id"] for task in reader.getExecutableTaskList()["data"]]
+            assert statuses[0] == "pending", f"到期租约的任务应退回 pending: {statuses}"
+            assert ids == [0, 4, 1, 3], f"退回的任务应按计划顺序重新可执行: {ids}"
+        print("  ✅ 视图顺序一致，到期租约被处理，嵌套调用不阻塞")
+
+    def test_wal_group_commit_durability(self):
+        """启用组提交时，修改返回前已经落盘：不刷出缓冲区、直接读取日志目录也能恢复出返回的修改"""
+        with tempfile.TemporaryDirectory() as directory:
+            registry = PlanRegistry(wal_store=WriteAheadLogStore(directory, group_commit_ms=50))
+            with registry.open("A") as manager:
+                manager.initializePlan("组提交测试", [
+                    {"name": "甲", "dependencies": [], "reasoning": "落盘"},
+                    {"name": "乙", "dependencies": ["甲"], "reasoning": "落盘"},
+                ])
+                started = manager.startNextTask()["data"]["id"]
+                assert manager.completeTask(started, "完成")["success"], "完成任务失败"
+                expected = manager.dumpPlan()["data"]
+            # 相当于进程在最后一个响应之后立即崩溃：另一个日志目录实例只能看到已经 fsync 的内容
+            recovered = WriteAheadLogStore(directory, group_commit_ms=0).open("A").recover()
+            assert recovered is not None, "日志中没有任何记录"
+            assert [task["status"] for task in recovered["tasks"]] == ["completed", "pending"], f"已返回的修改没有落盘: {recovered['tasks']}"
+            assert recovered == expected, "恢复的计划与返回时的计划不一致"
+        print("  ✅ 组提交窗口内返回的修改都已落盘")
+
+    def test_wal_flush_failure(self):
+        """一个计划的日志刷盘失败：该计划的调用报错而不是报告成功，组提交线程继续为其他计划刷盘"""
+        errors = []
+        handler = logging.Handler()
+        handler.emit = errors.append
+        wal_logger = logging.getLogger("mcplanmanager.wal")
+        wal_logger.addHandler(handler)
+        wal_logger.propagate = False
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                store = WriteAheadLogStore(directory, group_commit_ms=20)
+                registry = PlanRegistry(wal_store=store)
+                for plan_id in ("A", "B"):
+                    with registry.open(plan_id) as manager:
+                        manager.initializePlan(f"计划{plan_id}", [{"name": "甲", "dependencies": [], "reasoning": "刷盘"}])
+                        manager.addTask("乙", [0], "刷盘")
+                registry._active["A"].journal._file = BrokenLogFile()
+
+                for attempt in range(2):
+                    try:
+                        with registry.open("A") as manager:
+                            manager.startNextTask()
+                    except OSError:
+                        pass
+                    else:
+                        raise AssertionError(f"第 {attempt + 1} 次修改没有落盘，不应报告成功")
+                assert errors and "A" in errors[0].getMessage(), "刷盘失败应记录错误"
+
+                with registry.open("B") as manager:
+                    assert manager.startNextTask()["success"], "其他计划的修改不应受影响"
+                recovered = WriteAheadLogStore(directory, group_commit_ms=0).open("B").recover()
+                assert recovered["tasks"][0]["status"] == "in_progress", "组提交线程应继续为其他计划刷盘"
+        finally:
+            wal_logger.removeHandler(handler)
+            wal_logger.propagate = True
+        print("  ✅ 刷盘失败的计划报错，其他计划照常落盘")
+
+    def test_json_cache_bounded(self):
+        """任务 JSON 文本缓存有容量上限：序列化大计划后常驻内存不随计划规模增长，缓存的文本始终与任务一致"""
+        manager = PlanManager()
+        manager.initializePlan("序列化缓存测试", [{"name": f"任务{i}", "dependencies": [], "reasoning": "缓存"} for i in range(6000)])
+        # 最后一个任务保持 pending，之后用它检查修改后的任务会重新序列化
+        for i in range(5999):
+            manager.startNextTask()
+            manager.completeTask(i, f"结果{i} " + "x" * 2048)
+        expected = json.loads(json.dumps(manager.getTaskList(), ensure_ascii=False))
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            text = dumps_response(manager.getTaskList())
+            assert json.loads(text) == expected, "紧凑序列化的结果与标准库不一致"
+            total = len(text)
+            del text
+            retained = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        assert total > 1.5 * JSON_CACHE_BYTES, "测试计划应大于缓存容量"
+        assert retained < 1.25 * JSON_CACHE_BYTES, f"序列化后常驻了 {retained / 2**20:.1f} MB，超过缓存容量"
+
+        # 最近序列化的任务命中缓存，被修改的任务重新序列化
+        last = manager.getTaskById(5999)["data"]
+        assert last.to_json() is last.to_json(), "未修改的任务应复用缓存的文本"
+        manager.updateTask(5999, {"name": "新名称"})
+        updated = json.loads(dumps_response(manager.getTaskById(5999)))
+        assert updated["data"]["name"] == "新名称", "修改后的任务应重新序列化"
+        print(f"  ✅ 序列化 {total / 2**20:.1f} MB 的响应后常驻 {retained / 2**20:.1f} MB（上限 {JSON_CACHE_BYTES / 2**20:.0f} MB）")
+
+    @staticmethod
+    def capture_errors(func, errors):
+        """在线程中运行测试代码，把异常交给主线程报告"""
+        try:
+            func()
+        except Exception as e:
+            errors.append(e)
+
+    def run_all_tests(self):
+        """按顺序运行所有进程内测试"""
+        self.run_test("增量拓扑序", self.test_topological_order)
+        self.run_test("dumpPlan 快照缓存", self.test_cached_dump)
+        self.run_test("批量编辑依赖的回滚", self.test_batch_edit_rollback)
+        self.run_test("失败的修改不留痕迹", self.test_failed_update_is_atomic)
+        self.run_test("换出失败时保留计划", self.test_failed_spill_keeps_plan)
+        self.run_test("慢速换出不阻塞其他计划", self.test_slow_spill_does_not_block)
+        self.run_test("SQLite 存储中的无名称任务", self.test_sqlite_spill_nameless_tasks)
+        self.run_test("换出计划的只读视图", self.test_stored_view_reads)
+        self.run_test("组提交的持久性", self.test_wal_group_commit_durability)
+        self.run_test("预写日志刷盘失败", self.test_wal_flush_failure)
+        self.run_test("任务 JSON 缓存的容量上限", self.test_json_cache_bounded)
+        return self.print_summary()
+
+    def print_summary(self):
+        """打印测试总结"""
+        print("\n" + "=" * 60)
+        print("📊 进程内测试总结报告")
+        print("=" * 60)
+        passed = len(self.test_results) - len(self.failed_tests)
+        print(f"总计测试: {len(self.test_results)}, 通过: {passed}, 失败: {len(self.failed_tests)}")
+        if self.failed_tests:
+            print("❌ 失败的测试项:")
+            for test_name in self.failed_tests:
+                print(f"  - {test_name}")
+        else:
+            print("🎉 所有进程内测试都通过了!")
+        return not self.failed_tests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCPlanManager 进程内测试")
+    # 与其他测试套件保持相同的命令行，进程内测试不区分模式
+    parser.add_argument("--mode", choices=["uvx", "sse"], default="sse", help="忽略")
+    parser.parse_args()
+
+    suite = InternalsTestSuite()
+    sys.exit(0 if suite.run_all_tests() else 1)
+
+
+if __name__ == "__main__":
+    main()
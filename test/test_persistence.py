@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 MCPlanManager 持久化测试套件
-测试 dumpPlan 和 loadPlan 工具的功能
+测试 dumpPlan/loadPlan、增量导出和各种持久化存储的功能
 
 使用方法：
 python test/test_persistence.py [--mode uvx|sse]
@@ -10,7 +10,14 @@ python test/test_persistence.py [--mode uvx|sse]
 import asyncio
 import argparse
 import json
+import os
+import signal
+import subprocess
 import sys
+import tempfile
+import urllib.error
+import urllib.request
+from pathlib import Path
 from typing import Dict, Any, List
 from fastmcp import Client
 from fastmcp.client.transports import UvxStdioTransport
@@ -116,25 +123,290 @@ class MCPPersistenceTestSuite:
         print("📤 第二次导出完成，准备比对")
         
         # 7. 比对两次导出的数据
-        # 忽略时间戳的差异，因为它们在操作中会更新
+        # 忽略时间戳和版本号的差异，因为它们在操作中会更新
         original_plan_no_ts = copy.deepcopy(plan_to_load)
         reloaded_plan_no_ts = copy.deepcopy(reloaded_plan)
-        original_plan_no_ts["meta"].pop("created_at", None)
-        original_plan_no_ts["meta"].pop("updated_at", None)
-        reloaded_plan_no_ts["meta"].pop("created_at", None)
-        reloaded_plan_no_ts["meta"].pop("updated_at", None)
+        for key in ("created_at", "updated_at", "version"):
+            original_plan_no_ts["meta"].pop(key, None)
+            reloaded_plan_no_ts["meta"].pop(key, None)
         
         assert original_plan_no_ts == reloaded_plan_no_ts, "导入前后的计划数据不一致"
         print("🔍 数据一致性比对通过！")
 
         return {"dump_load_consistent": True}
 
+    async def test_binary_dump_and_load(self):
+        """测试 dumpPlan(format="binary") 导出的二进制计划可以被 loadPlan 原样加载"""
+        plan_id = "binary-format"
+        init = self.extract_data(await self.client.call_tool("initializePlan", {
+            "goal": "二进制格式测试",
+            "tasks": [
+                {"name": f"任务 {i}", "dependencies": [f"任务 {i - 1}"] if i else [], "reasoning": "链式依赖 ✓"}
+                for i in range(30)
+            ],
+            "plan_id": plan_id
+        }))
+        assert init.get("success"), "初始化计划失败"
+        started = self.extract_data(await self.client.call_tool("startNextTask", {"plan_id": plan_id}))
+        await self.client.call_tool("completeTask", {"task_id": started["data"]["id"], "result": "多行\n结果", "plan_id": plan_id})
+
+        expected = self.extract_data(await self.client.call_tool("dumpPlan", {"plan_id": plan_id}))["data"]
+        binary = self.extract_data(await self.client.call_tool("dumpPlan", {"format": "binary", "plan_id": plan_id}))
+        assert binary.get("success") and isinstance(binary["data"], str), f"二进制导出失败: {binary}"
+        print(f"📦 JSON {len(json.dumps(expected, ensure_ascii=False))} 字节，二进制(base64) {len(binary['data'])} 字节")
+
+        loaded = self.extract_data(await self.client.call_tool("loadPlan", {"plan_data": binary["data"], "plan_id": "binary-copy"}))
+        assert loaded.get("success"), f"加载二进制计划失败: {loaded}"
+        actual = self.extract_data(await self.client.call_tool("dumpPlan", {"plan_id": "binary-copy"}))["data"]
+        for plan in (expected, actual):
+            plan["meta"].pop("updated_at", None)
+            plan["meta"].pop("version", None)
+        assert actual == expected, "二进制导入后的计划与原计划不一致"
+
+        invalid = self.extract_data(await self.client.call_tool("loadPlan", {"plan_data": "not-a-plan", "plan_id": "binary-copy"}))
+        assert not invalid.get("success"), "无效的二进制数据应被拒绝"
+        print("🔍 二进制格式往返一致")
+        return {"binary_consistent": True}
+
+    async def test_delta_dump_and_apply(self):
+        """测试 dumpPlanDelta 只导出变化的任务，并且副本应用增量后与源计划一致"""
+        source, replica = "delta-source", "delta-replica"
+        init = self.extract_data(await self.client.call_tool("initializePlan", {
+            "goal": "增量导出测试",
+            "tasks": [{"name": f"Task {i}", "dependencies": [f"Task {i - 1}"] if i else [], "reasoning": "Chain"} for i in range(20)],
+            "plan_id": source
+        }))
+        assert init.get("success"), "初始化计划失败"
+        version = init["data"]["meta"]["version"]
+
+        # 版本早于计划被替换时返回完整计划，副本据此建立基线
+        full = self.extract_data(await self.client.call_tool("dumpPlanDelta", {"since_version": 0, "plan_id": source}))
+        assert full["data"]["full"], "基线增量应返回完整计划"
+        applied = self.extract_data(await self.client.call_tool("applyPlanDelta", {"delta": full["data"], "plan_id": replica}))
+        assert applied.get("success") and applied["data"]["version"] == version, f"应用完整增量失败: {applied}"
+        # 用 loadPlan(dumpPlan()) 建立基线的副本保留源计划的版本号，同样可以应用后续增量
+        snapshot = self.extract_data(await self.client.call_tool("dumpPlan", {"plan_id": source}))["data"]
+        loaded = self.extract_data(await self.client.call_tool("loadPlan", {"plan_data": snapshot, "plan_id": "delta-loaded"}))
+        assert loaded.get("success"), f"加载基线计划失败: {loaded}"
+        loaded_meta = self.extract_data(await self.client.call_tool("getPlanStatus", {"plan_id": "delta-loaded"}))["data"]["meta"]
+        assert loaded_meta["version"] == version, f"loadPlan 应保留导入计划的版本号: {loaded_meta['version']} != {version}"
+
+        started = self.extract_data(await self.client.call_tool("startNextTask", {"plan_id": source}))
+        await self.client.call_tool("completeTask", {"task_id": started["data"]["id"], "result": "done", "plan_id": source})
+        await self.client.call_tool("addTask", {"name": "Extra", "dependencies": [0], "reasoning": "Inserted", "after_task_id": 0, "plan_id": source})
+        await self.client.call_tool("skipTask", {"task_id": 19, "reason": "not needed", "plan_id": source})
+
+        delta = self.extract_data(await self.client.call_tool("dumpPlanDelta", {"since_version": version, "plan_id": source}))
+        assert delta.get("success") and not delta["data"]["full"], f"增量导出失败: {delta}"
+        assert sorted(task["id"] for task in delta["data"]["upsert"]) == [0, 19, 20], f"增量包含了未变化的任务: {delta['data']['upsert']}"
+        assert delta["data"]["insert"] == {"20": 1} and delta["data"]["remove"] == [], f"增量的新增记录错误: {delta['data']}"
+        print(f"📦 {len(delta['data']['upsert'])} 个变化的任务，版本 {version} -> {delta['data']['version']}")
+
+        applied = self.extract_data(await self.client.call_tool("applyPlanDelta", {"delta": delta["data"], "plan_id": replica}))
+        assert applied.get("success"), f"应用增量失败: {applied}"
+        stale = self.extract_data(await self.client.call_tool("applyPlanDelta", {"delta": delta["data"], "plan_id": replica}))
+        assert not stale.get("success"), "基于旧版本的增量应被拒绝"
+        applied = self.extract_data(await self.client.call_tool("applyPlanDelta", {"delta": delta["data"], "plan_id": "delta-loaded"}))
+        assert applied.get("success"), f"loadPlan 建立的副本应用增量失败: {applied}"
+
+        expected = self.extract_data(await self.client.call_tool("dumpPlan", {"plan_id": source}))["data"]
+        for plan_id in (replica, "delta-loaded"):
+            actual = self.extract_data(await self.client.call_tool("dumpPlan", {"plan_id": plan_id}))["data"]
+            assert actual == expected, f"应用增量后副本 {plan_id} 与源计划不一致"
+        print("🔍 副本与源计划完全一致")
+        return {"delta_consistent": True}
+
+    def start_server(self, port: int, **settings: str) -> subprocess.Popen:
+        """启动一个使用指定环境变量配置的独立 SSE 服务进程"""
+        env = dict(os.environ)
+        env.update(settings)
+        env.update({
+            "MCP_TRANSPORT": "sse",
+            "MCP_PORT": str(port),
+            "PYTHONPATH": str(Path(__file__).parent.parent / "src") + os.pathsep + env.get("PYTHONPATH", "")
+        })
+        return subprocess.Popen([sys.executable, "-m", "mcplanmanager.app"], env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    async def wait_for_port(self, port: int) -> None:
+        """等待独立服务开始监听端口"""
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection("localhost", port)
+                writer.close()
+                return
+            except OSError:
+                await asyncio.sleep(0.2)
+        raise RuntimeError("独立服务启动超时")
+
+    async def test_wal_crash_recovery(self):
+        """测试启用预写日志的服务被强制终止后，重启能恢复全部已确认的修改"""
+        port = 8091
+        with tempfile.TemporaryDirectory() as wal_dir:
+            server = self.start_server(port, MCP_WAL_DIR=wal_dir)
+            try:
+                await self.wait_for_port(port)
+                async with Client(f"http://localhost:{port}/sse") as client:
+                    init = self.extract_data(await client.call_tool("initializePlan", {
+                        "goal": "预写日志恢复测试",
+                        "tasks": [
+                            {"name": "Task A", "dependencies": [], "reasoning": "First task"},
+                            {"name": "Task B", "dependencies": ["Task A"], "reasoning": "Depends on A"},
+                            {"name": "Task C", "dependencies": ["Task A"], "reasoning": "Depends on A"}
+                        ]
+                    }))
+                    assert init.get("success"), "初始化计划失败"
+                    started = self.extract_data(await client.call_tool("startNextTask"))
+                    await client.call_tool("completeTask", {"task_id": started["data"]["id"], "result": "A finished"})
+                    await client.call_tool("addTask", {"name": "Task D", "dependencies": [1, 2], "reasoning": "Added later", "after_task_id": 1})
+                    await client.call_tool("skipTask", {"task_id": 2, "reason": "not needed"})
+                    await client.call_tool("initializePlan", {
+                        "goal": "第二个计划",
+                        "tasks": [{"name": "Only", "dependencies": [], "reasoning": "Separate plan"}],
+                        "plan_id": "wal-second"
+                    })
+                    await client.call_tool("startNextTask", {"plan_id": "wal-second"})
+                    expected = self.extract_data(await client.call_tool("dumpPlan"))["data"]
+                    expected_second = self.extract_data(await client.call_tool("dumpPlan", {"plan_id": "wal-second"}))["data"]
+                # 修改返回时已经落盘，收到最后一个响应后立即强制终止，模拟进程崩溃
+                server.send_signal(signal.SIGKILL)
+                server.wait()
+                print("💥 服务已被强制终止")
+
+                server = self.start_server(port, MCP_WAL_DIR=wal_dir)
+                await self.wait_for_port(port)
+                async with Client(f"http://localhost:{port}/sse") as client:
+                    recovered = self.extract_data(await client.call_tool("dumpPlan"))["data"]
+                    recovered_second = self.extract_data(await client.call_tool("dumpPlan", {"plan_id": "wal-second"}))["data"]
+            finally:
+                server.send_signal(signal.SIGKILL)
+                server.wait()
+
+        assert recovered == expected, "重启后默认计划与崩溃前不一致"
+        assert recovered_second == expected_second, "重启后第二个计划与崩溃前不一致"
+        print(f"🔁 重启后恢复了 {len(recovered['tasks'])} 个任务，两个计划均与崩溃前一致")
+        return {"wal_recovery_consistent": True}
+
+    async def test_sqlite_spill_queries(self):
+        """测试换出到 SQLite 的计划可以直接查询，并且换入后与换出前一致"""
+        port = 8092
+        with tempfile.TemporaryDirectory() as spill_dir:
+            server = self.start_server(port, MCP_SPILL_DB=os.path.join(spill_dir, "plans.db"), MCP_MAX_ACTIVE_PLANS="1")
+            try:
+                await self.wait_for_port(port)
+                async with Client(f"http://localhost:{port}/sse") as client:
+                    init = self.extract_data(await client.call_tool("initializePlan", {
+                        "goal": "SQLite 换出测试",
+                        "tasks": [
+                            {"name": "Task A", "dependencies": [], "reasoning": "First task"},
+                            {"name": "Task B", "dependencies": ["Task A"], "reasoning": "Depends on A"},
+                            {"name": "Task C", "dependencies": ["Task A"], "reasoning": "Depends on A"},
+                            {"name": "Task D", "dependencies": ["Task B", "Task C"], "reasoning": "Depends on B and C"}
+                        ],
+                        "plan_id": "sqlite-main"
+                    }))
+                    assert init.get("success"), "初始化计划失败"
+                    started = self.extract_data(await client.call_tool("startNextTask", {"plan_id": "sqlite-main"}))
+                    await client.call_tool("completeTask", {"task_id": started["data"]["id"], "result": "A finished", "plan_id": "sqlite-main"})
+                    expected = self.extract_data(await client.call_tool("dumpPlan", {"plan_id": "sqlite-main"}))["data"]
+
+                    # 访问另一个计划，让 sqlite-main 被换出到数据库
+                    await client.call_tool("initializePlan", {
+                        "goal": "另一个计划",
+                        "tasks": [{"name": "Only", "dependencies": [], "reasoning": "Evicts the main plan"}],
+                        "plan_id": "sqlite-other"
+                    })
+
+                    pending = self.extract_data(await client.call_tool("getTaskList", {"status_filter": "pending", "plan_id": "sqlite-main"}))
+                    assert [task["id"] for task in pending["data"]] == [1, 2, 3], f"按状态查询结果错误: {pending}"
+                    executable = self.extract_data(await client.call_tool("getExecutableTaskList", {"plan_id": "sqlite-main"}))
+                    assert [task["id"] for task in executable["data"]] == [1, 2], f"可执行任务查询结果错误: {executable}"
+                    dependents = self.extract_data(await client.call_tool("getDependents", {"task_id": 1, "plan_id": "sqlite-main"}))
+                    assert [task["id"] for task in dependents["data"]] == [3], f"依赖任务查询结果错误: {dependents}"
+                    assert dependents["data"][0]["dependencies"] == [1, 2], "查询结果中的依赖列表错误"
+                    missing = self.extract_data(await client.call_tool("getDependents", {"task_id": 99, "plan_id": "sqlite-main"}))
+                    assert not missing.get("success"), "查询不存在的任务应该失败"
+                    # 只读视图不支持的查询（关键路径）会把仍处于换出状态的计划换入后再执行
+                    critical = self.extract_data(await client.call_tool("getCriticalPath", {"plan_id": "sqlite-main"}))
+                    assert critical.get("success"), f"换出计划的关键路径查询失败: {critical}"
+                    assert [task["id"] for task in critical["data"]["tasks"]] == [1, 2, 3], f"关键路径排程的任务错误: {critical}"
+
+                    restored = self.extract_data(await client.call_tool("dumpPlan", {"plan_id": "sqlite-main"}))["data"]
+            finally:
+                server.send_signal(signal.SIGKILL)
+                server.wait()
+
+        assert restored == expected, "从 SQLite 换入后的计划与换出前不一致"
+        print("🗄️ 换出计划的索引查询正确，换入后计划与换出前一致")
+        return {"sqlite_spill_consistent": True}
+
+    def http_request(self, url: str, method: str = "GET", body: bytes = None):
+        """发送 HTTP 请求，返回 (状态码, 响应体)"""
+        request = urllib.request.Request(url, data=body, method=method, headers={"Content-Type": "application/x-ndjson"})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    async def test_ndjson_stream_routes(self):
+        """测试 NDJSON 流式导出/导入路由：导出的计划上传到另一个计划后与原计划一致"""
+        port = 8093
+        server = self.start_server(port)
+        try:
+            await self.wait_for_port(port)
+            async with Client(f"http://localhost:{port}/sse") as client:
+                init = self.extract_data(await client.call_tool("initializePlan", {
+                    "goal": "流式导出测试",
+                    "tasks": [
+                        {"name": f"任务 {i}", "dependencies": [f"任务 {i - 1}"] if i else [], "reasoning": "多行\n说明 ✓"}
+                        for i in range(500)
+                    ],
+                    "plan_id": "stream-source"
+                }))
+                assert init.get("success"), "初始化计划失败"
+                started = self.extract_data(await client.call_tool("startNextTask", {"plan_id": "stream-source"}))
+                await client.call_tool("completeTask", {"task_id": started["data"]["id"], "result": "完成", "plan_id": "stream-source"})
+
+                status, body = await asyncio.to_thread(self.http_request, f"http://localhost:{port}/plans/stream-source/ndjson")
+                assert status == 200, f"流式导出失败: {status}"
+                lines = body.decode("utf-8").splitlines()
+                assert len(lines) == 501, f"导出的行数不正确: {len(lines)}"
+                print(f"📤 导出 {len(lines)} 行，{len(body)} 字节")
+
+                status, body = await asyncio.to_thread(self.http_request, f"http://localhost:{port}/plans/stream-copy/ndjson", "PUT", "\n".join(lines).encode("utf-8"))
+                assert status == 200 and json.loads(body)["success"], f"流式导入失败: {status} {body!r}"
+                status, body = await asyncio.to_thread(self.http_request, f"http://localhost:{port}/plans/stream-copy/ndjson", "PUT", "\n".join(lines[:-1]).encode("utf-8"))
+                assert status == 400, "被截断的流应被拒绝"
+                status, body = await asyncio.to_thread(self.http_request, f"http://localhost:{port}/plans/stream-missing/ndjson")
+                assert status == 404 and not json.loads(body)["success"], f"导出不存在的计划应返回 404: {status} {body!r}"
+                status, _ = await asyncio.to_thread(self.http_request, f"http://localhost:{port}/plans/stream-missing/ndjson")
+                assert status == 404, "导出不存在的计划不应创建计划"
+
+                expected = self.extract_data(await client.call_tool("dumpPlan", {"plan_id": "stream-source"}))["data"]
+                actual = self.extract_data(await client.call_tool("dumpPlan", {"plan_id": "stream-copy"}))["data"]
+        finally:
+            server.send_signal(signal.SIGKILL)
+            server.wait()
+
+        for plan in (expected, actual):
+            plan["meta"].pop("updated_at", None)
+            plan["meta"].pop("version", None)
+        assert actual == expected, "流式导入后的计划与原计划不一致"
+        print("🔍 流式导出/导入往返一致")
+        return {"ndjson_consistent": True}
+
     async def run_all_tests(self):
         """按顺序运行所有持久化相关的测试"""
         await self.setup_client()
         
         async with self.client:
             await self.run_test("测试导出和导入 (dumpPlan & loadPlan)", self.test_dump_and_load)
+            await self.run_test("测试二进制格式导出和导入", self.test_binary_dump_and_load)
+            await self.run_test("测试增量导出和应用 (dumpPlanDelta & applyPlanDelta)", self.test_delta_dump_and_apply)
+        await self.run_test("预写日志崩溃恢复", self.test_wal_crash_recovery)
+        await self.run_test("SQLite 换出计划查询", self.test_sqlite_spill_queries)
+        await self.run_test("NDJSON 流式导出和导入", self.test_ndjson_stream_routes)
 
         self.print_summary()
         